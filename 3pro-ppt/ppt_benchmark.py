@@ -0,0 +1,436 @@
+"""
+PPTX 模板提取器的基准测试
+
+生成尺寸可控的合成 PPTX（幻灯片数、每页形状数、组嵌套深度、每个文本框的 run 数、
+图片大小），对每个文件计时 `PPTXTemplateExtractor.extract()` 和
+`generate_typescript()`（所有页），并用 tracemalloc 记录峰值内存：
+
+    python ppt_benchmark.py                                   # 全部预设
+    python ppt_benchmark.py --cases small,deep --repeat 10
+    python ppt_benchmark.py --custom slides=20,shapes=60,depth=3,runs=8,media_kb=512
+    python ppt_benchmark.py --samples                         # 同时测 ppt from canvas/ 中的文件
+    python ppt_benchmark.py --generate-only corpus/           # 只生成语料，不计时
+    python ppt_benchmark.py --xml-backend lxml                # 指定 XML 后端（见 ppt_xml.py）
+
+计时取 --repeat 次中的最小值和中位数（每次都新建提取器，不走实例缓存），
+峰值内存单独跑一次测量，tracemalloc 的开销不计入耗时。
+
+--json 保存结果，--baseline 与之前保存的结果比较：extract / codegen 的中位数
+变慢或峰值内存增加超过 --max-regression（默认 20%）时以状态码 1 退出。
+提取器的每个性能改动都应附上前后两次的比较结果。
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from ppt_template_extractor import PPTXTemplateExtractor
+from ppt_xml import BACKENDS, get_backend
+
+SAMPLES_DIR = Path(__file__).parent / 'ppt from canvas'
+
+P_NS = 'http://schemas.openxmlformats.org/presentationml/2006/main'
+A_NS = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+REL_TYPE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+CT_NS = 'http://schemas.openxmlformats.org/package/2006/content-types'
+CT_PML = 'application/vnd.openxmlformats-officedocument.presentationml'
+
+XML_DECL = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+ROOT_NS = f'xmlns:a="{A_NS}" xmlns:r="{R_NS}" xmlns:p="{P_NS}"'
+
+# 1080 × 1080 px 的画布（与 Canva 导出的方形模板相同）
+SLIDE_EMU = 10287000
+
+# 比较基线时检查的指标
+METRICS = ('extract_ms', 'codegen_ms', 'peak_kb')
+
+WORDS = ('template', 'slide', 'quote', 'review', 'customer', 'growth', 'design', 'brand',
+         '体验', '推荐', '品质', '服务')
+
+
+@dataclass(slots=True)
+class CorpusSpec:
+    """一个合成 PPTX 的规格"""
+    name: str
+    slides: int = 1
+    shapes: int = 20
+    depth: int = 0
+    runs: int = 3
+    media_kb: int = 0
+
+    @classmethod
+    def parse(cls, text: str, name: str = 'custom') -> 'CorpusSpec':
+        """解析 `slides=20,shapes=60,depth=3,runs=8,media_kb=512`"""
+        spec = cls(name)
+        for item in filter(None, text.split(',')):
+            key, _, value = item.partition('=')
+            if key not in ('slides', 'shapes', 'depth', 'runs', 'media_kb'):
+                raise ValueError(f"未知的语料参数：{key}")
+            setattr(spec, key, int(value))
+        return spec
+
+
+# 预设：从单页小文件到多页、深嵌套、大图片，分别放大不同的开销
+PRESETS = {
+    'small': CorpusSpec('small', slides=1, shapes=20, depth=1, runs=3),
+    'medium': CorpusSpec('medium', slides=10, shapes=40, depth=2, runs=5, media_kb=64),
+    'large': CorpusSpec('large', slides=50, shapes=80, depth=2, runs=6, media_kb=128),
+    'deep': CorpusSpec('deep', slides=5, shapes=60, depth=12, runs=3),
+    'text': CorpusSpec('text', slides=5, shapes=60, depth=0, runs=40),
+    'media': CorpusSpec('media', slides=5, shapes=20, depth=1, runs=3, media_kb=4096),
+}
+
+
+def _group_xfrm(level: int) -> str:
+    # 子坐标系是组尺寸的两倍，组变换会真正缩放子形状
+    off = 100000 * level
+    ext = SLIDE_EMU // 2
+    return (f'<a:xfrm><a:off x="{off}" y="{off}"/><a:ext cx="{ext}" cy="{ext}"/>'
+            f'<a:chOff x="0" y="0"/><a:chExt cx="{ext * 2}" cy="{ext * 2}"/></a:xfrm>')
+
+
+def _shape_xfrm(rng: random.Random) -> str:
+    x, y = rng.randrange(0, SLIDE_EMU // 2), rng.randrange(0, SLIDE_EMU // 2)
+    cx, cy = rng.randrange(200000, SLIDE_EMU // 2), rng.randrange(200000, SLIDE_EMU // 2)
+    return f'<a:xfrm><a:off x="{x}" y="{y}"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+
+
+def _text_shape(shape_id: int, runs: int, rng: random.Random) -> str:
+    paragraphs = []
+    for start in range(0, max(runs, 1), 4):
+        run_xml = []
+        for index in range(start, min(start + 4, max(runs, 1))):
+            text = escape(' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 6))))
+            latin = '<a:latin typeface="Open Sans"/>' if index == 0 else ''
+            run_xml.append(f'<a:r><a:rPr lang="en-US" sz="{rng.choice((1400, 1800, 2400, 3600))}">'
+                           f'<a:solidFill><a:srgbClr val="{rng.randrange(1 << 24):06X}"/></a:solidFill>'
+                           f'{latin}</a:rPr><a:t>{text}</a:t></a:r>')
+        paragraphs.append(f'<a:p><a:pPr algn="{rng.choice(("l", "ctr", "r"))}"/>{"".join(run_xml)}</a:p>')
+    return (f'<p:sp><p:nvSpPr><p:cNvPr id="{shape_id}" name="TextBox {shape_id}"/><p:cNvSpPr txBox="1"/>'
+            f'<p:nvPr/></p:nvSpPr><p:spPr>{_shape_xfrm(rng)}<a:prstGeom prst="rect"><a:avLst/></a:prstGeom>'
+            f'</p:spPr><p:txBody><a:bodyPr/><a:lstStyle/>{"".join(paragraphs)}</p:txBody></p:sp>')
+
+
+def _fill_shape(shape_id: int, rng: random.Random) -> str:
+    return (f'<p:sp><p:nvSpPr><p:cNvPr id="{shape_id}" name="Freeform {shape_id}"/><p:cNvSpPr/><p:nvPr/>'
+            f'</p:nvSpPr><p:spPr>{_shape_xfrm(rng)}<a:prstGeom prst="roundRect"><a:avLst/></a:prstGeom>'
+            f'<a:solidFill><a:schemeClr val="accent{rng.randint(1, 6)}"><a:alpha val="85882"/></a:schemeClr>'
+            f'</a:solidFill></p:spPr></p:sp>')
+
+
+def _picture_shape(shape_id: int, rng: random.Random) -> str:
+    return (f'<p:pic><p:nvPicPr><p:cNvPr id="{shape_id}" name="Picture {shape_id}"/><p:cNvPicPr/><p:nvPr/>'
+            f'</p:nvPicPr><p:blipFill><a:blip r:embed="rId2"/><a:stretch><a:fillRect/></a:stretch>'
+            f'</p:blipFill><p:spPr>{_shape_xfrm(rng)}<a:prstGeom prst="rect"><a:avLst/></a:prstGeom>'
+            f'</p:spPr></p:pic>')
+
+
+def _title_placeholder(shape_id: int) -> str:
+    # 没有 xfrm 和文本属性，位置和样式都要从版式 / 母版继承
+    return (f'<p:sp><p:nvSpPr><p:cNvPr id="{shape_id}" name="Title {shape_id}"/><p:cNvSpPr/>'
+            f'<p:nvPr><p:ph type="title"/></p:nvPr></p:nvSpPr><p:spPr/><p:txBody><a:bodyPr/>'
+            f'<a:lstStyle/><a:p><a:r><a:t>Synthetic title</a:t></a:r></a:p></p:txBody></p:sp>')
+
+
+def _slide_xml(spec: CorpusSpec, rng: random.Random) -> str:
+    shapes = []
+    for index in range(spec.shapes):
+        shape_id = index + 3
+        kind = index % 3
+        if kind == 0:
+            shapes.append(_text_shape(shape_id, spec.runs, rng))
+        elif kind == 1 and spec.media_kb:
+            shapes.append(_picture_shape(shape_id, rng))
+        else:
+            shapes.append(_fill_shape(shape_id, rng))
+
+    # 一半形状留在顶层，另一半平均分到 depth 层嵌套的组里，放在每层组的末尾
+    body = [_title_placeholder(2)]
+    if spec.depth > 0:
+        split = len(shapes) // 2
+        body += shapes[:split]
+        nested = shapes[split:]
+        per_level = -(-len(nested) // spec.depth) if nested else 0
+        group_id = spec.shapes + 3
+        inner = ''
+        for level in range(spec.depth, 0, -1):
+            members = ''.join(nested[(level - 1) * per_level:level * per_level])
+            inner = (f'<p:grpSp><p:nvGrpSpPr><p:cNvPr id="{group_id + level}" name="Group {level}"/>'
+                     f'<p:cNvGrpSpPr/><p:nvPr/></p:nvGrpSpPr><p:grpSpPr>{_group_xfrm(level)}</p:grpSpPr>'
+                     f'{inner}{members}</p:grpSp>')
+        body.append(inner)
+    else:
+        body += shapes
+
+    return (f'{XML_DECL}<p:sld {ROOT_NS}><p:cSld><p:spTree><p:nvGrpSpPr><p:cNvPr id="1" name=""/>'
+            f'<p:cNvGrpSpPr/><p:nvPr/></p:nvGrpSpPr><p:grpSpPr/>{"".join(body)}</p:spTree></p:cSld>'
+            f'<p:clrMapOvr><a:masterClrMapping/></p:clrMapOvr></p:sld>')
+
+
+def _rels_xml(rels: list) -> str:
+    items = ''.join(f'<Relationship Id="{rel_id}" Type="{REL_TYPE}/{kind}" Target="{target}"/>'
+                    for rel_id, kind, target in rels)
+    return f'{XML_DECL}<Relationships xmlns="{REL_NS}">{items}</Relationships>'
+
+
+def _title_sp(xfrm: str, style: str = '') -> str:
+    return (f'<p:sp><p:nvSpPr><p:cNvPr id="2" name="Title Placeholder 1"/><p:cNvSpPr/>'
+            f'<p:nvPr><p:ph type="title"/></p:nvPr></p:nvSpPr><p:spPr>{xfrm}</p:spPr>'
+            f'<p:txBody><a:bodyPr/><a:lstStyle>{style}</a:lstStyle><a:p/></p:txBody></p:sp>')
+
+
+THEME_XML = (
+    f'{XML_DECL}<a:theme xmlns:a="{A_NS}" name="Synthetic"><a:themeElements>'
+    '<a:clrScheme name="Synthetic">'
+    '<a:dk1><a:srgbClr val="000000"/></a:dk1><a:lt1><a:srgbClr val="FFFFFF"/></a:lt1>'
+    '<a:dk2><a:srgbClr val="1F2937"/></a:dk2><a:lt2><a:srgbClr val="F3F4F6"/></a:lt2>'
+    + ''.join(f'<a:accent{i}><a:srgbClr val="{color}"/></a:accent{i}>'
+              for i, color in enumerate(('2563EB', 'DC2626', '16A34A', 'CA8A04', '9333EA', '0891B2'), 1))
+    + '<a:hlink><a:srgbClr val="2563EB"/></a:hlink><a:folHlink><a:srgbClr val="7C3AED"/></a:folHlink>'
+    '</a:clrScheme><a:fontScheme name="Synthetic"><a:majorFont><a:latin typeface="Montserrat"/></a:majorFont>'
+    '<a:minorFont><a:latin typeface="Open Sans"/></a:minorFont></a:fontScheme></a:themeElements></a:theme>'
+)
+
+MASTER_XML = (
+    f'{XML_DECL}<p:sldMaster {ROOT_NS}><p:cSld><p:spTree><p:nvGrpSpPr><p:cNvPr id="1" name=""/>'
+    f'<p:cNvGrpSpPr/><p:nvPr/></p:nvGrpSpPr><p:grpSpPr/>'
+    + _title_sp('<a:xfrm><a:off x="685800" y="457200"/><a:ext cx="8915400" cy="1371600"/></a:xfrm>')
+    + '</p:spTree></p:cSld><p:clrMap bg1="lt1" tx1="dk1" bg2="lt2" tx2="dk2" accent1="accent1" '
+    'accent2="accent2" accent3="accent3" accent4="accent4" accent5="accent5" accent6="accent6" '
+    'hlink="hlink" folHlink="folHlink"/><p:txStyles><p:titleStyle><a:lvl1pPr algn="ctr">'
+    '<a:defRPr sz="4400"><a:solidFill><a:schemeClr val="tx1"/></a:solidFill><a:latin typeface="+mj-lt"/>'
+    '</a:defRPr></a:lvl1pPr></p:titleStyle><p:bodyStyle><a:lvl1pPr><a:defRPr sz="2400"/></a:lvl1pPr>'
+    '</p:bodyStyle></p:txStyles></p:sldMaster>'
+)
+
+LAYOUT_XML = (
+    f'{XML_DECL}<p:sldLayout {ROOT_NS}><p:cSld><p:spTree><p:nvGrpSpPr><p:cNvPr id="1" name=""/>'
+    f'<p:cNvGrpSpPr/><p:nvPr/></p:nvGrpSpPr><p:grpSpPr/>'
+    + _title_sp('', '<a:lvl1pPr><a:defRPr sz="4000"/></a:lvl1pPr>')
+    + '</p:spTree></p:cSld><p:clrMapOvr><a:masterClrMapping/></p:clrMapOvr></p:sldLayout>'
+)
+
+
+def write_synthetic_pptx(path, spec: CorpusSpec, seed: int = 0) -> Path:
+    """
+    按规格写一个合成 PPTX（同样的 spec 和 seed 生成的内容完全相同）
+
+    每页有一个从版式继承位置和样式的标题占位符，外加 spec.shapes 个形状：
+    文本框（spec.runs 个 run，每段最多 4 个）、图片（media_kb > 0 时，
+    引用本页的一个 media_kb 大小的媒体文件）和纯色填充形状轮流出现。
+    depth > 0 时一半形状放在 depth 层嵌套的组里。
+    """
+    path = Path(path)
+    rng = random.Random(f'{seed}:{spec.name}')
+    slide_ids = ''.join(f'<p:sldId id="{256 + i}" r:id="rId{i + 2}"/>' for i in range(spec.slides))
+    presentation = (
+        f'{XML_DECL}<p:presentation {ROOT_NS}><p:sldMasterIdLst><p:sldMasterId id="2147483648" r:id="rId1"/>'
+        f'</p:sldMasterIdLst><p:sldIdLst>{slide_ids}</p:sldIdLst>'
+        f'<p:sldSz cx="{SLIDE_EMU}" cy="{SLIDE_EMU}"/><p:notesSz cx="6858000" cy="9144000"/>'
+        f'<p:defaultTextStyle><a:lvl1pPr><a:defRPr sz="1800"/></a:lvl1pPr></p:defaultTextStyle>'
+        f'</p:presentation>'
+    )
+    overrides = [
+        ('/ppt/presentation.xml', f'{CT_PML}.presentation.main+xml'),
+        ('/ppt/slideMasters/slideMaster1.xml', f'{CT_PML}.slideMaster+xml'),
+        ('/ppt/slideLayouts/slideLayout1.xml', f'{CT_PML}.slideLayout+xml'),
+        ('/ppt/theme/theme1.xml', 'application/vnd.openxmlformats-officedocument.theme+xml'),
+    ] + [(f'/ppt/slides/slide{i}.xml', f'{CT_PML}.slide+xml') for i in range(1, spec.slides + 1)]
+    content_types = (
+        f'{XML_DECL}<Types xmlns="{CT_NS}">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Default Extension="png" ContentType="image/png"/>'
+        + ''.join(f'<Override PartName="{name}" ContentType="{kind}"/>' for name, kind in overrides)
+        + '</Types>'
+    )
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', content_types)
+        zf.writestr('_rels/.rels', _rels_xml([('rId1', 'officeDocument', 'ppt/presentation.xml')]))
+        zf.writestr('ppt/presentation.xml', presentation)
+        zf.writestr('ppt/_rels/presentation.xml.rels', _rels_xml(
+            [('rId1', 'slideMaster', 'slideMasters/slideMaster1.xml')]
+            + [(f'rId{i + 1}', 'slide', f'slides/slide{i}.xml') for i in range(1, spec.slides + 1)]))
+        zf.writestr('ppt/theme/theme1.xml', THEME_XML)
+        zf.writestr('ppt/slideMasters/slideMaster1.xml', MASTER_XML)
+        zf.writestr('ppt/slideMasters/_rels/slideMaster1.xml.rels', _rels_xml(
+            [('rId1', 'slideLayout', '../slideLayouts/slideLayout1.xml'),
+             ('rId2', 'theme', '../theme/theme1.xml')]))
+        zf.writestr('ppt/slideLayouts/slideLayout1.xml', LAYOUT_XML)
+        zf.writestr('ppt/slideLayouts/_rels/slideLayout1.xml.rels', _rels_xml(
+            [('rId1', 'slideMaster', '../slideMasters/slideMaster1.xml')]))
+
+        for i in range(1, spec.slides + 1):
+            rels = [('rId1', 'slideLayout', '../slideLayouts/slideLayout1.xml')]
+            if spec.media_kb:
+                rels.append(('rId2', 'image', f'../media/image{i}.png'))
+                # 随机内容不可压缩，压缩包里的大小就是 media_kb
+                media = b'\x89PNG\r\n\x1a\n' + rng.randbytes(spec.media_kb * 1024 - 8)
+                zf.writestr(zipfile.ZipInfo(f'ppt/media/image{i}.png'), media, zipfile.ZIP_STORED)
+            zf.writestr(f'ppt/slides/slide{i}.xml', _slide_xml(spec, rng))
+            zf.writestr(f'ppt/slides/_rels/slide{i}.xml.rels', _rels_xml(rels))
+    return path
+
+
+def _run_once(path: Path, xml_backend: str | None = None) -> tuple:
+    """新建提取器解析一次并生成所有页的 TypeScript，返回 (extract 秒数, codegen 秒数, 元素数)"""
+    start = time.perf_counter()
+    extractor = PPTXTemplateExtractor(str(path), xml_backend=xml_backend)
+    data = extractor.extract()
+    extracted = time.perf_counter()
+    for slide_index in range(len(data['slides'])):
+        extractor.generate_typescript('bench-template', 'Bench', slide_index)
+    done = time.perf_counter()
+    return extracted - start, done - extracted, sum(len(slide['elements']) for slide in data['slides'])
+
+
+def _peak_memory(path: Path, xml_backend: str | None = None) -> int:
+    """
+    extract + generate_typescript 过程中 tracemalloc 记录的峰值（字节）
+
+    tracemalloc 只跟踪 Python 的分配，lxml 在 C 中分配的树不计入。
+    """
+    tracemalloc.start()
+    try:
+        _run_once(path, xml_backend)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_file(name: str, path: Path, repeat: int = 5, spec: CorpusSpec | None = None,
+               xml_backend: str | None = None) -> dict:
+    """对一个 PPTX 计时，先预热一次；返回一行结果"""
+    _, _, elements = _run_once(path, xml_backend)
+    extract_times, codegen_times = [], []
+    for _ in range(max(1, repeat)):
+        extract_s, codegen_s, _ = _run_once(path, xml_backend)
+        extract_times.append(extract_s)
+        codegen_times.append(codegen_s)
+
+    to_ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        'case': name,
+        'backend': get_backend(xml_backend).name,
+        'spec': asdict(spec) if spec is not None else None,
+        'file_kb': round(path.stat().st_size / 1024, 1),
+        'elements': elements,
+        'repeat': len(extract_times),
+        'extract_ms': to_ms(statistics.median(extract_times)),
+        'extract_min_ms': to_ms(min(extract_times)),
+        'codegen_ms': to_ms(statistics.median(codegen_times)),
+        'codegen_min_ms': to_ms(min(codegen_times)),
+        'peak_kb': round(_peak_memory(path, xml_backend) / 1024, 1),
+    }
+
+
+def compare(results: list, baseline: list, max_regression: float) -> list:
+    """与基线比较，返回回归说明列表（只比较两边都有的用例）"""
+    previous = {row['case']: row for row in baseline}
+    regressions = []
+    for row in results:
+        base = previous.get(row['case'])
+        if base is None:
+            continue
+        if base.get('spec') != row.get('spec'):
+            print(f"⚠️ {row['case']}: 语料规格与基线不同，跳过比较", file=sys.stderr)
+            continue
+        if base.get('backend') != row.get('backend'):
+            # 跨后端比较是有意的（例如评估 lxml），照常比较，只提示一下
+            print(f"ℹ️ {row['case']}: XML 后端 {base.get('backend')} -> {row.get('backend')}", file=sys.stderr)
+        for metric in METRICS:
+            old, new = base.get(metric), row.get(metric)
+            if old and new is not None and new > old * (1 + max_regression):
+                regressions.append(f"{row['case']}: {metric} {old} -> {new} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def print_table(results: list):
+    columns = ('case', 'backend', 'file_kb', 'elements', 'extract_ms', 'extract_min_ms', 'codegen_ms', 'peak_kb')
+    widths = [max(len(c), *(len(str(r[c])) for r in results)) for c in columns]
+    print('  '.join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in results:
+        print('  '.join(str(row[c]).ljust(w) for c, w in zip(columns, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PPTX 模板提取器基准测试')
+    parser.add_argument('--cases', default=','.join(PRESETS),
+                        help=f"预设用例列表（默认全部：{','.join(PRESETS)}），空字符串表示不跑预设")
+    parser.add_argument('--custom', action='append', default=[], metavar='SPEC',
+                        help='自定义语料，如 slides=20,shapes=60,depth=3,runs=8,media_kb=512，可重复')
+    parser.add_argument('--samples', action='store_true', help='同时测试 ppt from canvas/ 中的 PPTX')
+    parser.add_argument('--repeat', type=int, default=5, help='每个用例的计时次数（默认 5）')
+    parser.add_argument('--xml-backend', choices=('auto',) + BACKENDS, default='auto',
+                        help='XML 解析后端（默认 auto：PPT_XML_BACKEND 指定的后端，未指定时为 etree）')
+    parser.add_argument('--seed', type=int, default=0, help='语料随机种子（默认 0）')
+    parser.add_argument('--corpus-dir', help='合成语料的保存目录（默认用临时目录，结束后删除）')
+    parser.add_argument('--generate-only', metavar='DIR', help='只把语料生成到 DIR，不计时')
+    parser.add_argument('--json', metavar='FILE', help='结果保存为 JSON')
+    parser.add_argument('--baseline', metavar='FILE', help='与之前 --json 保存的结果比较')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='允许的回归比例（默认 0.2）')
+    args = parser.parse_args()
+
+    specs = []
+    for name in filter(None, args.cases.split(',')):
+        if name not in PRESETS:
+            parser.error(f"未知的预设用例：{name}")
+        specs.append(PRESETS[name])
+    try:
+        specs += [CorpusSpec.parse(text, f'custom-{i}') for i, text in enumerate(args.custom, 1)]
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.generate_only:
+        for spec in specs:
+            path = write_synthetic_pptx(Path(args.generate_only) / f'{spec.name}.pptx', spec, args.seed)
+            print(f"✅ {path}（{path.stat().st_size / 1024:.0f} KB）")
+        return
+
+    try:
+        xml_backend = get_backend(args.xml_backend).name
+    except RuntimeError as e:
+        parser.error(str(e))
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='ppt-bench-') as temp_dir:
+        corpus_dir = Path(args.corpus_dir or temp_dir)
+        for spec in specs:
+            path = write_synthetic_pptx(corpus_dir / f'{spec.name}.pptx', spec, args.seed)
+            results.append(bench_file(spec.name, path, args.repeat, spec, xml_backend))
+            print(f"⏱️ {spec.name}: extract {results[-1]['extract_ms']}ms", file=sys.stderr)
+        if args.samples:
+            for path in sorted(SAMPLES_DIR.glob('*.pptx')):
+                results.append(bench_file(f'sample:{path.stem}', path, args.repeat, xml_backend=xml_backend))
+                print(f"⏱️ {path.name}: extract {results[-1]['extract_ms']}ms", file=sys.stderr)
+
+    if not results:
+        parser.error('没有要测试的用例')
+    print_table(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding='utf-8')
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+        regressions = compare(results, baseline, args.max_regression)
+        for line in regressions:
+            print(f"❌ regression: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
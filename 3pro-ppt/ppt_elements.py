@@ -0,0 +1,249 @@
+"""
+模板元素的紧凑表示
+
+提取过程中元素以 `__slots__` dataclass 保存（没有逐实例的 __dict__，也没有
+position / size / style / constraints 这些嵌套 dict），只在写 JSON、写缓存、
+生成 TypeScript 这些“边缘”位置才转换成原来的 dict 结构。
+
+slot 推断等需要批量访问一页所有元素的步骤使用 `ElementTable`：列式
+（struct-of-arrays）存储，坐标、层级和文本长度保存在紧凑的 `array` 中。
+"""
+
+from array import array
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class TemplateElement:
+    """所有元素共有的字段"""
+    id: str
+    type: str
+    slot: str
+    x: int
+    y: int
+    width: int
+    height: int
+    z_index: int
+
+    def style_items(self) -> list:
+        """style 中的键值对（顺序即输出顺序）"""
+        return [('zIndex', self.z_index)]
+
+    def constraint_items(self) -> list | None:
+        """constraints 中的键值对，没有约束时返回 None"""
+        return None
+
+    def to_dict(self) -> dict:
+        """转换成 JSON / 缓存使用的 dict 结构"""
+        data = {
+            'id': self.id,
+            'type': self.type,
+            'slot': self.slot,
+            'position': {'x': self.x, 'y': self.y},
+            'size': {'width': self.width, 'height': self.height},
+            'style': dict(self.style_items()),
+        }
+        constraints = self.constraint_items()
+        if constraints is not None:
+            data['constraints'] = dict(constraints)
+        return data
+
+
+@dataclass(slots=True)
+class TextElement(TemplateElement):
+    """文本框"""
+    font_size: int = 18
+    font_family: str = 'Arial'
+    color: str = '#000000'
+    text_align: str = 'left'
+    max_chars: int = 50
+    overflow_strategy: str = 'auto-scale'
+    example_content: str = 'Example text'
+    # 原文本的字符数（空文本框为 0，example_content 此时是占位文字）；只在解析时设置，不输出
+    content_length: int = 0
+
+    def style_items(self) -> list:
+        return [
+            ('fontSize', self.font_size),
+            ('fontFamily', self.font_family),
+            ('color', self.color),
+            ('textAlign', self.text_align),
+            ('zIndex', self.z_index),
+        ]
+
+    def constraint_items(self) -> list:
+        return [
+            ('maxChars', self.max_chars),
+            ('overflowStrategy', self.overflow_strategy),
+        ]
+
+    def to_dict(self) -> dict:
+        data = TemplateElement.to_dict(self)
+        data['exampleContent'] = self.example_content
+        return data
+
+
+@dataclass(slots=True)
+class ImageElement(TemplateElement):
+    """图片（形状图片填充或 p:pic）"""
+    object_fit: str = 'cover'
+    border_radius: int | None = None
+    optional: bool = False
+    # 图片资源引用：解析后是压缩包内的部件名（ppt/media/...），
+    # 存入 MediaStore 后是资源库中的相对路径；找不到图片时为 None
+    asset: str | None = None
+
+    def style_items(self) -> list:
+        items = [('objectFit', self.object_fit), ('zIndex', self.z_index)]
+        if self.border_radius is not None:
+            items.append(('borderRadius', self.border_radius))
+        return items
+
+    def to_dict(self) -> dict:
+        data = TemplateElement.to_dict(self)
+        data['optional'] = self.optional
+        if self.asset is not None:
+            data['asset'] = self.asset
+        return data
+
+
+@dataclass(slots=True)
+class FillElement(TemplateElement):
+    """纯色填充的背景 / 装饰块"""
+    background_color: str = '#FFFFFF'
+    optional: bool = False
+
+    def style_items(self) -> list:
+        return [('backgroundColor', self.background_color), ('zIndex', self.z_index)]
+
+    def to_dict(self) -> dict:
+        data = TemplateElement.to_dict(self)
+        data['optional'] = self.optional
+        return data
+
+
+def element_from_dict(data: dict) -> TemplateElement:
+    """从 dict 结构（JSON / 缓存）还原元素"""
+    style = data.get('style', {})
+    common = {
+        'id': data['id'],
+        'type': data['type'],
+        'slot': data['slot'],
+        'x': data['position']['x'],
+        'y': data['position']['y'],
+        'width': data['size']['width'],
+        'height': data['size']['height'],
+        'z_index': style.get('zIndex', 0),
+    }
+
+    if 'constraints' in data:
+        constraints = data['constraints']
+        return TextElement(
+            **common,
+            font_size=style.get('fontSize', 18),
+            font_family=style.get('fontFamily', 'Arial'),
+            color=style.get('color', '#000000'),
+            text_align=style.get('textAlign', 'left'),
+            max_chars=constraints.get('maxChars', 50),
+            overflow_strategy=constraints.get('overflowStrategy', 'auto-scale'),
+            example_content=data.get('exampleContent', 'Example text'),
+        )
+
+    if 'backgroundColor' in style:
+        return FillElement(
+            **common,
+            background_color=style['backgroundColor'],
+            optional=data.get('optional', False),
+        )
+
+    return ImageElement(
+        **common,
+        object_fit=style.get('objectFit', 'cover'),
+        border_radius=style.get('borderRadius'),
+        optional=data.get('optional', False),
+        asset=data.get('asset'),
+    )
+
+
+def result_to_dict(result: dict) -> dict:
+    """把 extract() 的结果转换成纯 dict（用于 JSON 和缓存）"""
+    return {
+        'size': result['size'],
+        'slides': [
+            {**slide, 'elements': [element.to_dict() for element in slide['elements']]}
+            for slide in result['slides']
+        ],
+    }
+
+
+def result_from_dict(data: dict) -> dict:
+    """result_to_dict 的逆操作"""
+    return {
+        'size': data['size'],
+        'slides': [
+            {**slide, 'elements': [element_from_dict(element) for element in slide['elements']]}
+            for slide in data['slides']
+        ],
+    }
+
+
+class ElementTable:
+    """
+    元素的列式存储
+
+    每一列是一个数组：数值列使用 `array('i')`，字符串列使用 list。
+    第 i 行对应第 i 个元素。slots 列是建表时的快照，之后修改元素的 slot 不会同步。
+    """
+
+    __slots__ = ('ids', 'types', 'slots', 'x', 'y', 'width', 'height', 'z_index', 'content_lengths')
+
+    def __init__(self):
+        self.ids = []
+        self.types = []
+        self.slots = []
+        self.x = array('i')
+        self.y = array('i')
+        self.width = array('i')
+        self.height = array('i')
+        self.z_index = array('i')
+        self.content_lengths = array('i')
+
+    @classmethod
+    def from_elements(cls, elements) -> 'ElementTable':
+        table = cls()
+        for element in elements:
+            table.append(element)
+        return table
+
+    def append(self, element: TemplateElement):
+        self.ids.append(element.id)
+        self.types.append(element.type)
+        self.slots.append(element.slot)
+        self.x.append(element.x)
+        self.y.append(element.y)
+        self.width.append(element.width)
+        self.height.append(element.height)
+        self.z_index.append(element.z_index)
+        self.content_lengths.append(getattr(element, 'content_length', 0))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def bounds(self, i: int) -> tuple:
+        """第 i 个元素的 (x, y, width, height)"""
+        return self.x[i], self.y[i], self.width[i], self.height[i]
+
+    def boxes(self) -> list:
+        """所有元素的 (x, y, width, height)，用于构造空间索引"""
+        return list(zip(self.x, self.y, self.width, self.height))
+
+    def area(self, i: int) -> int:
+        return self.width[i] * self.height[i]
+
+    def areas(self) -> array:
+        """所有元素的面积"""
+        return array('q', (w * h for w, h in zip(self.width, self.height)))
+
+    def indices_of_type(self, element_type: str) -> list:
+        """指定类型元素的行号"""
+        return [i for i, t in enumerate(self.types) if t == element_type]
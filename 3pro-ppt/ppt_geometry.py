@@ -0,0 +1,229 @@
+"""
+幻灯片几何计算
+
+解析阶段只记录每个形状的原始 EMU 坐标和所属的组，所有坐标换算在解析结束后
+一次性批量完成：
+
+1. 每个组的局部仿射变换（chOff/chExt → off/ext）；
+2. 嵌套组的变换用指针跳跃（pointer jumping）合成，循环次数只与嵌套深度的
+   对数有关，每次循环对所有组同时计算；
+3. 形状坐标套用所属组的合成变换后统一换算成像素。
+
+安装了 NumPy 时以上步骤都是向量化的数组运算；否则退回到逐元素的纯 Python
+实现。两种实现的运算顺序完全相同，结果逐位一致。
+
+解析出的像素框还可以批量生成重叠面积矩阵和包含关系矩阵（可以只取部分行 / 列，
+例如“装饰块 × 文本”），供 slot 推断使用；按位置查找邻居则由
+ppt_spatial.SpatialIndex 完成。
+"""
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 是可选依赖
+    np = None
+
+EMU_PER_INCH = 914400
+PIXELS_PER_INCH = 96
+
+
+def _local_transform(xfrm: tuple | None) -> tuple:
+    """组的局部变换 (scale_x, scale_y, offset_x, offset_y)，子坐标 → 父坐标"""
+    if xfrm is None:
+        return 1.0, 1.0, 0.0, 0.0
+
+    off_x, off_y, cx, cy, ch_off_x, ch_off_y, ch_cx, ch_cy = xfrm
+    scale_x = cx / ch_cx if ch_cx else 1.0
+    scale_y = cy / ch_cy if ch_cy else 1.0
+    return scale_x, scale_y, off_x - ch_off_x * scale_x, off_y - ch_off_y * scale_y
+
+
+def _emu_to_pixels(emu) -> int:
+    return round(emu / EMU_PER_INCH * PIXELS_PER_INCH)
+
+
+class SlideGeometry:
+    """一页幻灯片中所有形状和组的几何信息"""
+
+    def __init__(self):
+        # 组按出现顺序编号，父组一定排在子组前面；-1 表示没有父组
+        self.group_parent = []
+        # 组的原始 xfrm：(off_x, off_y, cx, cy, ch_off_x, ch_off_y, ch_cx, ch_cy)，None 表示恒等变换
+        self.group_xfrm = []
+        # 形状的原始 EMU 坐标 (x, y, cx, cy) 和所属组
+        self.shape_xfrm = []
+        self.shape_group = []
+        # resolve() 之后得到的像素框 [(x, y, width, height), ...]
+        self.boxes = None
+
+    def add_group(self, parent: int) -> int:
+        """登记一个组，返回组编号（xfrm 稍后通过 set_group_xfrm 补上）"""
+        self.group_parent.append(parent)
+        self.group_xfrm.append(None)
+        return len(self.group_parent) - 1
+
+    def set_group_xfrm(self, group: int, xfrm: tuple | None):
+        self.group_xfrm[group] = xfrm
+
+    def add_shape(self, xfrm: tuple, group: int = -1) -> int:
+        """登记一个形状，返回形状编号"""
+        self.shape_xfrm.append(xfrm)
+        self.shape_group.append(group)
+        return len(self.shape_xfrm) - 1
+
+    def __len__(self) -> int:
+        return len(self.shape_xfrm)
+
+    def resolve(self) -> list:
+        """把所有形状换算成幻灯片坐标下的像素框 (x, y, width, height)"""
+        if np is not None:
+            self.boxes = self._resolve_numpy()
+        else:
+            self.boxes = self._resolve_python()
+        return self.boxes
+
+    def _group_world_python(self) -> list:
+        """纯 Python 的指针跳跃合成，运算顺序与 NumPy 实现一致"""
+        transforms = [_local_transform(xfrm) for xfrm in self.group_xfrm]
+        ancestor = list(self.group_parent)
+
+        while any(a >= 0 for a in ancestor):
+            snapshot = list(transforms)
+            next_ancestor = list(ancestor)
+            for g, a in enumerate(ancestor):
+                if a < 0:
+                    continue
+                sx, sy, ox, oy = snapshot[g]
+                psx, psy, pox, poy = snapshot[a]
+                transforms[g] = (sx * psx, sy * psy, ox * psx + pox, oy * psy + poy)
+                next_ancestor[g] = ancestor[a]
+            ancestor = next_ancestor
+
+        return transforms
+
+    def _resolve_python(self) -> list:
+        world = self._group_world_python()
+        boxes = []
+        for (x, y, cx, cy), group in zip(self.shape_xfrm, self.shape_group):
+            if group >= 0:
+                sx, sy, ox, oy = world[group]
+                x = x * sx + ox
+                y = y * sy + oy
+                cx = cx * sx
+                cy = cy * sy
+            boxes.append((_emu_to_pixels(x), _emu_to_pixels(y),
+                          _emu_to_pixels(cx), _emu_to_pixels(cy)))
+        return boxes
+
+    def _group_world_numpy(self):
+        n = len(self.group_parent)
+        xfrm = np.array([g if g is not None else (0, 0, 1, 1, 0, 0, 1, 1) for g in self.group_xfrm],
+                        dtype=np.float64).reshape(n, 8)
+        off_x, off_y, cx, cy, ch_off_x, ch_off_y, ch_cx, ch_cy = xfrm.T
+
+        sx = np.divide(cx, ch_cx, out=np.ones(n), where=ch_cx != 0)
+        sy = np.divide(cy, ch_cy, out=np.ones(n), where=ch_cy != 0)
+        ox = off_x - ch_off_x * sx
+        oy = off_y - ch_off_y * sy
+
+        ancestor = np.array(self.group_parent, dtype=np.int64)
+        while True:
+            mask = ancestor >= 0
+            if not mask.any():
+                break
+            a = ancestor[mask]
+            psx, psy, pox, poy = sx[a], sy[a], ox[a], oy[a]
+            ox[mask] = ox[mask] * psx + pox
+            oy[mask] = oy[mask] * psy + poy
+            sx[mask] = sx[mask] * psx
+            sy[mask] = sy[mask] * psy
+            ancestor[mask] = ancestor[a]
+
+        return sx, sy, ox, oy
+
+    def _resolve_numpy(self) -> list:
+        if not self.shape_xfrm:
+            return []
+
+        raw = np.array(self.shape_xfrm, dtype=np.float64)
+        x, y, cx, cy = raw.T
+        group = np.array(self.shape_group, dtype=np.int64)
+
+        if self.group_parent:
+            sx, sy, ox, oy = self._group_world_numpy()
+            grouped = group >= 0
+            g = group[grouped]
+            x[grouped] = x[grouped] * sx[g] + ox[g]
+            y[grouped] = y[grouped] * sy[g] + oy[g]
+            cx[grouped] = cx[grouped] * sx[g]
+            cy[grouped] = cy[grouped] * sy[g]
+
+        # np.rint 与内置 round 一样采用银行家舍入
+        pixels = np.rint(raw / EMU_PER_INCH * PIXELS_PER_INCH).astype(np.int64)
+        return [tuple(row) for row in pixels.tolist()]
+
+    def _box_columns(self, indices):
+        """指定形状的 (x1, y1, x2, y2) 四列（NumPy 数组）"""
+        boxes = self.boxes if self.boxes is not None else self.resolve()
+        b = np.array(boxes, dtype=np.int64).reshape(-1, 4)
+        if indices is not None:
+            b = b[np.asarray(indices, dtype=np.int64)].reshape(-1, 4)
+        x1, y1 = b[:, 0], b[:, 1]
+        return x1, y1, x1 + b[:, 2], y1 + b[:, 3]
+
+    def _selected(self, indices) -> list:
+        """[(形状编号, 像素框), ...]"""
+        boxes = self.boxes if self.boxes is not None else self.resolve()
+        if indices is None:
+            return list(enumerate(boxes))
+        return [(i, boxes[i]) for i in indices]
+
+    def overlap_matrix(self, rows=None, cols=None):
+        """
+        重叠面积（像素²），matrix[a][b] 为形状 rows[a] 与 cols[b] 的交集面积
+
+        rows / cols 为形状编号列表，省略时为所有形状。
+        有 NumPy 时返回 ndarray，否则返回嵌套 list。
+        """
+        if np is not None:
+            ax1, ay1, ax2, ay2 = self._box_columns(rows)
+            bx1, by1, bx2, by2 = self._box_columns(cols)
+            w = np.minimum(ax2[:, None], bx2[None, :]) - np.maximum(ax1[:, None], bx1[None, :])
+            h = np.minimum(ay2[:, None], by2[None, :]) - np.maximum(ay1[:, None], by1[None, :])
+            return np.clip(w, 0, None) * np.clip(h, 0, None)
+
+        columns = self._selected(cols)
+        matrix = []
+        for _, (ax, ay, aw, ah) in self._selected(rows):
+            row = []
+            for _, (bx, by, bw, bh) in columns:
+                w = min(ax + aw, bx + bw) - max(ax, bx)
+                h = min(ay + ah, by + bh) - max(ay, by)
+                row.append(max(w, 0) * max(h, 0))
+            matrix.append(row)
+        return matrix
+
+    def containment_matrix(self, rows=None, cols=None):
+        """
+        包含关系，matrix[a][b] 为 True 表示形状 rows[a] 完全包住形状 cols[b]（同一形状为 False）
+
+        rows / cols 为形状编号列表，省略时为所有形状。
+        有 NumPy 时返回 ndarray，否则返回嵌套 list。
+        """
+        if np is not None:
+            ax1, ay1, ax2, ay2 = self._box_columns(rows)
+            bx1, by1, bx2, by2 = self._box_columns(cols)
+            matrix = ((ax1[:, None] <= bx1[None, :]) & (ay1[:, None] <= by1[None, :])
+                      & (ax2[:, None] >= bx2[None, :]) & (ay2[:, None] >= by2[None, :]))
+            row_ids = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.int64)
+            col_ids = np.arange(len(self)) if cols is None else np.asarray(cols, dtype=np.int64)
+            matrix &= row_ids[:, None] != col_ids[None, :]
+            return matrix
+
+        columns = self._selected(cols)
+        matrix = []
+        for i, (ax, ay, aw, ah) in self._selected(rows):
+            matrix.append([
+                i != j and ax <= bx and ay <= by and ax + aw >= bx + bw and ay + ah >= by + bh
+                for j, (bx, by, bw, bh) in columns
+            ])
+        return matrix
@@ -0,0 +1,329 @@
+"""
+版式 / 母版 / 主题继承解析
+
+PowerPoint 中没有显式写出的字体、字号、颜色和位置，需要沿
+形状 → 版式占位符 → 母版占位符 → 母版文本样式 → 演示文稿默认样式
+逐级查找，主题颜色（schemeClr）还要经过母版的 clrMap 映射到主题配色。
+
+每个主题、母版、版式在一个演示文稿中只解析一次，结果是只包含基础类型的
+dict / tuple，可以随 deck 一起发给工作进程。按幻灯片构造的
+`SlideStyleResolver` 会缓存每个占位符 (type, idx) 的合并结果，
+单个形状的查找是常数时间。
+
+部件用提取器选定的 XML 后端解析（见 ppt_xml.py），多级路径查找经后端预先编译。
+"""
+
+from ppt_xml import get_backend
+
+P_NS = 'http://schemas.openxmlformats.org/presentationml/2006/main'
+A_NS = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+
+_P = f'{{{P_NS}}}'
+_A = f'{{{A_NS}}}'
+
+# 主题配色中的槽位
+THEME_COLOR_SLOTS = (
+    'dk1', 'lt1', 'dk2', 'lt2',
+    'accent1', 'accent2', 'accent3', 'accent4', 'accent5', 'accent6',
+    'hlink', 'folHlink',
+)
+
+# 没有 clrMap 时 PowerPoint 的默认映射
+DEFAULT_CLR_MAP = {
+    'bg1': 'lt1', 'tx1': 'dk1', 'bg2': 'lt2', 'tx2': 'dk2',
+    'accent1': 'accent1', 'accent2': 'accent2', 'accent3': 'accent3',
+    'accent4': 'accent4', 'accent5': 'accent5', 'accent6': 'accent6',
+    'hlink': 'hlink', 'folHlink': 'folHlink',
+}
+
+# 文本属性的键：字号（磅）、颜色、字体、对齐
+TEXT_PROP_KEYS = ('size', 'color', 'font', 'align')
+
+
+def parse_color(fill) -> tuple | None:
+    """
+    解析 solidFill（或任何直接包含颜色子节点的元素）
+
+    Returns:
+        `('srgb', 'RRGGBB', alpha)` 或 `('scheme', 'tx1', alpha)`，alpha 为 0-100；
+        没有可识别的颜色时返回 None
+    """
+    if fill is None:
+        return None
+
+    for clr in fill:
+        tag = clr.tag
+        if tag == f'{_A}srgbClr':
+            kind, val = 'srgb', clr.get('val', '000000')
+        elif tag == f'{_A}schemeClr':
+            kind, val = 'scheme', clr.get('val', 'tx1')
+        elif tag == f'{_A}sysClr':
+            kind, val = 'srgb', clr.get('lastClr', '000000')
+        else:
+            continue
+
+        alpha = 100
+        alpha_elem = clr.find(f'{_A}alpha')
+        if alpha_elem is not None:
+            alpha = int(int(alpha_elem.get('val', '100000')) / 1000)
+        return kind, val, alpha
+
+    return None
+
+
+def _text_props(lvl_ppr) -> dict:
+    """从 lvl1pPr（含 defRPr）中读取文本属性，缺失的键不出现在结果里"""
+    props = {}
+    if lvl_ppr is None:
+        return props
+
+    algn = lvl_ppr.get('algn')
+    if algn:
+        props['align'] = algn
+
+    def_rpr = lvl_ppr.find(f'{_A}defRPr')
+    if def_rpr is not None:
+        sz = def_rpr.get('sz')
+        if sz:
+            props['size'] = int(sz) // 100
+        color = parse_color(def_rpr.find(f'{_A}solidFill'))
+        if color is not None:
+            props['color'] = color
+        latin = def_rpr.find(f'{_A}latin')
+        if latin is not None and latin.get('typeface'):
+            props['font'] = latin.get('typeface')
+
+    return props
+
+
+def list_style_props(container) -> dict:
+    """读取 lstStyle / txStyles 子样式等容器中第一级段落的文本属性"""
+    if container is None:
+        return {}
+    return _text_props(container.find(f'{_A}lvl1pPr'))
+
+
+def _placeholder_key(ph) -> tuple:
+    """占位符的 (type, idx)，type 缺省为 obj"""
+    return ph.get('type', 'obj'), ph.get('idx')
+
+
+def _parse_placeholders(root, backend) -> dict:
+    """收集部件中的占位符：`{'by_idx': {...}, 'by_type': {...}}`"""
+    find_ph = backend.path('p:nvSpPr/p:nvPr/p:ph')
+    find_off = backend.path('p:spPr/a:xfrm/a:off')
+    find_ext = backend.path('p:spPr/a:xfrm/a:ext')
+    find_lst_style = backend.path('p:txBody/a:lstStyle')
+    by_idx = {}
+    by_type = {}
+    for sp in root.iter(f'{_P}sp'):
+        ph = find_ph(sp)
+        if ph is None:
+            continue
+
+        ph_type, ph_idx = _placeholder_key(ph)
+        xfrm = None
+        off = find_off(sp)
+        ext = find_ext(sp)
+        if off is not None and ext is not None:
+            xfrm = (int(off.get('x', 0)), int(off.get('y', 0)),
+                    int(ext.get('cx', 0)), int(ext.get('cy', 0)))
+
+        entry = {
+            'xfrm': xfrm,
+            'text': list_style_props(find_lst_style(sp)),
+        }
+        if ph_idx is not None:
+            by_idx.setdefault(ph_idx, entry)
+        by_type.setdefault(ph_type, entry)
+
+    return {'by_idx': by_idx, 'by_type': by_type}
+
+
+def _parse_clr_map(elem) -> dict | None:
+    return dict(elem.attrib) if elem is not None else None
+
+
+def parse_theme(data: bytes, backend=None) -> dict:
+    """解析主题：配色方案和主/次字体"""
+    backend = backend or get_backend()
+    root = backend.fromstring(data)
+    colors = {}
+    scheme = backend.path('a:themeElements/a:clrScheme')(root)
+    if scheme is not None:
+        for slot in THEME_COLOR_SLOTS:
+            color = parse_color(scheme.find(f'{_A}{slot}'))
+            if color is not None:
+                colors[slot] = color[1]
+
+    fonts = {}
+    font_scheme = backend.path('a:themeElements/a:fontScheme')(root)
+    if font_scheme is not None:
+        for key, tag in (('major', 'majorFont'), ('minor', 'minorFont')):
+            latin = backend.path(f'a:{tag}/a:latin')(font_scheme)
+            if latin is not None and latin.get('typeface'):
+                fonts[key] = latin.get('typeface')
+
+    return {'colors': colors, 'fonts': fonts}
+
+
+def parse_master(data: bytes, backend=None) -> dict:
+    """解析母版：clrMap、占位符和 title/body/other 文本样式"""
+    backend = backend or get_backend()
+    root = backend.fromstring(data)
+    tx_styles = root.find(f'{_P}txStyles')
+    text_styles = {}
+    if tx_styles is not None:
+        for key, tag in (('title', 'titleStyle'), ('body', 'bodyStyle'), ('other', 'otherStyle')):
+            text_styles[key] = list_style_props(tx_styles.find(f'{_P}{tag}'))
+
+    return {
+        'clr_map': _parse_clr_map(root.find(f'{_P}clrMap')) or dict(DEFAULT_CLR_MAP),
+        'placeholders': _parse_placeholders(root, backend),
+        'text_styles': text_styles,
+    }
+
+
+def parse_layout(data: bytes, backend=None) -> dict:
+    """解析版式：占位符和可选的 clrMap 覆盖"""
+    backend = backend or get_backend()
+    root = backend.fromstring(data)
+    override = backend.path('p:clrMapOvr/a:overrideClrMapping')(root)
+    return {
+        'clr_map': _parse_clr_map(override),
+        'placeholders': _parse_placeholders(root, backend),
+    }
+
+
+def parse_default_text_style(presentation_root) -> dict:
+    """演示文稿 defaultTextStyle 第一级的文本属性（非占位符文本的兜底样式）"""
+    if presentation_root is None:
+        return {}
+    return list_style_props(presentation_root.find(f'{_P}defaultTextStyle'))
+
+
+def build_style_index(read_part, slides: list, presentation_root=None, backend=None) -> dict:
+    """
+    为整个演示文稿建立样式索引，每个部件只解析一次
+
+    Args:
+        read_part: 读取压缩包部件字节的函数，部件不存在时返回 None
+        slides: `_load_deck` 得到的幻灯片信息（含 layout / master / theme 部件名）
+        presentation_root: presentation.xml 的根节点
+        backend: XML 后端（ppt_xml.get_backend() 的返回值），None 表示默认后端
+
+    Returns:
+        `{'themes': {part: ...}, 'masters': {part: ...}, 'layouts': {part: ...},
+        'default_text': {...}}`
+    """
+    index = {
+        'themes': {},
+        'masters': {},
+        'layouts': {},
+        'default_text': parse_default_text_style(presentation_root),
+    }
+    parsers = (('themes', 'theme', parse_theme),
+               ('masters', 'master', parse_master),
+               ('layouts', 'layout', parse_layout))
+
+    for slide in slides:
+        for bucket, key, parser in parsers:
+            part = slide.get(key)
+            if not part or part in index[bucket]:
+                continue
+            data = read_part(part)
+            index[bucket][part] = parser(data, backend) if data is not None else None
+
+    return index
+
+
+class SlideStyleResolver:
+    """单页幻灯片的继承解析器"""
+
+    _EMPTY_PLACEHOLDERS = {'by_idx': {}, 'by_type': {}}
+
+    def __init__(self, styles: dict | None, slide: dict | None):
+        styles = styles or {}
+        slide = slide or {}
+        self.theme = styles.get('themes', {}).get(slide.get('theme')) or {'colors': {}, 'fonts': {}}
+        self.master = styles.get('masters', {}).get(slide.get('master')) or {}
+        self.layout = styles.get('layouts', {}).get(slide.get('layout')) or {}
+        self.default_text = styles.get('default_text', {})
+
+        # 版式的 clrMap 覆盖优先于母版
+        self.clr_map = self.layout.get('clr_map') or self.master.get('clr_map') or DEFAULT_CLR_MAP
+        self._placeholder_cache = {}
+
+    def _find_placeholder(self, part: dict, ph_type: str, ph_idx: str | None) -> dict | None:
+        placeholders = part.get('placeholders', self._EMPTY_PLACEHOLDERS)
+        if ph_idx is not None and ph_idx in placeholders['by_idx']:
+            return placeholders['by_idx'][ph_idx]
+        return placeholders['by_type'].get(ph_type)
+
+    def _master_text_style(self, ph_type: str | None) -> dict:
+        text_styles = self.master.get('text_styles', {})
+        if ph_type in ('title', 'ctrTitle'):
+            return text_styles.get('title', {})
+        if ph_type in ('body', 'subTitle', 'obj'):
+            return text_styles.get('body', {})
+        return text_styles.get('other', {})
+
+    def placeholder(self, ph) -> dict:
+        """
+        合并后的占位符信息 `{'xfrm': (x, y, cx, cy) | None, 'text': {...}}`
+
+        Args:
+            ph: 形状的 `p:ph` 节点，None 表示普通（非占位符）形状
+        """
+        key = _placeholder_key(ph) if ph is not None else None
+        cached = self._placeholder_cache.get(key)
+        if cached is not None:
+            return cached
+
+        if key is None:
+            chain = [self.default_text]
+            xfrm = None
+        else:
+            ph_type, ph_idx = key
+            # 母版占位符只按类型匹配
+            master_type = {'ctrTitle': 'title', 'subTitle': 'body', 'obj': 'body'}.get(ph_type, ph_type)
+            layout_ph = self._find_placeholder(self.layout, ph_type, ph_idx) or {}
+            master_ph = self._find_placeholder(self.master, master_type, None) or {}
+            chain = [
+                layout_ph.get('text', {}),
+                master_ph.get('text', {}),
+                self._master_text_style(ph_type),
+                self.default_text,
+            ]
+            xfrm = layout_ph.get('xfrm') or master_ph.get('xfrm')
+
+        text = {}
+        for props in chain:
+            for prop_key in TEXT_PROP_KEYS:
+                if prop_key not in text and prop_key in props:
+                    text[prop_key] = props[prop_key]
+
+        resolved = {'xfrm': xfrm, 'text': text}
+        self._placeholder_cache[key] = resolved
+        return resolved
+
+    def color_hex(self, color: tuple | None) -> tuple | None:
+        """把 parse_color 的结果解析成 `('#RRGGBB', alpha)`，无法解析时返回 None"""
+        if color is None:
+            return None
+
+        kind, val, alpha = color
+        if kind == 'scheme':
+            slot = self.clr_map.get(val, val)
+            val = self.theme['colors'].get(slot)
+            if val is None:
+                return None
+        return f'#{val}', alpha
+
+    def font(self, typeface: str | None) -> str | None:
+        """把主题字体引用（+mj-lt / +mn-lt）解析成实际字体名"""
+        if typeface == '+mj-lt':
+            return self.theme['fonts'].get('major')
+        if typeface == '+mn-lt':
+            return self.theme['fonts'].get('minor')
+        return typeface
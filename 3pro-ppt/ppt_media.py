@@ -0,0 +1,76 @@
+"""
+媒体资源库
+
+图片元素通过 r:embed 引用 `ppt/media/*`。资源按内容的 SHA-256 存放：
+
+    <store>/<hash 前两位>/<hash><扩展名>
+
+同一张图片无论出现在多少个 PPTX、多少页中都只保存一份（Canva 导出的模板
+大量复用相同的背景和图标）。读取时直接从压缩包流式读取，不解压整个文件：
+先只计算哈希，资源库里已经有的就不再写盘；新资源再读一遍写入临时文件，
+原子替换到最终位置，多个进程同时写同一资源也是安全的。
+"""
+
+import hashlib
+import os
+import posixpath
+import tempfile
+import zipfile
+from pathlib import Path
+
+
+def _copy_chunks(source, chunk_size: int):
+    return iter(lambda: source.read(chunk_size), b'')
+
+
+class MediaStore:
+    """基于内容哈希的媒体资源库"""
+
+    def __init__(self, store_dir, chunk_size: int = 1 << 20):
+        self.store_dir = Path(store_dir)
+        self.chunk_size = chunk_size
+        # 新写入 / 已存在而复用的资源数，以及复用省下的字节数
+        self.stored = 0
+        self.reused = 0
+        self.bytes_saved = 0
+
+    @staticmethod
+    def asset_path(content_hash: str, suffix: str) -> str:
+        """资源相对于资源库根目录的路径（元素中保存的就是这个引用）"""
+        return f"{content_hash[:2]}/{content_hash}{suffix}"
+
+    def has(self, asset: str | None) -> bool:
+        return bool(asset) and (self.store_dir / asset).is_file()
+
+    def put_zip_entry(self, zip_ref: zipfile.ZipFile, part: str) -> str:
+        """把压缩包中的一个部件存入资源库，返回资源引用"""
+        digest = hashlib.sha256()
+        with zip_ref.open(part) as source:
+            for chunk in _copy_chunks(source, self.chunk_size):
+                digest.update(chunk)
+
+        suffix = posixpath.splitext(part)[1].lower()
+        asset = self.asset_path(digest.hexdigest(), suffix)
+        target = self.store_dir / asset
+        if target.is_file():
+            self.reused += 1
+            self.bytes_saved += zip_ref.getinfo(part).file_size
+            return asset
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=target.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f, zip_ref.open(part) as source:
+                for chunk in _copy_chunks(source, self.chunk_size):
+                    f.write(chunk)
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        self.stored += 1
+        return asset
+
+    def stats(self) -> dict:
+        return {'stored': self.stored, 'reused': self.reused, 'bytes_saved': self.bytes_saved}
@@ -0,0 +1,151 @@
+"""
+提取过程的分阶段性能记录
+
+`ExtractProfiler` 按阶段累计墙钟时间、CPU 时间和内存块增量，并统计各类
+节点 / 元素的数量。提取器的 profiler 为 None 时，阶段入口返回同一个空的
+上下文管理器，形状循环里也只多一次 `is not None` 判断，不做任何记录。
+
+阶段：
+    hash          计算文件哈希（缓存键）
+    cache         读缓存并还原元素
+    open          打开压缩包（读取中央目录）
+    presentation  读取并解析 presentation.xml
+    rels          读取并解析 .rels 关系文件
+    styles        解析主题 / 母版 / 版式（build_style_index）
+    slide_parse   流式解析幻灯片 XML、构造形状记录（含文本框解析）
+    geometry      合成组变换、换算像素坐标
+    elements      构造元素对象并推断槽位
+    slides_pool   --slide-jobs 时在进程池中解析全部幻灯片
+    media         图片存入资源库
+    codegen       生成 TypeScript
+
+alloc_blocks 是阶段前后 `sys.getallocatedblocks()` 的差，即该阶段新增且
+仍然存活的内存块数，可以看出哪个阶段留下了大量对象；负数表示释放多于分配。
+"""
+
+import sys
+import time
+from collections import Counter
+
+
+class _NullPhase:
+    """关闭记录时使用的空上下文管理器"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    __slots__ = ('profiler', 'name', 'wall', 'cpu', 'blocks')
+
+    def __init__(self, profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.blocks = sys.getallocatedblocks()
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        self.profiler.add(self.name, wall, cpu, sys.getallocatedblocks() - self.blocks)
+        return False
+
+
+class ExtractProfiler:
+    """单个 PPTX 的分阶段记录"""
+
+    def __init__(self):
+        # 阶段名 -> [调用次数, 墙钟秒数, CPU 秒数, 内存块增量]
+        self.phases = {}
+        self.counts = Counter()
+
+    def phase(self, name: str) -> _Phase:
+        """`with profiler.phase('styles'): ...`；同名阶段多次进入时累加"""
+        return _Phase(self, name)
+
+    def add(self, name: str, wall: float, cpu: float = 0.0, blocks: int = 0):
+        entry = self.phases.get(name)
+        if entry is None:
+            self.phases[name] = [1, wall, cpu, blocks]
+        else:
+            entry[0] += 1
+            entry[1] += wall
+            entry[2] += cpu
+            entry[3] += blocks
+
+    def count(self, kind: str, n: int = 1):
+        self.counts[kind] += n
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(entry[1] for entry in self.phases.values())
+
+    def to_dict(self) -> dict:
+        """可 JSON 序列化 / pickle 的结果（阶段按耗时从高到低排列）"""
+        ordered = sorted(self.phases.items(), key=lambda item: -item[1][1])
+        return {
+            'total_ms': round(self.total_seconds * 1000, 3),
+            'phases': {
+                name: {
+                    'calls': calls,
+                    'wall_ms': round(wall * 1000, 3),
+                    'cpu_ms': round(cpu * 1000, 3),
+                    'alloc_blocks': blocks,
+                }
+                for name, (calls, wall, cpu, blocks) in ordered
+            },
+            'counts': dict(sorted(self.counts.items())),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ExtractProfiler':
+        """从 to_dict() 的结果还原（例如在主进程里继续记录 codegen）"""
+        profiler = cls()
+        for name, entry in data.get('phases', {}).items():
+            profiler.phases[name] = [entry['calls'], entry['wall_ms'] / 1000,
+                                     entry['cpu_ms'] / 1000, entry['alloc_blocks']]
+        profiler.counts.update(data.get('counts', {}))
+        return profiler
+
+
+def corpus_report(decks: list) -> dict:
+    """
+    汇总整个语料的报告
+
+    Args:
+        decks: `[{'file': ..., 'cached': bool, 'profile': ExtractProfiler.to_dict()}, ...]`
+
+    Returns:
+        `{'decks': [...按总耗时从高到低...], 'phases': {...全部文件合计...}, 'counts': {...}}`，
+        phases 中的 share 为该阶段占全部耗时的比例
+    """
+    totals = ExtractProfiler()
+    for deck in decks:
+        restored = ExtractProfiler.from_dict(deck['profile'])
+        for name, (calls, wall, cpu, blocks) in restored.phases.items():
+            totals.add(name, wall, cpu, blocks)
+            totals.phases[name][0] += calls - 1
+        totals.counts.update(restored.counts)
+
+    summary = totals.to_dict()
+    corpus_ms = summary['total_ms'] or 1.0
+    for entry in summary['phases'].values():
+        entry['share'] = round(entry['wall_ms'] / corpus_ms, 4)
+    return {
+        'total_ms': summary['total_ms'],
+        'phases': summary['phases'],
+        'counts': summary['counts'],
+        'decks': sorted(decks, key=lambda deck: -deck['profile']['total_ms']),
+    }
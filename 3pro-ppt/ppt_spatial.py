@@ -0,0 +1,167 @@
+"""
+幻灯片内元素的空间索引
+
+均匀网格：按元素数量自动确定格子大小（平均每格约一个元素），每个元素登记到
+它覆盖的所有格子中。查询只访问与目标区域相交的格子，不再两两比较：
+
+- `query`：与矩形相交的元素；
+- `containers` / `contained`：完全包住某个元素的元素 / 被某个元素完全包住的元素；
+- `nearest`：最近邻，按格子环逐圈向外扩展，找到的距离小于下一圈的
+  最小可能距离时立即停止。
+
+元素框统一为 (x, y, width, height)，编号即在 boxes 中的下标。
+"""
+
+import math
+
+
+def box_distance(a: tuple, b: tuple) -> float:
+    """两个框之间的最短距离，相交或相接时为 0"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    dx = max(bx - (ax + aw), ax - (bx + bw), 0)
+    dy = max(by - (ay + ah), ay - (by + bh), 0)
+    return math.hypot(dx, dy)
+
+
+def box_contains(outer: tuple, inner: tuple) -> bool:
+    """outer 是否完全包住 inner（边界重合也算）"""
+    ox, oy, ow, oh = outer
+    ix, iy, iw, ih = inner
+    return ox <= ix and oy <= iy and ox + ow >= ix + iw and oy + oh >= iy + ih
+
+
+class SpatialIndex:
+    """基于均匀网格的空间索引"""
+
+    def __init__(self, boxes: list, cell_size: int | None = None):
+        self.boxes = list(boxes)
+        # 格子坐标 (col, row) -> 元素编号列表；稀疏存储，负坐标也可以
+        self.cells = {}
+
+        if cell_size is None:
+            cell_size = self._auto_cell_size(self.boxes)
+        self.cell_size = cell_size
+
+        self._min_col = self._min_row = 0
+        self._max_col = self._max_row = -1
+        for i, box in enumerate(self.boxes):
+            col1, row1, col2, row2 = self._cell_range(box)
+            for col in range(col1, col2 + 1):
+                for row in range(row1, row2 + 1):
+                    self.cells.setdefault((col, row), []).append(i)
+            if i == 0:
+                self._min_col, self._min_row, self._max_col, self._max_row = col1, row1, col2, row2
+            else:
+                self._min_col = min(self._min_col, col1)
+                self._min_row = min(self._min_row, row1)
+                self._max_col = max(self._max_col, col2)
+                self._max_row = max(self._max_row, row2)
+
+    @staticmethod
+    def _auto_cell_size(boxes: list) -> int:
+        """格子边长：让所有元素的外接矩形大约划分成 len(boxes) 个格子"""
+        if not boxes:
+            return 1
+        x1 = min(b[0] for b in boxes)
+        y1 = min(b[1] for b in boxes)
+        x2 = max(b[0] + b[2] for b in boxes)
+        y2 = max(b[1] + b[3] for b in boxes)
+        area = max(x2 - x1, 1) * max(y2 - y1, 1)
+        return max(1, math.ceil(math.sqrt(area / len(boxes))))
+
+    def _cell_range(self, box: tuple) -> tuple:
+        x, y, w, h = box
+        c = self.cell_size
+        return x // c, y // c, (x + max(w, 0)) // c, (y + max(h, 0)) // c
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def query(self, box: tuple) -> list:
+        """与 box 相交（含边界相接）的元素编号，按编号排序"""
+        x, y, w, h = box
+        col1, row1, col2, row2 = self._cell_range(box)
+        col1, row1 = max(col1, self._min_col), max(row1, self._min_row)
+        col2, row2 = min(col2, self._max_col), min(row2, self._max_row)
+
+        found = set()
+        for col in range(col1, col2 + 1):
+            for row in range(row1, row2 + 1):
+                for i in self.cells.get((col, row), ()):
+                    if i in found:
+                        continue
+                    bx, by, bw, bh = self.boxes[i]
+                    if bx <= x + w and x <= bx + bw and by <= y + h and y <= by + bh:
+                        found.add(i)
+        return sorted(found)
+
+    def containers(self, i: int) -> list:
+        """完全包住第 i 个元素的其他元素"""
+        box = self.boxes[i]
+        # 包住 i 的元素一定覆盖 i 左上角所在的格子
+        col, row = box[0] // self.cell_size, box[1] // self.cell_size
+        return sorted(j for j in self.cells.get((col, row), ())
+                      if j != i and box_contains(self.boxes[j], box))
+
+    def contained(self, i: int) -> list:
+        """被第 i 个元素完全包住的其他元素"""
+        box = self.boxes[i]
+        return [j for j in self.query(box) if j != i and box_contains(box, self.boxes[j])]
+
+    def nearest(self, i: int, predicate=None, max_distance: float | None = None) -> int | None:
+        """
+        离第 i 个元素最近的其他元素
+
+        Args:
+            predicate: 可选的过滤函数 `predicate(j) -> bool`（例如只要下方的文本）
+            max_distance: 超过该距离的元素不考虑
+
+        Returns:
+            元素编号，距离相同时取编号小的；没有符合条件的元素时返回 None
+        """
+        box = self.boxes[i]
+        col1, row1, col2, row2 = self._cell_range(box)
+        max_ring = max(col1 - self._min_col, row1 - self._min_row,
+                       self._max_col - col2, self._max_row - row2, 0)
+
+        best = None
+        best_distance = math.inf if max_distance is None else max_distance
+        seen = {i}
+        for ring in range(max_ring + 1):
+            # 第 ring 圈及以外的元素距离至少为 (ring - 1) * cell_size
+            if best is not None and best_distance < (ring - 1) * self.cell_size:
+                break
+            if max_distance is not None and (ring - 1) * self.cell_size > max_distance:
+                break
+
+            for col, row in self._ring_cells(col1, row1, col2, row2, ring):
+                for j in self.cells.get((col, row), ()):
+                    if j in seen:
+                        continue
+                    seen.add(j)
+                    if predicate is not None and not predicate(j):
+                        continue
+                    distance = box_distance(box, self.boxes[j])
+                    if distance < best_distance or (distance == best_distance and (best is None or j < best)):
+                        best, best_distance = j, distance
+
+        return best
+
+    @staticmethod
+    def _ring_cells(col1: int, row1: int, col2: int, row2: int, ring: int):
+        """与格子范围 [col1, col2] × [row1, row2] 的切比雪夫距离恰好为 ring 的格子"""
+        if ring == 0:
+            for col in range(col1, col2 + 1):
+                for row in range(row1, row2 + 1):
+                    yield col, row
+            return
+
+        top, bottom = row1 - ring, row2 + ring
+        left, right = col1 - ring, col2 + ring
+        for col in range(left, right + 1):
+            yield col, top
+            yield col, bottom
+        for row in range(top + 1, bottom):
+            yield left, row
+            yield right, row
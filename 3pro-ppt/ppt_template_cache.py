@@ -0,0 +1,74 @@
+"""
+PPT 模板提取缓存
+
+以 PPTX 文件内容哈希 + 提取器版本作为键，持久化保存解析结果 `{size, slides}`
+（每页 `{index, part, elements}`，见 ppt_elements.result_to_dict）。
+文件内容不变且提取器版本不变时直接复用，避免重复解析。
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+
+def hash_file(path, chunk_size: int = 1 << 20) -> str:
+    """计算文件内容的 SHA-256（分块读取，不会把整个文件读入内存）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_if_changed(path: Path, content: str) -> bool:
+    """内容有变化时才写文件，返回是否实际写入"""
+    path = Path(path)
+    if path.exists():
+        try:
+            if path.read_text(encoding='utf-8') == content:
+                return False
+        except (OSError, UnicodeDecodeError):
+            pass
+    path.write_text(content, encoding='utf-8')
+    return True
+
+
+class TemplateCache:
+    """基于内容哈希的提取结果缓存"""
+
+    def __init__(self, cache_dir, version: str):
+        self.cache_dir = Path(cache_dir)
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, content_hash: str) -> Path:
+        return self.cache_dir / f"v{self.version}-{content_hash}.json"
+
+    def get(self, content_hash: str) -> dict | None:
+        """读取缓存，未命中或缓存文件损坏时返回 None"""
+        path = self._entry_path(content_hash)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return data
+
+    def put(self, content_hash: str, data: dict):
+        """写入缓存（先写临时文件再原子替换，避免留下半个文件）"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self._entry_path(content_hash))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
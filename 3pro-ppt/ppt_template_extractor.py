@@ -2,19 +2,54 @@
 PPT 模板提取器
 
 从 .pptx 文件中提取模板元素信息，并生成 TypeScript 模板配置。
-支持 Canvas/Canva 导出的 PPT 文件。
+支持 Canvas/Canva 导出的 PPT 文件，多页文件的每一页都会生成一个模板。
 
 使用方法：
     python ppt_template_extractor.py
+    python ppt_template_extractor.py --extract-to-disk   # 调试：同时解压到 <stem>_extracted
+    python ppt_template_extractor.py --no-cache          # 忽略缓存，全部重新解析
+    python ppt_template_extractor.py --jobs 8            # 8 个进程并行解析（0 = CPU 核数）
+    python ppt_template_extractor.py --slide-jobs 8      # 单个多页 PPTX 内按页并行解析
+    python ppt_template_extractor.py --no-media          # 不导出图片资源
+    python ppt_template_extractor.py --no-cache --profile-report profile.json
+                                                         # 分阶段耗时报告（见 ppt_profile.py）
+    python ppt_template_extractor.py --no-cache --cprofile-dir profiles/
+                                                         # 每个 PPTX 一份 cProfile 结果
+    python ppt_template_extractor.py --xml-backend lxml  # 指定 XML 后端（默认 etree）
+    python ppt_template_extractor.py --check-backends    # 比较两个 XML 后端的输出是否一致
 """
 
+import argparse
+import io
 import os
+import posixpath
+import sys
+import tempfile
+import time
+import traceback
 import zipfile
-import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import json
 import re
 
+from ppt_elements import (
+    ElementTable,
+    FillElement,
+    ImageElement,
+    TemplateElement,
+    TextElement,
+    result_from_dict,
+    result_to_dict,
+)
+from ppt_geometry import SlideGeometry
+from ppt_inheritance import SlideStyleResolver, build_style_index, list_style_props, parse_color
+from ppt_media import MediaStore
+from ppt_profile import NULL_PHASE, ExtractProfiler, corpus_report
+from ppt_spatial import SpatialIndex
+from ppt_template_cache import TemplateCache, hash_file, write_if_changed
+from ppt_xml import BACKENDS, get_backend, lxml_available
+
 
 # EMU 到像素的转换
 # 1 inch = 914400 EMUs
@@ -36,58 +71,309 @@ def parse_srgb_color(color_str: str) -> str:
 class PPTXTemplateExtractor:
     """从 PPTX 文件中提取模板信息"""
     
+    # 解析输出有变化时递增，旧版本的缓存会自动失效
+    VERSION = '8'
+    
     NAMESPACES = {
         'p': 'http://schemas.openxmlformats.org/presentationml/2006/main',
         'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
         'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
     }
     
-    def __init__(self, pptx_path: str):
+    # 预先拼好的带命名空间标签，解析时直接比较 tag，不再每次拼 f-string
+    _SP = f"{{{NAMESPACES['p']}}}sp"
+    _PIC = f"{{{NAMESPACES['p']}}}pic"
+    _GRP_SP = f"{{{NAMESPACES['p']}}}grpSp"
+    _GRP_SP_PR = f"{{{NAMESPACES['p']}}}grpSpPr"
+    # 流式解析时需要事件的节点（lxml 后端只为这些节点产生事件）
+    _STREAM_TAGS = (_SP, _PIC, _GRP_SP, _GRP_SP_PR)
+    _NV_SP_PR = f"{{{NAMESPACES['p']}}}nvSpPr"
+    _C_NV_PR = f"{{{NAMESPACES['p']}}}cNvPr"
+    _SP_PR = f"{{{NAMESPACES['p']}}}spPr"
+    _TX_BODY = f"{{{NAMESPACES['p']}}}txBody"
+    _XFRM = f"{{{NAMESPACES['a']}}}xfrm"
+    _OFF = f"{{{NAMESPACES['a']}}}off"
+    _EXT = f"{{{NAMESPACES['a']}}}ext"
+    _CH_OFF = f"{{{NAMESPACES['a']}}}chOff"
+    _CH_EXT = f"{{{NAMESPACES['a']}}}chExt"
+    _BLIP_FILL = f"{{{NAMESPACES['a']}}}blipFill"
+    _P_BLIP_FILL = f"{{{NAMESPACES['p']}}}blipFill"
+    _BLIP = f"{{{NAMESPACES['a']}}}blip"
+    _R_EMBED = f"{{{NAMESPACES['r']}}}embed"
+    _SOLID_FILL = f"{{{NAMESPACES['a']}}}solidFill"
+    _A_P = f"{{{NAMESPACES['a']}}}p"
+    _P_PR = f"{{{NAMESPACES['a']}}}pPr"
+    _R = f"{{{NAMESPACES['a']}}}r"
+    _R_PR = f"{{{NAMESPACES['a']}}}rPr"
+    _T = f"{{{NAMESPACES['a']}}}t"
+    _LATIN = f"{{{NAMESPACES['a']}}}latin"
+    _NV_PR = f"{{{NAMESPACES['p']}}}nvPr"
+    _PH = f"{{{NAMESPACES['p']}}}ph"
+    _LST_STYLE = f"{{{NAMESPACES['a']}}}lstStyle"
+    
+    # 幻灯片解析只需要这些 XML 部件，媒体文件不会被解压
+    PRESENTATION_PART = 'ppt/presentation.xml'
+    
+    # 关系类型（取 Type URI 的最后一段）
+    REL_SLIDE = 'slide'
+    REL_SLIDE_LAYOUT = 'slideLayout'
+    REL_SLIDE_MASTER = 'slideMaster'
+    REL_THEME = 'theme'
+    
+    def __init__(self, pptx_path: str, extract_to_disk: bool = False, slide_jobs: int = 1,
+                 profiler: ExtractProfiler | None = None, xml_backend: str | None = None):
+        """
+        Args:
+            pptx_path: PPTX 文件路径
+            extract_to_disk: 调试用，额外把整个压缩包解压到 `<stem>_extracted` 目录
+            slide_jobs: 并行解析幻灯片的进程数，1 表示在当前进程内顺序解析
+            profiler: 记录各阶段耗时和元素数量，None 表示不记录
+            xml_backend: XML 解析后端 'etree' / 'lxml'，None 表示默认后端（见 ppt_xml.py）
+        """
         self.pptx_path = pptx_path
+        self.profiler = profiler
+        self.xml = get_backend(xml_backend)
+        self.extract_to_disk = extract_to_disk
+        self.slide_jobs = slide_jobs
         self.temp_dir = None
-        self.elements = []
+        self.slides = []
         self.slide_size = {'width': 0, 'height': 0}
+        self.deck = None
+        self._styles = SlideStyleResolver(None, None)
+        self._slide_rels = {}
+        self._result = None
+    
+    @classmethod
+    def from_data(cls, pptx_path: str, data: dict) -> 'PPTXTemplateExtractor':
+        """
+        用已解析好的结果构造提取器，不再读取 PPTX
         
+        data 与 extract() 的返回结构相同；缓存中的纯 dict 需先经 result_from_dict 还原。
+        """
+        extractor = cls(pptx_path)
+        extractor.slide_size = data['size']
+        extractor.slides = data['slides']
+        extractor._result = data
+        return extractor
+    
+    def _phase(self, name: str):
+        """阶段计时的上下文管理器；不记录时返回空操作的 NULL_PHASE"""
+        return self.profiler.phase(name) if self.profiler is not None else NULL_PHASE
+    
+    @property
+    def elements(self) -> list:
+        """第一张幻灯片的元素（单页模板的常用入口）"""
+        return self.slides[0]['elements'] if self.slides else []
+    
     def extract(self) -> dict:
-        """提取 PPT 模板信息"""
-        # 创建临时解压目录
-        extract_dir = Path(self.pptx_path).parent / f"{Path(self.pptx_path).stem}_extracted"
+        """
+        提取 PPT 模板信息（同一实例只解析一次）
         
-        # 解压 PPTX 文件
-        with zipfile.ZipFile(self.pptx_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_dir)
+        Returns:
+            `{'size': {...}, 'slides': [{'index', 'part', 'elements'}, ...]}`，
+            slides 按 presentation.xml 中 sldIdLst 的顺序排列，elements 为
+            TemplateElement 对象，需要 dict / JSON 时用 result_to_dict 转换
+        """
+        if self._result is not None:
+            return self._result
+        
+        with self._phase('open'):
+            zip_ref = zipfile.ZipFile(self.pptx_path, 'r')
+        with zip_ref:
+            if self.extract_to_disk:
+                # 调试模式：完整解压到磁盘，便于人工查看 XML
+                extract_dir = Path(self.pptx_path).parent / f"{Path(self.pptx_path).stem}_extracted"
+                zip_ref.extractall(extract_dir)
+                self.temp_dir = extract_dir
+            
+            # 整个演示文稿共享的数据只解析一次
+            self.deck = self._load_deck(zip_ref)
+            slide_infos = self.deck['slides']
+            
+            if self.slide_jobs <= 1 or len(slide_infos) <= 1:
+                # 顺序解析：直接流式读取压缩包内的 XML
+                slide_elements = []
+                for info in slide_infos:
+                    with zip_ref.open(info['part']) as slide_file:
+                        slide_elements.append(self._parse_slide(slide_file, info))
+            else:
+                slide_xml = [zip_ref.read(info['part']) for info in slide_infos]
+                slide_elements = None
+        
+        if slide_elements is None:
+            # 每页幻灯片相互独立，分发到进程池并行解析
+            with self._phase('slides_pool'), \
+                    ProcessPoolExecutor(max_workers=min(self.slide_jobs, len(slide_xml))) as executor:
+                slide_elements = list(executor.map(
+                    _parse_slide_worker,
+                    [self.pptx_path] * len(slide_xml),
+                    [self.deck] * len(slide_xml),
+                    slide_infos,
+                    slide_xml,
+                    [self.xml.name] * len(slide_xml),
+                ))
+        
+        self.slides = [
+            {'index': info['index'], 'part': info['part'], 'elements': elements}
+            for info, elements in zip(slide_infos, slide_elements)
+        ]
+        self._result = {
+            'size': self.slide_size,
+            'slides': self.slides,
+        }
+        if self.profiler is not None:
+            self.profiler.count('slides', len(self.slides))
+            for elements in slide_elements:
+                for element in elements:
+                    self.profiler.count(f'element.{element.type}')
+        return self._result
+    
+    def image_elements(self):
+        """所有幻灯片中的图片元素"""
+        for slide in self.extract()['slides']:
+            for element in slide['elements']:
+                if isinstance(element, ImageElement):
+                    yield element
+    
+    def store_media(self, store: MediaStore) -> dict:
+        """
+        把图片元素引用的媒体部件存入资源库，并把元素的 asset 改为资源引用
+        
+        每个部件只从压缩包中流式读取一次（resolved 记录本次已处理的部件名）；
+        资源库按内容哈希去重，已有相同内容时不再写盘。
+        
+        Returns:
+            本文件的统计 `{'stored', 'reused', 'bytes_saved'}`
+        """
+        before = store.stats()
+        resolved = {}
+        with self._phase('media'), zipfile.ZipFile(self.pptx_path, 'r') as zip_ref:
+            for element in self.image_elements():
+                part = element.asset
+                if part is None:
+                    continue
+                if part not in resolved:
+                    resolved[part] = (store.put_zip_entry(zip_ref, part)
+                                      if part in zip_ref.NameToInfo else None)
+                element.asset = resolved[part]
+        
+        return {key: value - before[key] for key, value in store.stats().items()}
+    
+    def _load_deck(self, zip_ref: zipfile.ZipFile) -> dict:
+        """
+        解析演示文稿级别的共享数据：幻灯片尺寸、关系、幻灯片顺序，
+        每页幻灯片使用的版式 / 母版 / 主题部件，以及它们的样式索引
+        （每个版式、母版、主题只解析一次）。
         
-        self.temp_dir = extract_dir
+        返回的 dict 只包含可 pickle 的基础类型，可以直接发给工作进程。
+        """
+        with self._phase('presentation'):
+            presentation = self._read_xml(zip_ref, self.PRESENTATION_PART)
+            self._parse_presentation_size(presentation)
         
-        # 获取幻灯片尺寸
-        self._parse_presentation_size()
+        rels = {}
         
-        # 解析第一张幻灯片
-        slide_path = extract_dir / 'ppt' / 'slides' / 'slide1.xml'
-        if slide_path.exists():
-            self._parse_slide(slide_path)
+        def part_rels(part: str) -> dict:
+            # 同一个部件（例如被多页共用的版式）的关系只解析一次
+            if part not in rels:
+                with self._phase('rels'):
+                    rels[part] = self._read_rels(zip_ref, part)
+            return rels[part]
         
-        # 获取媒体文件信息
-        self._parse_media_relations(extract_dir / 'ppt' / 'slides' / '_rels' / 'slide1.xml.rels')
+        # 按 sldIdLst 的顺序确定幻灯片
+        slide_parts = []
+        sld_id_lst = self.xml.path('p:sldIdLst')(presentation) if presentation is not None else None
+        if sld_id_lst is not None:
+            pres_rels = part_rels(self.PRESENTATION_PART)
+            for sld_id in sld_id_lst:
+                rel = pres_rels.get(sld_id.get(f"{{{self.NAMESPACES['r']}}}id"))
+                if rel is not None and rel['target'] in zip_ref.NameToInfo:
+                    slide_parts.append(rel['target'])
         
+        if not slide_parts:
+            # 没有 sldIdLst 时按文件编号排序
+            slide_parts = sorted(
+                (name for name in zip_ref.namelist()
+                 if re.fullmatch(r'ppt/slides/slide\d+\.xml', name)),
+                key=lambda name: int(re.search(r'(\d+)\.xml$', name).group(1)),
+            )
+        
+        slides = []
+        for index, part in enumerate(slide_parts, 1):
+            layout = self._first_rel_target(part_rels(part), self.REL_SLIDE_LAYOUT)
+            master = self._first_rel_target(part_rels(layout), self.REL_SLIDE_MASTER) if layout else None
+            theme = self._first_rel_target(part_rels(master), self.REL_THEME) if master else None
+            slides.append({
+                'index': index,
+                'part': part,
+                'layout': layout,
+                'master': master,
+                'theme': theme,
+            })
+        
+        def read_part(part: str) -> bytes | None:
+            return zip_ref.read(part) if part in zip_ref.NameToInfo else None
+        
+        with self._phase('styles'):
+            styles = build_style_index(read_part, slides, presentation, self.xml)
         return {
             'size': self.slide_size,
-            'elements': self.elements,
+            'slides': slides,
+            'rels': rels,
+            'styles': styles,
         }
     
-    def _parse_presentation_size(self):
+    def _read_xml(self, zip_ref: zipfile.ZipFile, part_name: str):
+        """直接从压缩包中读取并解析单个 XML 部件，不存在时返回 None"""
+        try:
+            data = zip_ref.read(part_name)
+        except KeyError:
+            return None
+        return self.xml.fromstring(data)
+    
+    def _read_rels(self, zip_ref: zipfile.ZipFile, part: str) -> dict:
+        """
+        读取部件的关系文件，返回 `{rId: {'type', 'target'}}`
+        
+        target 已解析为压缩包内的完整路径；外部链接不收录。
+        """
+        directory, filename = posixpath.split(part)
+        root = self._read_xml(zip_ref, posixpath.join(directory, '_rels', f'{filename}.rels'))
+        if root is None:
+            return {}
+        
+        rels = {}
+        for rel in root:
+            if rel.get('TargetMode') == 'External':
+                continue
+            target = rel.get('Target', '')
+            if target.startswith('/'):
+                target = target.lstrip('/')
+            else:
+                target = posixpath.normpath(posixpath.join(directory, target))
+            rels[rel.get('Id')] = {
+                'type': rel.get('Type', '').rsplit('/', 1)[-1],
+                'target': target,
+            }
+        return rels
+    
+    @staticmethod
+    def _first_rel_target(rels: dict, rel_type: str) -> str | None:
+        """返回第一个指定类型关系的目标部件"""
+        for rel in rels.values():
+            if rel['type'] == rel_type:
+                return rel['target']
+        return None
+    
+    def _parse_presentation_size(self, root):
         """解析演示文稿尺寸"""
-        presentation_path = self.temp_dir / 'ppt' / 'presentation.xml'
-        if not presentation_path.exists():
+        if root is None:
             # 默认使用 16:9 尺寸
             self.slide_size = {'width': 1920, 'height': 1080}
             return
-            
-        tree = ET.parse(presentation_path)
-        root = tree.getroot()
         
         # 查找 sldSz (幻灯片尺寸)
-        sld_sz = root.find('.//p:sldSz', self.NAMESPACES)
+        sld_sz = self.xml.path('.//p:sldSz')(root)
         if sld_sz is not None:
             cx = int(sld_sz.get('cx', 0))
             cy = int(sld_sz.get('cy', 0))
@@ -99,276 +385,330 @@ class PPTXTemplateExtractor:
             # 默认 1:1 方形
             self.slide_size = {'width': 1080, 'height': 1080}
     
-    def _parse_slide(self, slide_path: Path):
-        """解析幻灯片 XML"""
-        tree = ET.parse(slide_path)
-        root = tree.getroot()
-        
-        # 注册命名空间
-        for prefix, uri in self.NAMESPACES.items():
-            ET.register_namespace(prefix, uri)
-        
-        element_id = 1
-        
-        # 查找所有形状（sp）
-        for sp in root.iter(f'{{{self.NAMESPACES["p"]}}}sp'):
-            element = self._parse_shape(sp, element_id)
-            if element:
-                self.elements.append(element)
-                element_id += 1
-        
-        # 查找所有图片（pic）
-        for pic in root.iter(f'{{{self.NAMESPACES["p"]}}}pic'):
-            element = self._parse_picture(pic, element_id)
-            if element:
-                self.elements.append(element)
-                element_id += 1
-        
-        # 查找所有组（grpSp）中的形状
-        for grp_sp in root.iter(f'{{{self.NAMESPACES["p"]}}}grpSp'):
-            grp_elements = self._parse_group(grp_sp, element_id)
-            for elem in grp_elements:
-                self.elements.append(elem)
-                element_id += 1
-    
-    def _parse_shape(self, sp, element_id: int) -> dict | None:
-        """解析单个形状"""
-        # 获取形状名称
-        nvSpPr = sp.find(f'.//{{{self.NAMESPACES["p"]}}}nvSpPr', self.NAMESPACES)
-        name = ""
-        if nvSpPr is not None:
-            cNvPr = nvSpPr.find(f'.//{{{self.NAMESPACES["p"]}}}cNvPr', self.NAMESPACES)
-            if cNvPr is not None:
-                name = cNvPr.get('name', '')
+    def _parse_slide(self, source, slide: dict | None = None):
+        """
+        单次流式解析幻灯片 XML
         
-        # 获取变换信息（位置和大小）
-        xfrm = sp.find(f'.//{{{self.NAMESPACES["a"]}}}xfrm')
-        if xfrm is None:
-            return None
-            
-        off = xfrm.find(f'{{{self.NAMESPACES["a"]}}}off')
-        ext = xfrm.find(f'{{{self.NAMESPACES["a"]}}}ext')
+        分三步完成：
+        1. 基于 iterparse 流式读取，每个节点只访问一次：`p:sp` / `p:pic` 在结束事件时
+           只记录原始 EMU 坐标、所属的组以及文本 / 填充等属性，随后清空子树；
+           组（`p:grpSp`）用栈维护嵌套关系，组内形状因此不会被重复输出；
+        2. `SlideGeometry` 批量合成嵌套组的变换并把所有坐标换算成像素；
+        3. 按文档顺序构造元素。
+        
+        Args:
+            source: 幻灯片 XML 的文件对象（可直接来自 ZipFile.open）
+            slide: `_load_deck` 中的幻灯片信息，用于定位版式 / 母版 / 主题
         
+        Returns:
+            该页幻灯片的元素列表
+        """
+        geometry = SlideGeometry()
+        # 与 geometry 中的形状一一对应：(构造函数, 名称, 附加数据)
+        pending = []
+        # 当前所在的组编号
+        group_stack = []
+        self._styles = SlideStyleResolver(self.deck['styles'] if self.deck else None, slide)
+        # 本页的关系，用于把图片的 r:embed 解析成 ppt/media/* 部件
+        self._slide_rels = self.deck['rels'].get(slide['part'], {}) if self.deck and slide else {}
+        # 只在记录时统计节点数量，关闭时循环里只多一次 None 判断
+        counts = self.profiler.counts if self.profiler is not None else None
+        
+        with self._phase('slide_parse'):
+            for event, node in self.xml.iterparse(source, ('start', 'end'), self._STREAM_TAGS):
+                tag = node.tag
+                
+                if event == 'start':
+                    if tag == self._GRP_SP:
+                        group_stack.append(geometry.add_group(group_stack[-1] if group_stack else -1))
+                        if counts is not None:
+                            counts['node.grpSp'] += 1
+                    continue
+                
+                if tag == self._SP or tag == self._PIC:
+                    if counts is not None:
+                        counts['node.sp' if tag == self._SP else 'node.pic'] += 1
+                    group = group_stack[-1] if group_stack else -1
+                    if tag == self._SP:
+                        record = self._parse_shape(node)
+                    else:
+                        record = self._parse_picture(node)
+                    if record:
+                        xfrm, inherited, builder, name, extra = record
+                        # 继承来的坐标已经是幻灯片坐标，不受组变换影响
+                        geometry.add_shape(xfrm, -1 if inherited else group)
+                        pending.append((builder, name, extra))
+                    node.clear()
+                
+                elif tag == self._GRP_SP_PR:
+                    # grpSpPr 是组的第一个子节点，结束时栈顶正是所属的组；
+                    # 栈为空说明是 spTree 自身的属性，忽略
+                    if group_stack:
+                        geometry.set_group_xfrm(group_stack[-1], self._read_group_xfrm(node.find(self._XFRM)))
+                
+                elif tag == self._GRP_SP:
+                    group_stack.pop()
+                    node.clear()
+        
+        with self._phase('geometry'):
+            boxes = geometry.resolve()
+        with self._phase('elements'):
+            elements = []
+            for element_id, ((builder, name, extra), box) in enumerate(zip(pending, boxes), 1):
+                elements.append(builder(element_id, name, *box, extra))
+            
+            self._refine_slots(elements, geometry)
+        return elements
+    
+    @classmethod
+    def _read_xfrm(cls, sp_pr) -> tuple | None:
+        """读取 spPr/xfrm 的原始 EMU 坐标 (x, y, cx, cy)"""
+        xfrm = sp_pr.find(cls._XFRM) if sp_pr is not None else None
+        off = xfrm.find(cls._OFF) if xfrm is not None else None
+        ext = xfrm.find(cls._EXT) if xfrm is not None else None
         if off is None or ext is None:
             return None
+        return (int(off.get('x', 0)), int(off.get('y', 0)),
+                int(ext.get('cx', 0)), int(ext.get('cy', 0)))
+    
+    @classmethod
+    def _read_group_xfrm(cls, xfrm) -> tuple | None:
+        """
+        读取组的 xfrm：(off_x, off_y, cx, cy, ch_off_x, ch_off_y, ch_cx, ch_cy)
+        
+        缺少任何一项时返回 None（按恒等变换处理）。
+        """
+        if xfrm is None:
+            return None
+        off = xfrm.find(cls._OFF)
+        ext = xfrm.find(cls._EXT)
+        ch_off = xfrm.find(cls._CH_OFF)
+        ch_ext = xfrm.find(cls._CH_EXT)
+        if off is None or ext is None or ch_off is None or ch_ext is None:
+            return None
+        return (int(off.get('x', 0)), int(off.get('y', 0)),
+                int(ext.get('cx', 0)), int(ext.get('cy', 0)),
+                int(ch_off.get('x', 0)), int(ch_off.get('y', 0)),
+                int(ch_ext.get('cx', 0)), int(ch_ext.get('cy', 0)))
+    
+    def _parse_shape(self, sp) -> tuple | None:
+        """
+        解析单个形状
+        
+        Returns:
+            `(xfrm, inherited, builder, name, extra)`：原始 EMU 坐标、坐标是否继承自
+            版式 / 母版、元素构造函数及其参数；不产生元素时返回 None
+        """
+        # 只看直接子节点，避免对整棵子树做 .// 搜索
+        name = ""
+        ph = None
+        sp_pr = None
+        tx_body = None
+        for child in sp:
+            tag = child.tag
+            if tag == self._NV_SP_PR:
+                cNvPr = child.find(self._C_NV_PR)
+                if cNvPr is not None:
+                    name = cNvPr.get('name', '')
+                nv_pr = child.find(self._NV_PR)
+                if nv_pr is not None:
+                    ph = nv_pr.find(self._PH)
+            elif tag == self._SP_PR:
+                sp_pr = child
+            elif tag == self._TX_BODY:
+                tx_body = child
         
-        x = emu_to_pixels(int(off.get('x', 0)))
-        y = emu_to_pixels(int(off.get('y', 0)))
-        width = emu_to_pixels(int(ext.get('cx', 0)))
-        height = emu_to_pixels(int(ext.get('cy', 0)))
+        # 获取变换信息（位置和大小），占位符可从版式 / 母版继承
+        inherited = self._styles.placeholder(ph)
+        xfrm = self._read_xfrm(sp_pr)
+        is_inherited = xfrm is None
+        if is_inherited:
+            xfrm = inherited['xfrm']
+            if xfrm is None:
+                return None
         
         # 检查是否为文本框
-        txBody = sp.find(f'.//{{{self.NAMESPACES["p"]}}}txBody')
-        if txBody is not None:
-            return self._parse_text_box(sp, txBody, element_id, name, x, y, width, height)
+        if tx_body is not None:
+            text = self._parse_text_box(tx_body, inherited['text'])
+            return xfrm, is_inherited, self._create_text_element, name, text
+        
+        if sp_pr is None:
+            return None
         
         # 检查填充类型
-        spPr = sp.find(f'.//{{{self.NAMESPACES["p"]}}}spPr')
-        if spPr is not None:
+        for child in sp_pr:
             # 检查是否有图片填充
-            blipFill = spPr.find(f'.//{{{self.NAMESPACES["a"]}}}blipFill')
-            if blipFill is not None:
-                return self._create_image_element(element_id, name, x, y, width, height, blipFill)
+            if child.tag == self._BLIP_FILL:
+                return xfrm, is_inherited, self._create_image_element, name, self._blip_target(child)
             
             # 检查是否有纯色填充
-            solidFill = spPr.find(f'.//{{{self.NAMESPACES["a"]}}}solidFill')
-            if solidFill is not None:
-                return self._create_background_element(element_id, name, x, y, width, height, solidFill)
+            if child.tag == self._SOLID_FILL:
+                return xfrm, is_inherited, self._create_background_element, name, self._fill_color(child)
         
         return None
     
-    def _parse_text_box(self, sp, txBody, element_id: int, name: str,
-                        x: int, y: int, width: int, height: int) -> dict:
-        """解析文本框"""
-        text_content = ""
-        font_size = 18
-        color = "#000000"
-        font_family = "Arial"
-        text_align = "left"
-        
-        # 获取文本内容
-        for r in txBody.iter(f'{{{self.NAMESPACES["a"]}}}r'):
-            t = r.find(f'{{{self.NAMESPACES["a"]}}}t')
-            if t is not None and t.text:
-                text_content += t.text
-            
-            # 获取文本属性
-            rPr = r.find(f'{{{self.NAMESPACES["a"]}}}rPr')
-            if rPr is not None:
-                sz = rPr.get('sz')
-                if sz:
-                    font_size = int(sz) // 100  # PowerPoint 使用百分之一点
+    def _parse_text_box(self, txBody, inherited: dict | None = None) -> dict:
+        """
+        解析文本框的内容和文本属性
+        
+        默认值按 文本框自身 lstStyle → 继承链（版式 / 母版 / 演示文稿默认样式）
+        的顺序确定，都没有时才回退到 18 号黑色 Arial。
+        """
+        defaults = dict(inherited or {})
+        defaults.update(list_style_props(txBody.find(self._LST_STYLE)))
+        
+        text_parts = []
+        font_size = defaults.get('size', 18)
+        color = (self._styles.color_hex(defaults.get('color')) or ("#000000", 100))[0]
+        font_family = self._styles.font(defaults.get('font')) or "Arial"
+        text_align = {'ctr': 'center', 'r': 'right', 'l': 'left'}.get(defaults.get('align'), 'left')
+        
+        # 段落和文本运行一次遍历完成
+        for p in txBody.iterfind(self._A_P):
+            for child in p:
+                tag = child.tag
+                
+                # 获取段落对齐
+                if tag == self._P_PR:
+                    algn = child.get('algn')
+                    if algn:
+                        text_align = {'ctr': 'center', 'r': 'right', 'l': 'left'}.get(algn, 'left')
+                    continue
                 
-                # 获取颜色
-                solid_fill = rPr.find(f'.//{{{self.NAMESPACES["a"]}}}srgbClr')
-                if solid_fill is not None:
-                    color = f"#{solid_fill.get('val', '000000')}"
+                if tag != self._R:
+                    continue
                 
-                # 获取字体
-                latin = rPr.find(f'{{{self.NAMESPACES["a"]}}}latin')
-                if latin is not None:
-                    font_family = latin.get('typeface', 'Arial')
-        
-        # 获取段落对齐
-        for p in txBody.iter(f'{{{self.NAMESPACES["a"]}}}p'):
-            pPr = p.find(f'{{{self.NAMESPACES["a"]}}}pPr')
-            if pPr is not None:
-                algn = pPr.get('algn')
-                if algn:
-                    text_align = {'ctr': 'center', 'r': 'right', 'l': 'left'}.get(algn, 'left')
+                # 获取文本内容和文本属性
+                for run_child in child:
+                    run_tag = run_child.tag
+                    if run_tag == self._T:
+                        if run_child.text:
+                            text_parts.append(run_child.text)
+                    elif run_tag == self._R_PR:
+                        sz = run_child.get('sz')
+                        if sz:
+                            font_size = int(sz) // 100  # PowerPoint 使用百分之一点
+                        
+                        for prop in run_child:
+                            # 获取颜色（srgbClr 或经 clrMap 映射的 schemeClr）
+                            if prop.tag == self._SOLID_FILL:
+                                resolved = self._styles.color_hex(parse_color(prop))
+                                if resolved is not None:
+                                    color = resolved[0]
+                            # 获取字体（+mj-lt / +mn-lt 解析为主题字体）
+                            elif prop.tag == self._LATIN:
+                                font_family = self._styles.font(prop.get('typeface')) or font_family
+        
+        return {
+            'content': ''.join(text_parts),
+            'font_size': font_size,
+            'font_family': font_family,
+            'color': color,
+            'text_align': text_align,
+        }
+    
+    def _blip_target(self, blipFill) -> str | None:
+        """blipFill 中 a:blip 的 r:embed 指向的媒体部件"""
+        blip = blipFill.find(self._BLIP) if blipFill is not None else None
+        rel = self._slide_rels.get(blip.get(self._R_EMBED)) if blip is not None else None
+        return rel['target'] if rel is not None else None
+    
+    def _fill_color(self, solidFill) -> str:
+        """solidFill 的 CSS 颜色，带透明度时转换为 rgba"""
+        color, alpha = self._styles.color_hex(parse_color(solidFill)) or ("#FFFFFF", 100)
+        
+        # 转换为 rgba
+        if alpha < 100:
+            r = int(color[1:3], 16)
+            g = int(color[3:5], 16)
+            b = int(color[5:7], 16)
+            color = f"rgba({r}, {g}, {b}, {alpha / 100:.2f})"
+        return color
+    
+    def _create_text_element(self, element_id: int, name: str,
+                             x: int, y: int, width: int, height: int,
+                             text: dict) -> TextElement:
+        """创建文本元素"""
+        text_content = text['content']
         
         # 推断 slot 名称
         slot = self._infer_slot_name(name, text_content)
         
-        return {
-            'id': f'text-{element_id}',
-            'type': 'text',
-            'slot': slot,
-            'position': {'x': x, 'y': y},
-            'size': {'width': width, 'height': height},
-            'style': {
-                'fontSize': font_size,
-                'fontFamily': font_family,
-                'color': color,
-                'textAlign': text_align,
-                'zIndex': element_id,
-            },
-            'constraints': {
-                'maxChars': max(len(text_content) * 2, 50),
-                'overflowStrategy': 'auto-scale',
-            },
-            'exampleContent': text_content[:100] if text_content else 'Example text',
-        }
+        return TextElement(
+            id=f'text-{element_id}',
+            type='text',
+            slot=slot,
+            x=x, y=y, width=width, height=height,
+            z_index=element_id,
+            font_size=text['font_size'],
+            font_family=text['font_family'],
+            color=text['color'],
+            text_align=text['text_align'],
+            max_chars=max(len(text_content) * 2, 50),
+            overflow_strategy='auto-scale',
+            example_content=text_content[:100] if text_content else 'Example text',
+            content_length=len(text_content.strip()),
+        )
     
     def _create_image_element(self, element_id: int, name: str,
                               x: int, y: int, width: int, height: int,
-                              blipFill) -> dict:
+                              media: str | None = None) -> ImageElement:
         """创建图片元素"""
         # 检查是否为圆形（通过检查边界是否为正方形）
         is_circular = abs(width - height) < 10
         
         slot = self._infer_image_slot(name, x, y, width, height)
         
-        element = {
-            'id': f'image-{element_id}',
-            'type': 'image' if width < self.slide_size['width'] * 0.9 else 'background',
-            'slot': slot,
-            'position': {'x': x, 'y': y},
-            'size': {'width': width, 'height': height},
-            'style': {
-                'objectFit': 'cover',
-                'zIndex': element_id,
-            },
-            'optional': False,
-        }
-        
-        if is_circular:
-            element['style']['borderRadius'] = width // 2
-        
-        return element
+        return ImageElement(
+            id=f'image-{element_id}',
+            type='image' if width < self.slide_size['width'] * 0.9 else 'background',
+            slot=slot,
+            x=x, y=y, width=width, height=height,
+            z_index=element_id,
+            object_fit='cover',
+            border_radius=width // 2 if is_circular else None,
+            optional=False,
+            asset=media,
+        )
     
     def _create_background_element(self, element_id: int, name: str,
                                    x: int, y: int, width: int, height: int,
-                                   solidFill) -> dict:
+                                   color: str) -> FillElement:
         """创建背景/装饰元素"""
-        color = "#FFFFFF"
-        alpha = 100
-        
-        srgbClr = solidFill.find(f'{{{self.NAMESPACES["a"]}}}srgbClr')
-        if srgbClr is not None:
-            color = f"#{srgbClr.get('val', 'FFFFFF')}"
-            alpha_elem = srgbClr.find(f'{{{self.NAMESPACES["a"]}}}alpha')
-            if alpha_elem is not None:
-                alpha = int(int(alpha_elem.get('val', '100000')) / 1000)
-        
-        # 转换为 rgba
-        if alpha < 100:
-            r = int(color[1:3], 16)
-            g = int(color[3:5], 16)
-            b = int(color[5:7], 16)
-            color = f"rgba({r}, {g}, {b}, {alpha / 100:.2f})"
-        
-        return {
-            'id': f'bg-{element_id}',
-            'type': 'background',
-            'slot': f'decoration-{element_id}',
-            'position': {'x': x, 'y': y},
-            'size': {'width': width, 'height': height},
-            'style': {
-                'backgroundColor': color,
-                'zIndex': element_id,
-            },
-            'optional': False,
-        }
+        return FillElement(
+            id=f'bg-{element_id}',
+            type='background',
+            slot=f'decoration-{element_id}',
+            x=x, y=y, width=width, height=height,
+            z_index=element_id,
+            background_color=color,
+            optional=False,
+        )
     
-    def _parse_picture(self, pic, element_id: int) -> dict | None:
-        """解析图片元素"""
-        xfrm = pic.find(f'.//{{{self.NAMESPACES["a"]}}}xfrm')
+    def _parse_picture(self, pic) -> tuple | None:
+        """解析图片元素，返回值同 _parse_shape"""
+        xfrm = self._read_xfrm(pic.find(self._SP_PR))
         if xfrm is None:
             return None
-            
-        off = xfrm.find(f'{{{self.NAMESPACES["a"]}}}off')
-        ext = xfrm.find(f'{{{self.NAMESPACES["a"]}}}ext')
-        
-        if off is None or ext is None:
-            return None
-        
-        x = emu_to_pixels(int(off.get('x', 0)))
-        y = emu_to_pixels(int(off.get('y', 0)))
-        width = emu_to_pixels(int(ext.get('cx', 0)))
-        height = emu_to_pixels(int(ext.get('cy', 0)))
-        
-        slot = self._infer_image_slot('picture', x, y, width, height)
-        
-        return {
-            'id': f'pic-{element_id}',
-            'type': 'image',
-            'slot': slot,
-            'position': {'x': x, 'y': y},
-            'size': {'width': width, 'height': height},
-            'style': {
-                'objectFit': 'cover',
-                'zIndex': element_id,
-            },
-            'optional': False,
-        }
-    
-    def _parse_group(self, grp_sp, start_id: int) -> list:
-        """解析组内的形状"""
-        elements = []
-        
-        # 获取组的变换
-        grp_xfrm = grp_sp.find(f'.//{{{self.NAMESPACES["a"]}}}xfrm')
-        grp_offset_x = 0
-        grp_offset_y = 0
-        
-        if grp_xfrm is not None:
-            off = grp_xfrm.find(f'{{{self.NAMESPACES["a"]}}}off')
-            if off is not None:
-                grp_offset_x = emu_to_pixels(int(off.get('x', 0)))
-                grp_offset_y = emu_to_pixels(int(off.get('y', 0)))
-        
-        element_id = start_id
-        
-        # 解析组内的形状
-        for sp in grp_sp.findall(f'{{{self.NAMESPACES["p"]}}}sp'):
-            element = self._parse_shape(sp, element_id)
-            if element:
-                elements.append(element)
-                element_id += 1
-        
-        return elements
+        return (xfrm, False, self._create_picture_element, 'picture',
+                self._blip_target(pic.find(self._P_BLIP_FILL)))
     
-    def _parse_media_relations(self, rels_path: Path):
-        """解析媒体关系文件"""
-        if not rels_path.exists():
-            return
-            
-        tree = ET.parse(rels_path)
-        root = tree.getroot()
+    def _create_picture_element(self, element_id: int, name: str,
+                                x: int, y: int, width: int, height: int,
+                                media: str | None = None) -> ImageElement:
+        """创建 p:pic 图片元素"""
+        slot = self._infer_image_slot(name, x, y, width, height)
         
-        # 可以用于获取图片文件名等信息
-        pass
+        return ImageElement(
+            id=f'pic-{element_id}',
+            type='image',
+            slot=slot,
+            x=x, y=y, width=width, height=height,
+            z_index=element_id,
+            object_fit='cover',
+            optional=False,
+            asset=media,
+        )
     
     def _infer_slot_name(self, name: str, content: str) -> str:
         """推断文本框的 slot 名称"""
@@ -405,12 +745,95 @@ class PPTXTemplateExtractor:
         # 其他
         return 'main-image'
     
-    def generate_typescript(self, template_id: str, template_name: str) -> str:
-        """生成 TypeScript 模板代码"""
-        data = self.extract()
+    def _refine_slots(self, elements: list, geometry: SlideGeometry):
+        """
+        结合相邻元素修正 slot
+        
+        _infer_slot_name / _infer_image_slot 只看单个元素；这里借助空间索引和
+        geometry 的重叠 / 包含矩阵查询上下文，只改写那些单看自身无法确定的兜底 slot
+        （text-* / decoration-*）。只考虑有内容的文本框，包住整张卡片的空文本框不算：
+        
+        - 头像正下方最近的文本（上边缘紧挨头像底边、宽度不超过头像的 3 倍、
+          没有大面积压在头像上）-> avatar-caption
+        - 顶部区域中字号最大的文本 -> title（页面上还没有 title 时）
+        - 包住至少两个文本、面积小于页面 60% 的纯色块 -> card-background
+          （取面积最小的一个，整页底板不算卡片）
+        
+        elements 与 geometry 中的形状一一对应（同一顺序）。
+        """
+        if not elements:
+            return
+        
+        table = ElementTable.from_elements(elements)
+        index = SpatialIndex(table.boxes())
+        slots = set(table.slots)
+        
+        def is_free_text(j: int) -> bool:
+            return (table.types[j] == 'text' and table.content_lengths[j] > 0
+                    and elements[j].slot.startswith('text-'))
+        
+        # 头像下方的说明文字（姓名 / 职位等）
+        captions = 0
+        for i, avatar in enumerate(elements):
+            if avatar.slot != 'avatar-image':
+                continue
+            bottom = avatar.y + avatar.height
+            # 上边缘在头像底边附近（允许少量重叠），与头像水平方向有交集
+            band = (avatar.x, bottom - avatar.height // 4, avatar.width, avatar.height + avatar.height // 4)
+            candidates = [
+                j for j in index.query(band)
+                if is_free_text(j) and bottom - avatar.height // 4 <= table.y[j] <= bottom + avatar.height
+                and table.width[j] <= avatar.width * 3
+                and table.x[j] < avatar.x + avatar.width and avatar.x < table.x[j] + table.width[j]
+            ]
+            if not candidates:
+                continue
+            # 大面积压在头像上的文字是图上的标注，不是说明文字
+            overlaps = geometry.overlap_matrix([i], candidates)[0]
+            candidates = [j for j, overlap in zip(candidates, overlaps) if overlap * 4 <= table.area(j)]
+            if candidates:
+                # 取上边缘离头像底边最近的
+                j = min(candidates, key=lambda j: (abs(table.y[j] - bottom), j))
+                captions += 1
+                elements[j].slot = 'avatar-caption' if captions == 1 else f'avatar-caption-{captions}'
         
+        # 顶部区域的标题
+        if 'title' not in slots:
+            band_bottom = self.slide_size['height'] * 0.2
+            band = (0, 0, self.slide_size['width'], int(band_bottom))
+            candidates = [j for j in index.query(band)
+                          if is_free_text(j) and elements[j].y + elements[j].height <= band_bottom]
+            if candidates:
+                j = max(candidates, key=lambda j: (elements[j].font_size, -j))
+                elements[j].slot = 'title'
+        
+        # 承载多段文字的卡片底色
+        if 'card-background' not in slots:
+            max_area = self.slide_size['width'] * self.slide_size['height'] * 0.6
+            decorations = [
+                i for i, slot in enumerate(table.slots)
+                if slot.startswith('decoration-') and table.area(i) < max_area
+                and table.width[i] < self.slide_size['width'] * 0.9
+            ]
+            texts = [j for j in range(len(table)) if table.types[j] == 'text' and table.content_lengths[j] > 0]
+            if decorations and len(texts) >= 2:
+                contains = geometry.containment_matrix(decorations, texts)
+                cards = [i for i, row in zip(decorations, contains) if sum(bool(v) for v in row) >= 2]
+                if cards:
+                    i = min(cards, key=lambda i: (table.area(i), i))
+                    elements[i].slot = 'card-background'
+    
+    def generate_typescript(self, template_id: str, template_name: str,
+                            slide_index: int = 0) -> str:
+        """生成 TypeScript 模板代码（slide_index 为第几页，从 0 开始）"""
+        data = self.extract()
+        with self._phase('codegen'):
+            return self._render_typescript(data, template_id, template_name, slide_index)
+    
+    def _render_typescript(self, data: dict, template_id: str, template_name: str,
+                           slide_index: int) -> str:
         elements_code = []
-        for elem in data['elements']:
+        for elem in data['slides'][slide_index]['elements']:
             elem_code = self._element_to_typescript(elem)
             elements_code.append(elem_code)
         
@@ -449,94 +872,345 @@ export default {template_id.replace('-', '_')}Template;
 '''
         return code
     
-    def _element_to_typescript(self, elem: dict) -> str:
+    @staticmethod
+    def _ts_items(items: list) -> str:
+        """把 (key, value) 列表渲染成 TypeScript 对象字面量的内容"""
+        return ', '.join(
+            f"{key}: '{value}'" if isinstance(value, str) else f"{key}: {value}"
+            for key, value in items
+        )
+    
+    def _element_to_typescript(self, elem: TemplateElement) -> str:
         """将元素转换为 TypeScript 代码"""
         indent = "        "
         
-        style_items = []
-        for key, value in elem.get('style', {}).items():
-            if isinstance(value, str):
-                style_items.append(f"{key}: '{value}'")
-            else:
-                style_items.append(f"{key}: {value}")
-        
         constraints_code = ""
-        if 'constraints' in elem:
-            cons = elem['constraints']
-            cons_items = []
-            for key, value in cons.items():
-                if isinstance(value, str):
-                    cons_items.append(f"{key}: '{value}'")
-                else:
-                    cons_items.append(f"{key}: {value}")
-            constraints_code = f"\n{indent}    constraints: {{ {', '.join(cons_items)} }},"
+        constraint_items = elem.constraint_items()
+        if constraint_items is not None:
+            constraints_code = f"\n{indent}    constraints: {{ {self._ts_items(constraint_items)} }},"
         
         example_code = ""
-        if 'exampleContent' in elem:
-            example_code = f"\n{indent}    exampleContent: '{elem['exampleContent']}',"
+        if isinstance(elem, TextElement):
+            example_code = f"\n{indent}    exampleContent: '{elem.example_content}',"
+        
+        optional = getattr(elem, 'optional', False)
         
         return f'''{indent}{{
-{indent}    id: '{elem['id']}',
-{indent}    type: '{elem['type']}',
-{indent}    slot: '{elem['slot']}',
-{indent}    position: {{ x: {elem['position']['x']}, y: {elem['position']['y']} }},
-{indent}    size: {{ width: {elem['size']['width']}, height: {elem['size']['height']} }},
-{indent}    style: {{ {', '.join(style_items)} }},{constraints_code}{example_code}
-{indent}    optional: {str(elem.get('optional', False)).lower()},
+{indent}    id: '{elem.id}',
+{indent}    type: '{elem.type}',
+{indent}    slot: '{elem.slot}',
+{indent}    position: {{ x: {elem.x}, y: {elem.y} }},
+{indent}    size: {{ width: {elem.width}, height: {elem.height} }},
+{indent}    style: {{ {self._ts_items(elem.style_items())} }},{constraints_code}{example_code}
+{indent}    optional: {str(optional).lower()},
 {indent}}},'''
 
 
+def _parse_slide_worker(pptx_path: str, deck: dict, slide: dict, slide_xml: bytes,
+                        xml_backend: str | None = None) -> list:
+    """进程池任务：解析单页幻灯片，deck 为主进程解析好的共享数据"""
+    extractor = PPTXTemplateExtractor(pptx_path, xml_backend=xml_backend)
+    extractor.deck = deck
+    extractor.slide_size = deck['size']
+    return extractor._parse_slide(io.BytesIO(slide_xml), slide)
+
+
+def _process_deck(pptx_path: str, cache: TemplateCache | None,
+                  extract_to_disk: bool = False, slide_jobs: int = 1,
+                  media_store: MediaStore | None = None, profile: bool = False,
+                  cprofile_dir: str | None = None, xml_backend: str | None = None) -> dict:
+    """
+    处理单个 PPTX：查缓存，未命中则解析并写回缓存。
+    
+    给出 media_store 时图片同时存入资源库；缓存的结果引用了资源库中
+    不存在的资源（例如资源库被清空过）时视为未命中。
+    
+    profile=True 时结果的 profile 为 ExtractProfiler.to_dict()；给出 cprofile_dir 时
+    解析和导出图片的过程用 cProfile 记录，保存为 `<cprofile_dir>/<stem>.prof`
+    （命中缓存的文件没有解析过程，不生成）。
+    
+    作为进程池任务运行，所以必须是模块级函数，参数和返回值都要能被 pickle。
+    """
+    profiler = ExtractProfiler() if profile else None
+    phase = profiler.phase if profiler is not None else (lambda name: NULL_PHASE)
+    
+    with phase('hash'):
+        content_hash = hash_file(pptx_path)
+    with phase('cache'):
+        cached = cache.get(content_hash) if cache is not None else None
+        data = result_from_dict(cached) if cached is not None else None
+    if data is not None:
+        extractor = PPTXTemplateExtractor.from_data(pptx_path, data)
+        if media_store is None or all(media_store.has(element.asset) or element.asset is None
+                                      for element in extractor.image_elements()):
+            return {'data': data, 'cached': True, 'media': None,
+                    'profile': profiler.to_dict() if profiler is not None else None}
+    
+    extractor = PPTXTemplateExtractor(pptx_path, extract_to_disk=extract_to_disk,
+                                      slide_jobs=slide_jobs, profiler=profiler, xml_backend=xml_backend)
+    cprofile = None
+    if cprofile_dir:
+        import cProfile
+        cprofile = cProfile.Profile()
+        cprofile.enable()
+    try:
+        data = extractor.extract()
+        media = extractor.store_media(media_store) if media_store is not None else None
+    finally:
+        if cprofile is not None:
+            cprofile.disable()
+            Path(cprofile_dir).mkdir(parents=True, exist_ok=True)
+            cprofile.dump_stats(str(Path(cprofile_dir) / f"{Path(pptx_path).stem}.prof"))
+    if cache is not None:
+        cache.put(content_hash, result_to_dict(data))
+    return {'data': data, 'cached': False, 'media': media,
+            'profile': profiler.to_dict() if profiler is not None else None}
+
+
+def extract_batch(ppt_files: list, jobs: int = 1, cache: TemplateCache | None = None,
+                  extract_to_disk: bool = False, slide_jobs: int = 1,
+                  media_store: MediaStore | None = None, profile: bool = False,
+                  cprofile_dir: str | None = None, xml_backend: str | None = None) -> list:
+    """
+    批量提取多个 PPTX。
+    
+    Args:
+        ppt_files: PPTX 路径列表
+        jobs: 并行进程数，1 表示在当前进程内顺序处理
+        cache: 提取结果缓存，None 表示不使用缓存
+        extract_to_disk: 调试用，同时解压到磁盘
+        slide_jobs: 单个 PPTX 内并行解析幻灯片的进程数；jobs > 1 时
+            各文件已经在独立进程中处理，不再嵌套进程池，此参数被忽略
+        media_store: 图片资源库，None 表示不导出图片
+        profile: 记录每个文件的分阶段耗时和元素数量（见 ppt_profile.py）
+        cprofile_dir: 每个解析的文件保存一份 cProfile 结果到该目录
+        xml_backend: XML 解析后端，None 表示默认后端
+    
+    Returns:
+        与 ppt_files 顺序一一对应的结果列表，每项为
+        `{'path', 'data', 'cached', 'media', 'profile', 'error'}`（media 为本文件的
+        资源库统计，未导出时为 None；profile 未记录时为 None）；单个文件出错只记录
+        在 `error` 中，不会中断整个批次。
+    """
+    results = [{'path': Path(f), 'data': None, 'cached': False, 'media': None, 'profile': None,
+                'error': None}
+               for f in ppt_files]
+    
+    def _record(result: dict, outcome: dict | None, error: BaseException | None):
+        if error is not None:
+            result['error'] = ''.join(traceback.format_exception(error)).rstrip()
+        else:
+            result['data'] = outcome['data']
+            result['cached'] = outcome['cached']
+            result['media'] = outcome['media']
+            result['profile'] = outcome['profile']
+    
+    if jobs <= 1 or len(results) <= 1:
+        for result in results:
+            try:
+                _record(result, _process_deck(str(result['path']), cache, extract_to_disk,
+                                              slide_jobs, media_store, profile, cprofile_dir,
+                                              xml_backend), None)
+            except Exception as e:
+                _record(result, None, e)
+        return results
+    
+    with ProcessPoolExecutor(max_workers=min(jobs, len(results))) as executor:
+        futures = [executor.submit(_process_deck, str(result['path']), cache, extract_to_disk,
+                                   1, media_store, profile, cprofile_dir, xml_backend)
+                   for result in results]
+        # 按提交顺序收集，模板编号与完成先后无关
+        for result, future in zip(results, futures):
+            try:
+                _record(result, future.result(), None)
+            except Exception as e:
+                _record(result, None, e)
+    
+    return results
+
+
+def check_backend_parity(ppt_files: list) -> list:
+    """
+    用每个 XML 后端分别解析，比较提取结果和生成的 TypeScript
+    
+    每个文件输出一行各后端的解析耗时；返回不一致的文件说明列表。
+    """
+    mismatches = []
+    for path in ppt_files:
+        outputs = {}
+        timings = []
+        for name in BACKENDS:
+            extractor = PPTXTemplateExtractor(str(path), xml_backend=name)
+            start = time.perf_counter()
+            data = extractor.extract()
+            timings.append(f"{name} {(time.perf_counter() - start) * 1000:.1f}ms")
+            outputs[name] = (
+                json.dumps(result_to_dict(data), sort_keys=True, ensure_ascii=False),
+                [extractor.generate_typescript('parity-template', 'Parity', index)
+                 for index in range(len(data['slides']))],
+            )
+        
+        reference = outputs[BACKENDS[0]]
+        differing = [name for name in BACKENDS[1:] if outputs[name] != reference]
+        status = "❌" if differing else "✅"
+        print(f"  {status} {Path(path).name}: {', '.join(timings)}")
+        if differing:
+            mismatches.append(f"{Path(path).name}: {', '.join(differing)} 与 {BACKENDS[0]} 的输出不同")
+    return mismatches
+
+
+def _run_backend_check(ppt_dir: Path) -> int:
+    """--check-backends：样例 PPTX 加几个合成 PPTX，返回进程退出码"""
+    if not lxml_available():
+        print("❌ 未安装 lxml，无法比较 XML 后端")
+        return 1
+    
+    from ppt_benchmark import PRESETS, write_synthetic_pptx
+    
+    with tempfile.TemporaryDirectory(prefix='ppt-parity-') as temp_dir:
+        # 合成文件覆盖样例里没有的占位符继承、schemeClr 和深层嵌套组
+        synthetic = [write_synthetic_pptx(Path(temp_dir) / f'{name}.pptx', PRESETS[name])
+                     for name in ('small', 'deep', 'text')]
+        ppt_files = sorted(ppt_dir.glob('*.pptx')) + synthetic
+        print(f"比较 XML 后端（{' / '.join(BACKENDS)}），共 {len(ppt_files)} 个文件")
+        mismatches = check_backend_parity(ppt_files)
+    
+    for line in mismatches:
+        print(f"❌ {line}")
+    if mismatches:
+        return 1
+    print("✅ 所有后端的输出一致")
+    return 0
+
+
 def main():
     """主函数：提取所有 PPT 模板"""
+    parser = argparse.ArgumentParser(description='从 PPTX 文件中提取模板')
+    parser.add_argument('--extract-to-disk', action='store_true',
+                        help='调试用：把每个 PPTX 完整解压到 <stem>_extracted 目录')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='忽略已有缓存，重新解析所有 PPTX')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='并行解析的进程数，0 表示使用全部 CPU 核（默认 1）')
+    parser.add_argument('--slide-jobs', type=int, default=1,
+                        help='单个 PPTX 内并行解析幻灯片的进程数，仅在 --jobs 1 时生效（默认 1）')
+    parser.add_argument('--no-media', action='store_true',
+                        help='不把图片导出到资源库 extracted_templates/assets')
+    parser.add_argument('--profile-report', metavar='FILE',
+                        help='把每个文件各阶段的耗时 / CPU / 内存块和元素数量写成 JSON 报告'
+                             '（配合 --no-cache 才能看到解析阶段）')
+    parser.add_argument('--cprofile-dir', metavar='DIR',
+                        help='每个解析的 PPTX 保存一份 cProfile 结果 <stem>.prof')
+    parser.add_argument('--xml-backend', choices=('auto',) + BACKENDS, default='auto',
+                        help='XML 解析后端，auto 表示 PPT_XML_BACKEND 指定的后端，未指定时为 etree（默认 auto）')
+    parser.add_argument('--check-backends', action='store_true',
+                        help='用所有 XML 后端解析样例和合成 PPTX，输出不一致时以状态码 1 退出')
+    args = parser.parse_args()
+    
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    slide_jobs = args.slide_jobs if args.slide_jobs > 0 else (os.cpu_count() or 1)
+    
     ppt_dir = Path(__file__).parent / 'ppt from canvas'
+    if args.check_backends:
+        sys.exit(_run_backend_check(ppt_dir))
+    try:
+        xml_backend = get_backend(args.xml_backend).name
+    except RuntimeError as e:
+        parser.error(str(e))
+    
     output_dir = Path(__file__).parent / 'extracted_templates'
     output_dir.mkdir(exist_ok=True)
+    cache = None
+    if not (args.no_cache or args.extract_to_disk):
+        cache = TemplateCache(Path(__file__).parent / '.extract_cache', PPTXTemplateExtractor.VERSION)
+    # 图片按内容哈希存放，多个模板共用的图片只保存一份
+    media_store = None if args.no_media else MediaStore(output_dir / 'assets')
     
-    ppt_files = list(ppt_dir.glob('*.pptx'))
+    # 按文件名排序，保证模板编号稳定，增量构建才不会整体错位
+    ppt_files = sorted(ppt_dir.glob('*.pptx'))
     
-    print(f"找到 {len(ppt_files)} 个 PPT 文件")
+    print(f"找到 {len(ppt_files)} 个 PPT 文件（{jobs} 个进程，XML 后端 {xml_backend}）")
     print("=" * 50)
     
+    results = extract_batch(ppt_files, jobs=jobs, cache=cache,
+                            extract_to_disk=args.extract_to_disk, slide_jobs=slide_jobs,
+                            media_store=media_store, profile=bool(args.profile_report),
+                            cprofile_dir=args.cprofile_dir, xml_backend=xml_backend)
+    
     all_templates = []
+    profiled_decks = []
+    written = 0
+    cached = 0
+    failed = 0
+    media_totals = {'stored': 0, 'reused': 0, 'bytes_saved': 0}
     
-    for i, ppt_file in enumerate(ppt_files, 1):
-        print(f"\n处理 [{i}/{len(ppt_files)}]: {ppt_file.name}")
+    for i, result in enumerate(results, 1):
+        ppt_file = result['path']
+        print(f"\n处理 [{i}/{len(results)}]: {ppt_file.name}")
+        
+        if result['error'] is not None:
+            failed += 1
+            print(f"  ❌ 错误:\n{result['error']}")
+            continue
         
         try:
-            extractor = PPTXTemplateExtractor(str(ppt_file))
-            data = extractor.extract()
+            data = result['data']
+            extractor = PPTXTemplateExtractor.from_data(str(ppt_file), data)
+            if result['profile'] is not None:
+                # 在解析时的记录上继续累计 codegen
+                extractor.profiler = ExtractProfiler.from_dict(result['profile'])
+            if result['cached']:
+                cached += 1
+                print("  ♻️ 内容未变化，使用缓存")
+            if result['media'] is not None:
+                for key, value in result['media'].items():
+                    media_totals[key] += value
+                print(f"  🖼️ 图片: 新增 {result['media']['stored']} 个，"
+                      f"复用 {result['media']['reused']} 个")
             
+            slides = data['slides']
             print(f"  画布尺寸: {data['size']['width']} × {data['size']['height']}")
-            print(f"  发现元素: {len(data['elements'])} 个")
-            
-            # 生成模板 ID
-            template_id = f"canvas-template-{i}"
-            template_name = f"Canvas 模板 {i}"
+            print(f"  幻灯片: {len(slides)} 页，"
+                  f"元素: {sum(len(slide['elements']) for slide in slides)} 个")
             
-            # 生成 TypeScript 代码
-            ts_code = extractor.generate_typescript(template_id, template_name)
-            
-            # 保存 TypeScript 文件
-            ts_output = output_dir / f"canvas-template-{i}.ts"
-            with open(ts_output, 'w', encoding='utf-8') as f:
-                f.write(ts_code)
-            
-            print(f"  ✅ 已保存: {ts_output.name}")
-            
-            # 保存 JSON 数据（用于调试）
-            json_output = output_dir / f"canvas-template-{i}.json"
-            with open(json_output, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            
-            all_templates.append({
-                'id': template_id,
-                'file': ts_output.name,
-                'source': ppt_file.name,
-            })
+            for slide_index, slide in enumerate(slides):
+                # 生成模板 ID（多页文件按页追加后缀，单页文件保持原有编号）
+                suffix = f"-{slide['index']}" if len(slides) > 1 else ""
+                template_id = f"canvas-template-{i}{suffix}"
+                template_name = f"Canvas 模板 {i}{suffix}"
+                
+                # 生成 TypeScript 代码
+                ts_code = extractor.generate_typescript(template_id, template_name, slide_index)
+                slide_data = {
+                    'size': data['size'],
+                    'elements': [element.to_dict() for element in slide['elements']],
+                }
+                
+                # 保存 TypeScript 文件和 JSON 数据（用于调试），内容没变就不重写
+                ts_output = output_dir / f"{template_id}.ts"
+                json_output = output_dir / f"{template_id}.json"
+                changed = write_if_changed(ts_output, ts_code)
+                changed |= write_if_changed(json_output, json.dumps(slide_data, indent=2, ensure_ascii=False))
+                
+                if changed:
+                    written += 1
+                    print(f"  ✅ 已保存: {ts_output.name}")
+                else:
+                    print(f"  ⏭️ 无变化: {ts_output.name}")
+                
+                all_templates.append({
+                    'id': template_id,
+                    'file': ts_output.name,
+                    'source': ppt_file.name,
+                })
             
+            if extractor.profiler is not None:
+                profiled_decks.append({'file': ppt_file.name, 'cached': result['cached'],
+                                       'profile': extractor.profiler.to_dict()})
+        
         except Exception as e:
+            failed += 1
             print(f"  ❌ 错误: {e}")
-            import traceback
             traceback.print_exc()
     
     # 生成索引文件
@@ -563,11 +1237,23 @@ def main():
     index_code += "export const canvasTemplateList = Object.values(canvasTemplates);\n"
     
     index_output = output_dir / 'index.ts'
-    with open(index_output, 'w', encoding='utf-8') as f:
-        f.write(index_code)
+    if write_if_changed(index_output, index_code):
+        print(f"✅ 已生成索引: {index_output}")
+    else:
+        print(f"⏭️ 索引无变化: {index_output}")
     
-    print(f"✅ 已生成索引: {index_output}")
-    print(f"\n完成！共提取 {len(all_templates)} 个模板")
+    print(f"\n完成！共提取 {len(all_templates)} 个模板，"
+          f"更新 {written} 个，缓存命中 {cached} 个，失败 {failed} 个")
+    if media_store is not None:
+        print(f"图片资源库: 新增 {media_totals['stored']} 个，复用 {media_totals['reused']} 个，"
+              f"节省 {media_totals['bytes_saved'] / 1024 / 1024:.1f} MB")
+    if args.profile_report:
+        report = corpus_report(profiled_decks)
+        Path(args.profile_report).write_text(json.dumps(report, indent=2, ensure_ascii=False),
+                                             encoding='utf-8')
+        top = ', '.join(f"{name} {entry['wall_ms']:.1f}ms ({entry['share']:.0%})"
+                        for name, entry in list(report['phases'].items())[:3])
+        print(f"性能报告: {args.profile_report}（共 {report['total_ms']:.1f}ms，最耗时: {top}）")
 
 
 if __name__ == '__main__':
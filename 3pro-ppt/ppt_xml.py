@@ -0,0 +1,161 @@
+"""
+XML 解析后端
+
+提取器只用到很少的 XML 接口：解析整个部件（fromstring）、流式解析幻灯片
+（iterparse）、元素的 tag / get / text / find / 子节点遍历，以及少量多级路径
+查找。这些接口由两个后端提供：
+
+- etree：标准库 xml.etree.ElementTree，始终可用；
+- lxml：安装了 lxml 时使用。流式解析按标签过滤事件（只为调用方关心的节点
+  创建 Python 对象），多级路径预先编译成 `etree.XPath`；忽略注释和处理指令，
+  不展开实体。
+
+两个后端的元素接口一致，提取结果完全相同（见 ppt_template_extractor.py 的
+--check-backends）。默认使用 etree：提取器已经是单次流式解析，剩下的开销主要
+在逐个形状的 find / get 上，这类小调用经由 lxml 的代理对象反而比 ElementTree 的
+C 加速实现慢（用 `ppt_benchmark.py --xml-backend` 比较）。基准测试显示 lxml
+更快之前不改默认值。环境变量 PPT_XML_BACKEND=etree / lxml 或提取器的
+xml_backend 参数可以指定后端。
+
+路径写成带前缀的形式（`p:spPr/a:xfrm/a:off`、`.//p:sldSz`），由 `path()`
+编译成“返回第一个匹配节点或 None”的函数；同一后端的编译结果在进程内共享。
+"""
+
+import os
+import xml.etree.ElementTree as ET
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:  # lxml 是可选依赖
+    lxml_etree = None
+
+NAMESPACES = {
+    'p': 'http://schemas.openxmlformats.org/presentationml/2006/main',
+    'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
+    'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+}
+
+BACKENDS = ('etree', 'lxml')
+
+
+def _clark(step: str) -> str:
+    """`a:xfrm` → `{http://...}xfrm`"""
+    prefix, sep, local = step.partition(':')
+    return f'{{{NAMESPACES[prefix]}}}{local}' if sep else step
+
+
+class ElementTreeBackend:
+    """标准库 ElementTree"""
+
+    name = 'etree'
+
+    def __init__(self):
+        self._paths = {}
+
+    def fromstring(self, data: bytes):
+        return ET.fromstring(data)
+
+    def iterparse(self, source, events: tuple, tags: tuple | None = None):
+        # ElementTree 不能按标签过滤事件，tags 只是提示，调用方仍需自行判断 tag
+        return ET.iterparse(source, events=events)
+
+    def path(self, expr: str):
+        """编译路径；只有子节点步骤时逐级 find（与原先手写的查找相同），否则交给 ElementPath"""
+        compiled = self._paths.get(expr)
+        if compiled is not None:
+            return compiled
+
+        if '//' in expr or expr.startswith('.'):
+            clark = '/'.join(_clark(step) for step in expr.split('/'))
+            compiled = lambda node: node.find(clark)
+        else:
+            steps = [_clark(step) for step in expr.split('/')]
+            if len(steps) == 1:
+                tag = steps[0]
+                compiled = lambda node: node.find(tag)
+            else:
+                def compiled(node, steps=steps):
+                    for tag in steps:
+                        node = node.find(tag)
+                        if node is None:
+                            return None
+                    return node
+        self._paths[expr] = compiled
+        return compiled
+
+
+class LxmlBackend:
+    """lxml.etree，多级路径预编译为 XPath"""
+
+    name = 'lxml'
+
+    def __init__(self):
+        self._parser = lxml_etree.XMLParser(resolve_entities=False, remove_comments=True,
+                                            remove_pis=True, huge_tree=True)
+        self._paths = {}
+
+    def fromstring(self, data: bytes):
+        return lxml_etree.fromstring(data, self._parser)
+
+    def iterparse(self, source, events: tuple, tags: tuple | None = None):
+        # 按标签过滤在 C 中完成：其余节点不会产生事件，也就不会创建 Python 代理对象
+        return lxml_etree.iterparse(source, events=events, tag=tags, resolve_entities=False,
+                                    remove_comments=True, remove_pis=True, huge_tree=True)
+
+    def path(self, expr: str):
+        compiled = self._paths.get(expr)
+        if compiled is not None:
+            return compiled
+
+        if '/' not in expr:
+            # 单个子节点：lxml 的 find 本身就在 C 中完成，比调用 XPath 对象更快
+            tag = _clark(expr)
+            compiled = lambda node: node.find(tag)
+        else:
+            xpath = lxml_etree.XPath(f'({expr})[1]', namespaces=NAMESPACES)
+
+            def compiled(node, xpath=xpath):
+                found = xpath(node)
+                return found[0] if found else None
+        self._paths[expr] = compiled
+        return compiled
+
+
+_instances = {}
+
+
+def lxml_available() -> bool:
+    return lxml_etree is not None
+
+
+def default_backend_name() -> str:
+    """环境变量 PPT_XML_BACKEND 指定的后端，未指定时为 etree"""
+    name = os.environ.get('PPT_XML_BACKEND', '').strip().lower()
+    return name if name in BACKENDS else 'etree'
+
+
+def get_backend(name: str | None = None):
+    """
+    取得后端实例（每个进程每种后端一个，编译好的路径随之复用）
+
+    Args:
+        name: 'etree' / 'lxml'，None 或 'auto' 表示默认后端
+
+    Raises:
+        ValueError: 未知的后端名
+        RuntimeError: 指定了 lxml 但没有安装
+    """
+    if name in (None, '', 'auto'):
+        name = default_backend_name()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown XML backend: {name}")
+    backend = _instances.get(name)
+    if backend is None:
+        if name == 'lxml':
+            if not lxml_available():
+                raise RuntimeError("lxml is not installed")
+            backend = LxmlBackend()
+        else:
+            backend = ElementTreeBackend()
+        _instances[name] = backend
+    return backend
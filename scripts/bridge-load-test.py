@@ -0,0 +1,258 @@
+"""
+generate-image-bridge.py 的压测脚本
+
+默认先在随机端口启动 mock-gemini-server.py，再按不同的并发数和调用方式
+向 bridge 发请求，统计吞吐量和 p50 / p95 / p99 延迟：
+
+    python scripts/bridge-load-test.py --requests 40 --concurrency 1,4,16 \
+        --modes oneshot,serve,frames,output --mock-args="--latency lognormal:0.3,0.5"
+
+调用方式：
+    oneshot  每个请求启动一次 python generate-image-bridge.py '<json>'
+    serve    一个 --serve 进程，JSON 行返回 base64
+    frames   一个 --serve --frames 进程，二进制帧返回图片
+    output   一个 --serve 进程，请求带 outputPath，图片写临时文件
+
+每个请求的 prompt 都不同，并关闭图片缓存，测到的是完整的请求路径。
+--api-base 指向已有的服务时不启动 mock。--variants N 让每个请求一次生成 N 张图片。
+
+CI 中使用：--json 保存结果，--baseline 与之前保存的结果比较，
+p95 变慢或吞吐量下降超过 --max-regression（默认 20%）时以状态码 1 退出。
+"""
+
+import argparse
+import json
+import math
+import os
+import shlex
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+BRIDGE = SCRIPTS_DIR / "generate-image-bridge.py"
+MOCK_SERVER = SCRIPTS_DIR / "mock-gemini-server.py"
+
+MODES = ('oneshot', 'serve', 'frames', 'output')
+
+
+def percentile(values, pct):
+    """最近秩法百分位数，values 为空时返回 None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def start_mock(mock_args):
+    """在随机端口启动模拟服务器，返回 (进程, API_BASE)"""
+    process = subprocess.Popen(
+        [sys.executable, str(MOCK_SERVER), "--port", "0", *shlex.split(mock_args or "")],
+        stdout=subprocess.PIPE, text=True,
+    )
+    api_base = process.stdout.readline().strip()
+    if not api_base:
+        process.kill()
+        raise RuntimeError("mock-gemini-server.py 启动失败")
+    return process, api_base
+
+
+def bridge_env(api_base):
+    env = dict(os.environ)
+    env.update({"GEMINI_API_BASE": api_base, "GEMINI_API_KEY": env.get("GEMINI_API_KEY", "mock"),
+                "IMAGE_CACHE_DISABLE": "1"})
+    return env
+
+
+def make_job(model, output_dir=None, variants=1):
+    job_id = uuid.uuid4().hex
+    job = {"id": job_id, "prompt": f"load test {job_id}", "model": model}
+    if variants > 1:
+        job["variants"] = variants
+    if output_dir is not None:
+        job["outputPath"] = os.path.join(output_dir, f"{job_id}.img")
+    return job
+
+
+def run_oneshot(env, model, requests, concurrency, variants=1):
+    """每个请求一个进程，返回 [(延迟秒数, 是否成功), ...]"""
+    def one(_):
+        job = make_job(model, variants=variants)
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, str(BRIDGE), json.dumps(job)],
+                                   env=env, capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+        try:
+            ok = json.loads(completed.stdout).get("success", False)
+        except ValueError:
+            ok = False
+        return elapsed, ok
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(one, range(requests)))
+
+
+def run_serve(env, model, requests, concurrency, frames=False, output_dir=None, variants=1):
+    """
+    向一个常驻进程保持 concurrency 个在途请求（闭环压测），
+    返回 [(延迟秒数, 是否成功), ...]
+    """
+    command = [sys.executable, str(BRIDGE), "--serve", "--no-cache", "--concurrency", str(concurrency)]
+    if frames:
+        command.append("--frames")
+    process = subprocess.Popen(command, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    in_flight = threading.Semaphore(concurrency)
+    started = {}
+    samples = []
+    lock = threading.Lock()
+
+    def read_responses():
+        for _ in range(requests):
+            if frames:
+                prefix = process.stdout.read(4)
+                if len(prefix) < 4:
+                    break
+                header = json.loads(process.stdout.read(struct.unpack('>I', prefix)[0]))
+                process.stdout.read(header.get("size", 0)
+                                    + sum(v.get("size", 0) for v in header.get("variants") or []))
+                result = header
+            else:
+                line = process.stdout.readline()
+                if not line:
+                    break
+                result = json.loads(line)
+            now = time.perf_counter()
+            with lock:
+                samples.append((now - started.pop(result.get("id")), bool(result.get("success"))))
+            in_flight.release()
+
+    reader = threading.Thread(target=read_responses, daemon=True)
+    reader.start()
+    for _ in range(requests):
+        in_flight.acquire()
+        job = make_job(model, output_dir, variants)
+        with lock:
+            started[job["id"]] = time.perf_counter()
+        process.stdin.write((json.dumps(job) + "\n").encode('utf-8'))
+        process.stdin.flush()
+    reader.join()
+    process.stdin.close()
+    process.wait()
+    return samples
+
+
+def run_mode(mode, env, model, requests, concurrency, variants=1):
+    """执行一组压测，返回统计结果 dict"""
+    start = time.perf_counter()
+    if mode == 'oneshot':
+        samples = run_oneshot(env, model, requests, concurrency, variants)
+    elif mode == 'output':
+        with tempfile.TemporaryDirectory(prefix="bridge-load-") as output_dir:
+            samples = run_serve(env, model, requests, concurrency, output_dir=output_dir, variants=variants)
+    else:
+        samples = run_serve(env, model, requests, concurrency, frames=(mode == 'frames'), variants=variants)
+    wall = time.perf_counter() - start
+
+    latencies = [elapsed for elapsed, ok in samples if ok]
+    to_ms = lambda value: None if value is None else round(value * 1000, 1)
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": len(latencies),
+        "errors": len(samples) - len(latencies) + (requests - len(samples)),
+        "throughput": round(len(latencies) / wall, 2) if wall else None,
+        "p50_ms": to_ms(percentile(latencies, 50)),
+        "p95_ms": to_ms(percentile(latencies, 95)),
+        "p99_ms": to_ms(percentile(latencies, 99)),
+    }
+
+
+def compare(results, baseline, max_regression):
+    """与基线比较，返回回归说明列表"""
+    previous = {(r["mode"], r["concurrency"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = previous.get((result["mode"], result["concurrency"]))
+        if base is None:
+            continue
+        label = f'{result["mode"]} x{result["concurrency"]}'
+        if base.get("p95_ms") and result.get("p95_ms") is not None \
+                and result["p95_ms"] > base["p95_ms"] * (1 + max_regression):
+            regressions.append(f'{label}: p95 {base["p95_ms"]}ms -> {result["p95_ms"]}ms')
+        if base.get("throughput") and result.get("throughput") is not None \
+                and result["throughput"] < base["throughput"] * (1 - max_regression):
+            regressions.append(f'{label}: throughput {base["throughput"]}/s -> {result["throughput"]}/s')
+    return regressions
+
+
+def print_table(results):
+    columns = ("mode", "concurrency", "requests", "ok", "errors", "throughput", "p50_ms", "p95_ms", "p99_ms")
+    widths = [max(len(c), *(len(str(r[c])) for r in results)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for result in results:
+        print("  ".join(str(result[c]).ljust(w) for c, w in zip(columns, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="generate-image-bridge.py 压测")
+    parser.add_argument("--requests", type=int, default=40, help="每组的请求数（默认 40）")
+    parser.add_argument("--concurrency", default="1,4,16", help="并发数列表（默认 1,4,16）")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"调用方式列表（默认 {','.join(MODES)}）")
+    parser.add_argument("--model", default="gemini-2.5-flash-image-preview")
+    parser.add_argument("--variants", type=int, default=1, help="每个请求生成的图片数（默认 1）")
+    parser.add_argument("--api-base", default=None, help="已有服务的 API_BASE，不启动 mock")
+    parser.add_argument("--mock-args", default="", help="传给 mock-gemini-server.py 的参数")
+    parser.add_argument("--json", metavar="FILE", help="结果保存为 JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="与之前 --json 保存的结果比较")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="允许的回归比例（默认 0.2）")
+    options = parser.parse_args()
+
+    modes = [m for m in options.modes.split(',') if m]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"未知的调用方式：{', '.join(sorted(unknown))}")
+    levels = [int(c) for c in options.concurrency.split(',') if c]
+
+    mock = None
+    api_base = options.api_base
+    if api_base is None:
+        mock, api_base = start_mock(options.mock_args)
+    env = bridge_env(api_base)
+
+    results = []
+    try:
+        for mode in modes:
+            for concurrency in levels:
+                result = run_mode(mode, env, options.model, options.requests, concurrency, options.variants)
+                print(f"⏱️ {mode} x{concurrency}: {result['throughput']}/s, p95 {result['p95_ms']}ms",
+                      file=sys.stderr)
+                results.append(result)
+    finally:
+        if mock is not None:
+            mock.terminate()
+            mock.wait()
+
+    print_table(results)
+    if options.json:
+        Path(options.json).write_text(json.dumps(results, indent=2), encoding='utf-8')
+
+    if options.baseline:
+        baseline = json.loads(Path(options.baseline).read_text(encoding='utf-8'))
+        regressions = compare(results, baseline, options.max_regression)
+        for line in regressions:
+            print(f"❌ regression: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
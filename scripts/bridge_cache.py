@@ -0,0 +1,124 @@
+"""
+图片生成结果的磁盘缓存（generate-image-bridge.py 使用）
+
+键是 (model, prompt, generationConfig) 的 SHA-256，值是解码后的图片字节、MIME 类型，
+以及流式请求拼接出的文本（非流式请求不提取文本，记为 None）。
+每个条目是一个文件：第一行是 MIME 类型，之后是图片原始字节：
+
+    <cache_dir>/<key 前两位>/<key>.img
+
+带文本的条目第一行改为 JSON 对象 {"mime_type", "text"}（ensure_ascii，仍是单行 ASCII）。
+
+写入时先写临时文件再 os.replace，多个进程共用同一个目录也不会读到半个文件。
+命中时更新文件的 mtime，超过容量上限时按 mtime 从旧到新淘汰（LRU）。
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+
+def cache_key(model, prompt, generation_config):
+    """(model, prompt, generationConfig) 的稳定哈希"""
+    payload = json.dumps([model, prompt, generation_config], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ImageCache:
+    """基于内容哈希、按容量 LRU 淘汰的图片缓存"""
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # 缓存目录总大小；第一次写入时扫描目录得到，之后增量维护
+        self._total = None
+        self._lock = threading.Lock()
+
+    def _entry_path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.img"
+
+    def get(self, key):
+        """返回 (图片字节, MIME 类型, 文本)，未命中返回 None；没有记录文本时文本为 None"""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                header = f.readline().decode('ascii').strip()
+                data = f.read()
+            text = None
+            if header.startswith('{'):
+                header = json.loads(header)
+                header, text = header['mime_type'], header.get('text')
+            # 更新访问时间，供 LRU 淘汰使用
+            os.utime(path)
+        except (OSError, ValueError, KeyError, TypeError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return data, header, text
+
+    def put(self, key, data, mime_type, text=None):
+        """写入缓存（原子替换），超过容量上限时淘汰最久未使用的条目"""
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                header = mime_type if text is None else json.dumps({"mime_type": mime_type, "text": text})
+                f.write(header.encode('ascii') + b'\n')
+                f.write(data)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        with self._lock:
+            if self._total is None:
+                self._total = self._scan_size()
+            else:
+                self._total += size
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        """[(mtime, size, path), ...]"""
+        entries = []
+        for path in self.cache_dir.glob('*/*.img'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """按 mtime 从旧到新删除，直到总大小回到上限以内"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+        self._total = total
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
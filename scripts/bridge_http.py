@@ -0,0 +1,149 @@
+"""
+只依赖标准库（http.client / ssl）的最小 HTTP 客户端（generate-image-bridge.py 使用）
+
+单次调用模式每次都是新进程，导入 requests 及其依赖（urllib3、certifi、
+charset_normalizer 等）比发请求前的其他准备工作都慢。StdlibSession 实现了
+bridge 用到的那部分 requests.Session.post 接口，响应对象提供 status_code /
+headers / text / iter_content() 和 with 语句，generate_image() 不用区分两者。
+
+- 支持 gzip 响应（增量解压）；
+- 同一线程对同一主机复用连接（keep-alive）；
+- 网络和协议错误统一抛出 ConnectionError（OSError 的子类）；
+- 不处理代理环境变量，需要代理时请使用 requests。
+"""
+
+import http.client
+import json
+import ssl
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit
+
+from bridge_metrics import record_active
+
+
+def proxy_configured(environ):
+    """环境变量中配置了代理时返回 True（StdlibSession 不支持代理）"""
+    return any(environ.get(name) for name in ('HTTPS_PROXY', 'https_proxy', 'HTTP_PROXY', 'http_proxy',
+                                                'ALL_PROXY', 'all_proxy'))
+
+
+class StdlibResponse:
+    """http.client 响应的包装，接口与 bridge 用到的 requests.Response 部分一致"""
+
+    def __init__(self, response, connection, session, key):
+        self._response = response
+        self._connection = connection
+        self._session = session
+        self._key = key
+        self.status_code = response.status
+        self.headers = response.headers
+        self._text = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            body = b''.join(self.iter_content(64 * 1024))
+            charset = self.headers.get_content_charset() or 'utf-8'
+            self._text = body.decode(charset, 'replace')
+        return self._text
+
+    def iter_content(self, chunk_size):
+        decompressor = None
+        if (self.headers.get('Content-Encoding') or '').lower() == 'gzip':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            while True:
+                data = self._response.read(chunk_size)
+                if not data:
+                    break
+                if decompressor is not None:
+                    data = decompressor.decompress(data)
+                    if not data:
+                        continue
+                yield data
+            if decompressor is not None:
+                tail = decompressor.flush()
+                if tail:
+                    yield tail
+        except (http.client.HTTPException, zlib.error) as e:
+            raise ConnectionError(f"{type(e).__name__}: {e}") from e
+
+    def close(self):
+        # 响应读完且服务器没要求关闭时，连接留给同一线程的下一个请求
+        if self._response.isclosed() and not self._response.will_close:
+            self._session._release(self._key, self._connection)
+        else:
+            self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class StdlibSession:
+    """requests.Session 的最小替代，只实现 post()"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._ssl_context = None
+
+    def _idle(self):
+        if not hasattr(self._local, 'idle'):
+            self._local.idle = {}
+        return self._local.idle
+
+    def _release(self, key, connection):
+        self._idle()[key] = connection
+
+    def _connect(self, key, connect_timeout):
+        scheme, host, port = key
+        if scheme == 'https':
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            connection = http.client.HTTPSConnection(host, port, timeout=connect_timeout,
+                                                     context=self._ssl_context)
+        else:
+            connection = http.client.HTTPConnection(host, port, timeout=connect_timeout)
+        start = time.perf_counter()
+        connection.connect()
+        record_active('connect', time.perf_counter() - start)
+        return connection
+
+    def post(self, url, headers=None, json=None, timeout=None, stream=False):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        body = _dumps(json)
+        request_headers = {'Accept-Encoding': 'gzip', 'Content-Type': 'application/json', **(headers or {})}
+
+        connection = self._idle().pop(key, None)
+        for reused in ((True, False) if connection is not None else (False,)):
+            if not reused:
+                try:
+                    connection = self._connect(key, connect_timeout)
+                except http.client.HTTPException as e:
+                    raise ConnectionError(f"{type(e).__name__}: {e}") from e
+            connection.sock.settimeout(read_timeout)
+            try:
+                connection.request('POST', path, body=body, headers=request_headers)
+                response = connection.getresponse()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                connection.close()
+                if not reused:
+                    if isinstance(e, OSError):
+                        raise
+                    raise ConnectionError(f"{type(e).__name__}: {e}") from e
+                # keep-alive 连接可能已被服务器关闭，换新连接重发一次
+
+        return StdlibResponse(response, connection, self, key)
+
+
+# post() 的参数名 json 与 requests 一致，会遮住 json 模块，序列化放在这里
+def _dumps(payload):
+    return json.dumps(payload).encode('utf-8')
@@ -0,0 +1,198 @@
+"""
+生成图片的后处理（generate-image-bridge.py 使用，需要 Pillow）
+
+Gemini 返回的是原始分辨率的 PNG（1.5 MB 左右），而模板里的图片槽位
+往往只有几百像素。请求里带上 postprocess 时，按槽位尺寸缩放并重新编码：
+
+    "postprocess": {
+        "width": 150, "height": 150,   # 目标尺寸（像素），可只给一个
+        "fit": "cover",                # 与模板的 objectFit 相同：cover / contain / fill
+        "format": "webp",              # webp / jpeg / png，默认保持原格式
+        "quality": 80,                 # webp / jpeg 的质量
+        "filter": "lanczos"            # lanczos / bicubic / bilinear / nearest
+    }
+
+cover 先按目标宽高比居中裁剪再缩放，contain 保持比例缩放到框内，fill 直接拉伸。
+只缩小不放大。缓存里保存的是原图，同一张图用于不同槽位时不用重新生成。
+
+未安装 Pillow 时 available() 为 False，bridge 原样返回图片。
+Pillow 在第一次用到时才导入，不带 postprocess 的请求不付出导入开销。
+validate_options() 不需要 Pillow，bridge 在调用上游之前用它检查参数，
+参数有误的请求不会消耗 API 调用。
+"""
+
+import threading
+from io import BytesIO
+
+# PIL.Image 模块；None 表示还没导入，False 表示没有安装
+_Image = None
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'jpg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png'),
+}
+
+FILTERS = ('lanczos', 'bicubic', 'bilinear', 'nearest')
+
+FITS = ('cover', 'contain', 'fill')
+
+
+def _pil():
+    global _Image
+    if _Image is None:
+        try:
+            from PIL import Image
+        except ImportError:
+            Image = False
+        _Image = Image
+    return _Image or None
+
+
+def available():
+    return _pil() is not None
+
+
+def _positive_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
+
+
+def validate_options(options):
+    """检查 postprocess 参数，有误时抛出 ValueError"""
+    if not isinstance(options, dict):
+        raise ValueError("postprocess must be an object")
+    image_format = options.get('format')
+    if image_format is not None and (not isinstance(image_format, str) or image_format.lower() not in FORMATS):
+        raise ValueError(f"Unsupported postprocess format: {image_format}")
+    resample_name = options.get('filter', 'lanczos')
+    if not isinstance(resample_name, str) or resample_name.lower() not in FILTERS:
+        raise ValueError(f"Unsupported resize filter: {resample_name}")
+    if options.get('fit', 'cover') not in FITS:
+        raise ValueError(f"Unsupported fit: {options.get('fit')}")
+    for key in ('width', 'height'):
+        if options.get(key) is not None and not _positive_number(options[key]):
+            raise ValueError(f"postprocess {key} must be a positive number")
+    quality = options.get('quality')
+    if quality is not None and not (_positive_number(quality) and quality <= 100):
+        raise ValueError("postprocess quality must be between 1 and 100")
+
+
+def _target_size(size, options):
+    """按 width / height / fit 计算输出尺寸，只缩小不放大"""
+    width, height = size
+    target_w = options.get('width')
+    target_h = options.get('height')
+    if not target_w and not target_h:
+        return size
+    if not target_w:
+        target_w = round(width * target_h / height)
+    elif not target_h:
+        target_h = round(height * target_w / width)
+    target_w, target_h = int(target_w), int(target_h)
+
+    if options.get('fit', 'cover') == 'contain':
+        scale = min(target_w / width, target_h / height, 1.0)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+    # cover / fill：输出就是目标尺寸，原图比目标小时按比例缩小目标
+    scale = min(width / target_w, height / target_h, 1.0)
+    return max(1, round(target_w * scale)), max(1, round(target_h * scale))
+
+
+def _cover_box(size, target):
+    """居中裁剪出与 target 宽高比相同的区域"""
+    width, height = size
+    target_ratio = target[0] / target[1]
+    if width / height > target_ratio:
+        crop_w = round(height * target_ratio)
+        left = (width - crop_w) // 2
+        return left, 0, left + crop_w, height
+    crop_h = round(width / target_ratio)
+    top = (height - crop_h) // 2
+    return 0, top, width, top + crop_h
+
+
+def postprocess(data, mime_type, options):
+    """
+    缩放 / 裁剪 / 重新编码一张图片
+
+    Returns:
+        (图片字节, MIME 类型)
+    """
+    Image = _pil()
+    if Image is None:
+        raise RuntimeError("Pillow is not installed")
+
+    validate_options(options)
+    image_format = options.get('format')
+    resample = getattr(Image.Resampling, options.get('filter', 'lanczos').upper())
+
+    with Image.open(BytesIO(data)) as image:
+        image.load()
+        source_format = image.format or 'PNG'
+        target = _target_size(image.size, options)
+        if target == image.size and not image_format:
+            # 不需要缩放也不换格式，原样返回，避免无意义的重新编码
+            return data, mime_type
+        if target != image.size:
+            box = None
+            if options.get('fit', 'cover') == 'cover':
+                box = _cover_box(image.size, target)
+            # reducing_gap：先用 JPEG draft / reduce 快速缩小，再做高质量滤波
+            image = image.resize(target, resample, box=box, reducing_gap=3.0)
+
+        if image_format:
+            pil_format, out_mime = FORMATS[image_format.lower()]
+        else:
+            pil_format = source_format
+            out_mime = mime_type
+
+        quality = int(options.get('quality', 80))
+        save_args = {}
+        if pil_format == 'JPEG':
+            if image.mode not in ('RGB', 'L'):
+                # JPEG 没有透明通道，透明部分铺白底
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                rgba = image.convert('RGBA')
+                background.paste(rgba, mask=rgba.getchannel('A'))
+                image = background
+            save_args = {'quality': quality, 'optimize': True, 'progressive': True}
+        elif pil_format == 'WEBP':
+            save_args = {'quality': quality, 'method': 4}
+        elif pil_format == 'PNG':
+            save_args = {'optimize': True}
+
+        output = BytesIO()
+        image.save(output, pil_format, **save_args)
+    return output.getvalue(), out_mime
+
+
+class ImageProcessor:
+    """
+    执行后处理：workers > 0 时放到进程池里（缩放和编码是 CPU 密集型），
+    否则在调用线程中直接执行。进程池在第一次使用时创建。
+
+    进程池用 spawn 启动子进程：创建时往往已经有其他请求线程持有锁（速率限制、
+    缓存、输出锁），fork 会把这些锁以持有状态复制到子进程里，可能死锁。
+    """
+
+    def __init__(self, workers=0):
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def process(self, data, mime_type, options):
+        if self.workers <= 0:
+            return postprocess(data, mime_type, options)
+        with self._lock:
+            if self._pool is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._pool.submit(postprocess, data, mime_type, options).result()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
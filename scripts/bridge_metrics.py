@@ -0,0 +1,198 @@
+"""
+bridge 请求的分阶段计时和指标输出（generate-image-bridge.py 使用）
+
+每个请求的结果中带 timing（毫秒）和 sizes（字节）：
+
+    startup     进程启动后导入模块的耗时（只在单次调用模式出现）
+    cache       查缓存
+    connect     建立新连接（DNS + TCP + TLS），复用 keep-alive 连接时没有这一项
+    ttfb        发出请求到收到响应头（不含 connect），主要是上游生成图片的时间
+    download    等待响应体数据
+    parse       扫描响应体 JSON（不含 decode）
+    decode      base64 解码并写入缓冲区
+    fetch       调用上游的总耗时，包括重试等待和对冲
+    postprocess 图片后处理
+    deliver     写 outputPath 文件或编码 base64
+    total       从收到请求到结果就绪（不含 deliver）
+
+    sizes: response（响应体）/ image（解码后的图片）/ output（返回给调用方的图片）
+
+MetricsRecorder 把每个请求的记录追加到 JSON lines 日志，
+并维护一份 Prometheus textfile（node_exporter textfile collector 格式）。
+写指标失败（例如路径不可写）只在 stderr 输出警告，不影响请求结果。
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+_local = threading.local()
+
+
+class RequestTimer:
+    """一次请求（或一次上游尝试）的分阶段耗时"""
+
+    def __init__(self):
+        self.phases = {}
+        self.sizes = {}
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    @contextmanager
+    def active(self):
+        """在当前线程上登记为活动计时器，新建连接的耗时会记到这里"""
+        previous = getattr(_local, 'timer', None)
+        _local.timer = self
+        try:
+            yield self
+        finally:
+            _local.timer = previous
+
+    def as_dict(self):
+        return {f"{name}_ms": round(seconds * 1000, 2) for name, seconds in self.phases.items()}
+
+
+def record_active(name, seconds):
+    """把耗时记到当前线程的活动 RequestTimer（没有时忽略）"""
+    timer = getattr(_local, 'timer', None)
+    if timer is not None:
+        timer.add(name, seconds)
+
+
+def install_connect_timing(adapter):
+    """
+    让 requests 的 HTTPAdapter 在建立新连接时记录耗时
+
+    替换 urllib3 连接池使用的连接类，connect()（DNS + TCP + TLS 握手）的耗时
+    记到当前线程的活动 RequestTimer 的 connect 阶段。
+    """
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    def timed(connection_cls):
+        class TimedConnection(connection_cls):
+            def connect(self):
+                start = time.perf_counter()
+                try:
+                    return super().connect()
+                finally:
+                    record_active('connect', time.perf_counter() - start)
+        return TimedConnection
+
+    class TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = timed(HTTPConnection)
+
+    class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = timed(HTTPSConnection)
+
+    adapter.poolmanager.pool_classes_by_scheme = {
+        'http': TimedHTTPConnectionPool,
+        'https': TimedHTTPSConnectionPool,
+    }
+
+
+def _outcome(result):
+    if not result.get("success"):
+        return "error"
+    return "cached" if result.get("cached") else "success"
+
+
+class MetricsRecorder:
+    """
+    汇总请求指标
+
+    log_path：每个请求追加一行 JSON；
+    prom_path：每次记录后原子替换的 Prometheus textfile。
+    """
+
+    def __init__(self, log_path=None, prom_path=None):
+        self.log_path = log_path
+        self.prom_path = prom_path
+        self.requests = {}
+        self.phase_sums = {}
+        self.phase_counts = {}
+        self.byte_sums = {}
+        self.lock = threading.Lock()
+
+    def record(self, result, model=None):
+        """记录一个已经 deliver 过的结果；任何错误都只输出警告，不会抛出"""
+        try:
+            self._record(result, model)
+        except Exception as e:
+            print(f"⚠️ 记录请求指标失败：{e}", file=sys.stderr)
+
+    def _record(self, result, model):
+        timing = result.get("timing") or {}
+        sizes = result.get("sizes") or {}
+        entry = {
+            "ts": round(time.time(), 3),
+            "id": result.get("id"),
+            "model": model,
+            "outcome": _outcome(result),
+            "status": result.get("status"),
+            "attempts": result.get("attempts", 1),
+            "timing": timing,
+            "sizes": sizes,
+        }
+
+        with self.lock:
+            key = (model or "", entry["outcome"])
+            self.requests[key] = self.requests.get(key, 0) + 1
+            for name, ms in timing.items():
+                phase = name[:-3] if name.endswith("_ms") else name
+                self.phase_sums[phase] = self.phase_sums.get(phase, 0.0) + ms / 1000
+                self.phase_counts[phase] = self.phase_counts.get(phase, 0) + 1
+            for kind, size in sizes.items():
+                self.byte_sums[kind] = self.byte_sums.get(kind, 0) + size
+
+            if self.log_path:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            if self.prom_path:
+                self._write_textfile()
+
+    def _write_textfile(self):
+        lines = [
+            "# HELP image_bridge_requests_total Image bridge requests by model and outcome.",
+            "# TYPE image_bridge_requests_total counter",
+        ]
+        for (model, outcome), count in sorted(self.requests.items()):
+            lines.append(f'image_bridge_requests_total{{model="{model}",outcome="{outcome}"}} {count}')
+        lines += [
+            "# HELP image_bridge_phase_seconds Time spent in each request phase.",
+            "# TYPE image_bridge_phase_seconds summary",
+        ]
+        for phase in sorted(self.phase_sums):
+            lines.append(f'image_bridge_phase_seconds_sum{{phase="{phase}"}} {self.phase_sums[phase]:.6f}')
+            lines.append(f'image_bridge_phase_seconds_count{{phase="{phase}"}} {self.phase_counts[phase]}')
+        lines += [
+            "# HELP image_bridge_bytes_total Payload bytes by kind.",
+            "# TYPE image_bridge_bytes_total counter",
+        ]
+        for kind, total in sorted(self.byte_sums.items()):
+            lines.append(f'image_bridge_bytes_total{{kind="{kind}"}} {total}')
+
+        # textfile collector 可能随时读取，先写临时文件再替换
+        directory = os.path.dirname(os.path.abspath(self.prom_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp_path, self.prom_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
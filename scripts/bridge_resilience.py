@@ -0,0 +1,223 @@
+"""
+上游调用的容错策略（generate-image-bridge.py 使用）
+
+- 重试：429 / 5xx / 网络错误按带抖动的指数退避重试（full jitter），
+  响应带 Retry-After 时至少等待该时长；
+- 对冲请求：按模型记录最近成功请求的耗时，请求超过 p95 仍未返回时
+  再并行发一个相同的请求，先成功的那个生效；
+- 熔断：某个模型连续失败（5xx / 网络错误）达到阈值后熔断一段时间，期间直接失败
+  不再请求上游，冷却结束后放行一个试探请求，成功则恢复。429 是配额限流，
+  熔断器由所有并发任务共用，计入失败会让正常的限流把整个模型熔断，所以只重试不计数；
+- 截止时间：每次调用（含全部重试和等待）的总时长上限，快到时不再重试。
+
+attempt 函数返回 bridge 的结果 dict；失败结果中的 status / retry_after /
+retryable 字段用于判断是否重试。
+"""
+
+import random
+import threading
+import time
+from collections import deque
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value):
+    """Retry-After 头（秒数或 HTTP 日期）转换为秒，无法解析时返回 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    # HTTP 日期格式很少出现，email.utils 用到时才导入
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(result):
+    return bool(result.get("retryable")) or result.get("status") in RETRYABLE_STATUS
+
+
+class LatencyTracker:
+    """最近 window 次成功请求的耗时，用于计算对冲延迟"""
+
+    def __init__(self, window=100, min_samples=10):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def p95(self):
+        """样本不足时返回 None（不对冲）"""
+        with self.lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class CircuitBreaker:
+    """连续失败 threshold 次后熔断 cooldown 秒"""
+
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """是否允许发出请求；冷却结束后只放行一个试探请求"""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.probing = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def release(self):
+        """结束试探但不改变状态：结果不能说明上游是否健康（429、请求本身有误），下一个请求可以再试探"""
+        with self.lock:
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    @property
+    def is_open(self):
+        with self.lock:
+            return self.opened_at is not None
+
+
+class ResilientCaller:
+    """按模型维护熔断器和耗时统计，对单次请求做重试和对冲"""
+
+    def __init__(self, max_retries=3, base_delay=0.5, max_delay=20.0, hedge=True,
+                 breaker_threshold=5, breaker_cooldown=30.0, max_workers=32, deadline=120.0):
+        self.max_retries = max_retries
+        # 每次 call() 的总时长上限（秒），None 表示不限制
+        self.deadline = deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.breakers = {}
+        self.latency = {}
+        self.lock = threading.Lock()
+        # 对冲时两个请求并行执行，需要独立的线程池（单次调用模式不对冲，不导入 concurrent.futures）
+        self.executor = None
+        if hedge:
+            from concurrent.futures import ThreadPoolExecutor
+            self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def _for_model(self, model):
+        with self.lock:
+            if model not in self.breakers:
+                self.breakers[model] = CircuitBreaker(self.breaker_threshold, self.breaker_cooldown)
+                self.latency[model] = LatencyTracker()
+            return self.breakers[model], self.latency[model]
+
+    def backoff(self, retry, retry_after=None):
+        """第 retry 次重试前的等待时间（full jitter），不短于 Retry-After"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** retry)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay * 3))
+        return delay
+
+    def call(self, model, attempt, hedge=True):
+        """
+        执行 attempt()，失败时按策略重试
+
+        hedge=False 时这次调用不发对冲请求（例如流式请求，重复请求会重复发出事件）。
+
+        Returns:
+            最后一次尝试的结果，attempts 为实际发出的尝试次数（熔断时为 0）；
+            因熔断结束时带 circuit_open=True，因截止时间放弃重试时带 deadline_exceeded=True
+        """
+        breaker, latency = self._for_model(model)
+        deadline = time.monotonic() + self.deadline if self.deadline else None
+        result = None
+        attempts = 0
+        while True:
+            if not breaker.allow():
+                if result is None:
+                    result = {"success": False, "error": f"Circuit open for model {model}, failing fast"}
+                result["circuit_open"] = True
+                break
+
+            attempts += 1
+            result = self._attempt(attempt, latency, hedge)
+            if result.get("success"):
+                breaker.record_success()
+                break
+            if not is_retryable(result):
+                # 请求本身的问题（400、没有图片等），不能说明上游是否健康，熔断状态不变
+                breaker.release()
+                break
+
+            if result.get("status") == 429:
+                breaker.release()
+            else:
+                breaker.record_failure()
+                if breaker.is_open:
+                    result["circuit_open"] = True
+                    break
+            if attempts > self.max_retries:
+                break
+            delay = self.backoff(attempts - 1, parse_retry_after(result.get("retry_after")))
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                result["deadline_exceeded"] = True
+                break
+            time.sleep(delay)
+
+        result["attempts"] = attempts
+        return result
+
+    def _attempt(self, attempt, latency, hedge=True):
+        """执行一次尝试；超过 p95 仍未返回时发出对冲请求"""
+        start = time.monotonic()
+        hedge_delay = latency.p95() if self.hedge and hedge else None
+        if hedge_delay is None:
+            result = attempt()
+        else:
+            from concurrent.futures import FIRST_COMPLETED, wait
+            futures = {self.executor.submit(attempt)}
+            done, _ = wait(futures, timeout=hedge_delay)
+            if not done:
+                futures.add(self.executor.submit(attempt))
+            result = None
+            pending = futures
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    if result.get("success"):
+                        # 慢的那个请求在后台跑完后直接丢弃
+                        pending = ()
+                        break
+            if len(futures) > 1:
+                result["hedged"] = True
+
+        if result.get("success"):
+            latency.record(time.monotonic() - start)
+        return result
@@ -0,0 +1,351 @@
+"""
+generateContent 响应的流式解析（generate-image-bridge.py 使用）
+
+响应体大部分是 inlineData.data 这一个 base64 字符串（一张图 2 MB 左右）。
+这里不构建完整的 JSON 对象树，而是边接收边扫描：
+
+1. 找到 `"inlineData": {`（或 `"inline_data"`）；
+2. 在该对象中找到 `"data": "`，记下之前出现的 mimeType；
+3. 把之后直到结束引号的 base64 按 4 字节对齐分块解码，直接写入 sink；
+4. mimeType 出现在 data 之后时，在对象结束前继续找。
+
+内存中只保留当前接收块和不足 4 字节的 base64 余数，
+解码后的图片写到哪里由 sink 决定（文件、BytesIO 等）。
+
+SSEStreamParser 用同样的方式处理 streamGenerateContent 的 SSE 响应，
+并把其中的文本 part 在到达时立即交给调用方。
+"""
+
+import binascii
+import json
+import re
+import time
+
+_PART_RE = re.compile(rb'"(?:inlineData|inline_data)"\s*:\s*\{')
+_DATA_RE = re.compile(rb'"data"\s*:\s*"')
+_MIME_RE = re.compile(rb'"(?:mimeType|mime_type)"\s*:\s*"([^"]*)"')
+
+# 找不到下一个标记时保留的尾部长度，标记被块边界截断时仍能匹配上
+_KEEP_TAIL = 64
+
+
+class Base64StreamDecoder:
+    """分块 base64 解码：每次只解码 4 字节对齐的部分，余数留到下一块"""
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.size = 0
+        # 解码和写入 sink 的累计耗时（秒）
+        self.seconds = 0.0
+        self._carry = b''
+
+    def write(self, data):
+        start = time.perf_counter()
+        # JSON 里的 "/" 可能被转义成 "\/"，base64 本身不含反斜杠
+        data = self._carry + data.replace(b'\\', b'')
+        aligned = len(data) - len(data) % 4
+        if aligned:
+            decoded = binascii.a2b_base64(data[:aligned])
+            self.sink.write(decoded)
+            self.size += len(decoded)
+        self._carry = data[aligned:]
+        self.seconds += time.perf_counter() - start
+
+    def close(self):
+        if self._carry:
+            decoded = binascii.a2b_base64(self._carry + b'=' * (-len(self._carry) % 4))
+            self.sink.write(decoded)
+            self.size += len(decoded)
+            self._carry = b''
+
+
+class InlineDataExtractor:
+    """
+    增量扫描响应体，把第一个 inlineData.data 解码写入 sink
+
+    用法：对每个接收到的块调用 feed()，结束后调用 finish()；
+    found 表示是否找到了图片，mime_type / size 为图片信息。
+
+    给出 next_sink 时提取响应中的所有图片（多个 candidate 或多个图片 part）：
+    每张图片写完后调用 next_sink() 取得下一张图片的 sink，
+    images 按顺序记录每张图片的 {"mime_type", "size"}。
+    """
+
+    def __init__(self, sink, default_mime_type='image/png', next_sink=None):
+        self.decoder = Base64StreamDecoder(sink)
+        self.default_mime_type = default_mime_type
+        self.next_sink = next_sink
+        self.mime_type = None
+        self.found = False
+        self.images = []
+        self._decode_seconds = 0.0
+        self._state = 'part'
+        self._buffer = b''
+
+    @property
+    def size(self):
+        return self.decoder.size
+
+    @property
+    def done(self):
+        return self._state == 'done'
+
+    @property
+    def decode_seconds(self):
+        """所有图片的解码耗时之和"""
+        return self._decode_seconds + self.decoder.seconds
+
+    def _complete(self):
+        """当前图片结束：记录信息，有 next_sink 时准备提取下一张"""
+        self.images.append({"mime_type": self.mime_type or self.default_mime_type, "size": self.decoder.size})
+        if self.next_sink is None:
+            self._state = 'done'
+            return
+        self._decode_seconds += self.decoder.seconds
+        self.decoder = Base64StreamDecoder(self.next_sink())
+        self.mime_type = None
+        self._state = 'part'
+
+    def feed(self, chunk):
+        buffer = self._buffer + chunk
+        while True:
+            state = self._state
+
+            if state == 'part':
+                match = _PART_RE.search(buffer)
+                if match is None:
+                    buffer = buffer[-_KEEP_TAIL:]
+                    break
+                buffer = buffer[match.end():]
+                self._state = 'data'
+
+            elif state == 'data':
+                match = _DATA_RE.search(buffer)
+                if match is None:
+                    # inlineData 对象的开头很短，先攒着等 data 键出现
+                    break
+                mime = _MIME_RE.search(buffer, 0, match.start())
+                if mime is not None:
+                    self.mime_type = mime.group(1).decode('ascii', 'replace')
+                buffer = buffer[match.end():]
+                self.found = True
+                self._state = 'base64'
+
+            elif state == 'base64':
+                end = buffer.find(b'"')
+                if end < 0:
+                    self.decoder.write(buffer)
+                    buffer = b''
+                    break
+                self.decoder.write(buffer[:end])
+                self.decoder.close()
+                buffer = buffer[end + 1:]
+                self._state = 'tail'
+
+            elif state == 'tail':
+                # data 之后、对象结束之前可能还有 mimeType
+                close = buffer.find(b'}')
+                if self.mime_type is None:
+                    mime = _MIME_RE.search(buffer)
+                    if mime is not None and (close < 0 or mime.start() < close):
+                        self.mime_type = mime.group(1).decode('ascii', 'replace')
+                        # 从 mimeType 值的结束引号之后继续
+                        close = mime.end() - 1
+                if close < 0 and self.mime_type is None:
+                    break
+                # 对象剩下的部分之后可能还有下一张图片
+                buffer = buffer[close + 1:] if close >= 0 else buffer
+                self._complete()
+
+            else:
+                buffer = b''
+                break
+
+        self._buffer = buffer
+
+    def finish(self):
+        """输入结束；图片数据被截断时抛出 ValueError"""
+        if self._state == 'base64':
+            raise ValueError("Response ended inside inlineData.data")
+        if self._state == 'tail':
+            self._complete()
+        if self.next_sink is not None:
+            # 多图模式下 mime_type / size 描述第一张图片
+            if self.images:
+                self.mime_type = self.images[0]["mime_type"]
+            return
+        if self.found and self.mime_type is None:
+            self.mime_type = self.default_mime_type
+
+
+class ProgressSink:
+    """包装 sink，每写入 every 字节调用一次 callback(已写入字节数)"""
+
+    def __init__(self, sink, callback, every=256 * 1024):
+        self.sink = sink
+        self.callback = callback
+        self.every = every
+        self.written = 0
+        self._next = every
+
+    def write(self, data):
+        self.sink.write(data)
+        self.written += len(data)
+        if self.written >= self._next:
+            self._next = self.written + self.every
+            self.callback(self.written)
+
+
+class _InlineDataStripper:
+    """去掉 JSON 中 "data" 字符串（inlineData 的 base64）的内容，其余部分原样输出"""
+
+    def __init__(self):
+        self._skipping = False
+        self._tail = b''
+
+    def feed(self, data):
+        buffer = self._tail + data
+        output = []
+        while buffer:
+            if self._skipping:
+                end = buffer.find(b'"')
+                if end < 0:
+                    buffer = b''
+                    break
+                # 保留结束引号，输出中是空字符串 "data": ""
+                buffer = buffer[end:]
+                self._skipping = False
+            match = _DATA_RE.search(buffer)
+            if match is None:
+                break
+            output.append(buffer[:match.end()])
+            buffer = buffer[match.end():]
+            self._skipping = True
+        # 没有标记的部分只留下尾部，标记被块边界截断时下次仍能匹配上
+        if len(buffer) > _KEEP_TAIL:
+            output.append(buffer[:-_KEEP_TAIL])
+            buffer = buffer[-_KEEP_TAIL:]
+        self._tail = buffer
+        return b''.join(output)
+
+    def flush(self):
+        tail = self._tail
+        self._tail = b''
+        self._skipping = False
+        return tail
+
+
+class SSEStreamParser:
+    """
+    增量解析 streamGenerateContent?alt=sse 的响应
+
+    每个事件是一行 `data: {...}`（一个 GenerateContentResponse 片段）：
+    - 所有 data 的内容依次交给 InlineDataExtractor，图片边收边解码写入 sink；
+    - 事件去掉 inlineData 的 base64 之后缓存下来，事件结束时解析 JSON，
+      其中的文本 part 交给 on_text。图片所在的事件通常也带文本 part，
+      去掉图片数据后事件很小，不会整行缓存图片；去掉之后仍超过 max_event
+      字节的事件不解析。
+    """
+
+    def __init__(self, sink, on_text=None, default_mime_type='image/png', max_event=256 * 1024, next_sink=None):
+        self.extractor = InlineDataExtractor(sink, default_mime_type, next_sink)
+        self.on_text = on_text
+        self.max_event = max_event
+        self.texts = []
+        self._stripper = _InlineDataStripper()
+        self._pending = b''
+        self._in_data = False
+        self._event = b''
+        self._overflow = False
+
+    def feed(self, chunk):
+        pending = self._pending + chunk
+        while pending:
+            if self._in_data:
+                end = pending.find(b'\n')
+                self._data(pending if end < 0 else pending[:end])
+                if end < 0:
+                    pending = b''
+                    break
+                pending = pending[end + 1:]
+                self._in_data = False
+                continue
+
+            if pending.startswith(b'data:'):
+                pending = pending[5:]
+                self._in_data = True
+                continue
+            end = pending.find(b'\n')
+            if end < 0:
+                # 行首还不够判断是不是 "data:"，等下一块
+                break
+            if not pending[:end].strip():
+                self._end_event()
+            # event: / id: / 注释行等其他字段不需要
+            pending = pending[end + 1:]
+        self._pending = pending
+
+    def _data(self, data):
+        if not self.extractor.done:
+            self.extractor.feed(data)
+        if self._overflow:
+            return
+        data = self._stripper.feed(data)
+        if len(self._event) + len(data) > self.max_event:
+            self._overflow = True
+            self._event = b''
+        else:
+            self._event += data
+
+    def _end_event(self):
+        tail = self._stripper.flush()
+        if not self._overflow:
+            self._event += tail
+        event, overflow = self._event, self._overflow
+        self._event = b''
+        self._overflow = False
+        if overflow or not event.strip():
+            return
+        try:
+            payload = json.loads(event)
+        except ValueError:
+            return
+        for candidate in payload.get('candidates') or []:
+            for part in (candidate.get('content') or {}).get('parts') or []:
+                text = part.get('text')
+                if text:
+                    self.texts.append(text)
+                    if self.on_text is not None:
+                        self.on_text(text)
+
+    @property
+    def done(self):
+        # 图片之后可能还有文本事件，总是读到响应结束
+        return False
+
+    @property
+    def decode_seconds(self):
+        return self.extractor.decode_seconds
+
+    @property
+    def images(self):
+        return self.extractor.images
+
+    @property
+    def found(self):
+        return self.extractor.found
+
+    @property
+    def mime_type(self):
+        return self.extractor.mime_type
+
+    @property
+    def size(self):
+        return self.extractor.size
+
+    def finish(self):
+        """输入结束；最后一个事件没有空行结尾时也处理掉"""
+        if self._in_data or self._event:
+            self._in_data = False
+            self._end_event()
+        self.extractor.finish()
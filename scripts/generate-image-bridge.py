@@ -1,61 +1,860 @@
 """
 桥接脚本：接收参数，调用 Gemini API 生成图片，返回结果
 用于解决 Node.js 网络连接问题
+
+用法：
+    python generate-image-bridge.py '<json>'   # 单次调用，结果 JSON 打印到 stdout
+    python generate-image-bridge.py --serve    # 常驻进程，按行读写 JSON（见 serve()）
+    python generate-image-bridge.py --batch jobs.jsonl --concurrency 4 --rpm 60 \
+        --model-rpm gemini-2.5-flash-image-preview=30
+                                               # 批量并发生成，每完成一个输出一行结果
+
+--serve 和 --batch 都支持 --concurrency / --rpm / --model-rpm：
+最多同时进行 concurrency 个请求，总请求速率和每个模型的请求速率
+分别由令牌桶限制（单位：次/分钟）。
+
+生成结果默认缓存在 <仓库>/.image_cache（见 bridge_cache.py），同样的
+(model, prompt, generationConfig) 直接从磁盘返回；--cache-dir / --cache-max-mb
+调整位置和容量，--no-cache 关闭（单次调用模式用环境变量 IMAGE_CACHE_DIR /
+IMAGE_CACHE_DISABLE=1 控制）。常驻模式下发送 {"id": "...", "command": "stats"}
+可以查询命中 / 未命中次数。
+
+图片结果的返回方式（按请求选择）：
+- 默认：JSON 中的 image_data 字段为 base64（兼容旧调用方）；
+- 请求带 outputPath：图片解码一次后直接写入该文件（原子替换），
+  JSON 只包含 path / size / mime_type 等元数据；
+- --serve --frames：stdout 改为二进制帧，见 serve()。
+
+请求带 "stream": true 时改用 streamGenerateContent（SSE）：常驻模式下在最终结果之前
+先输出同一 id 的事件行 {"id", "event": "text", "text"} / {"id", "event": "progress",
+"image_bytes"}，图片数据到达时就开始解码，最终结果额外带上模型返回的 text。
+
+请求带 "variants": N（N > 1）时在同一次上游请求中让模型返回 N 个候选（candidateCount），
+第一张图片照常放在结果的 image_data / path 中，其余的放在 variants 列表里
+（带 outputPath 时写到 name-1.png、name-2.png ...），每张图片分别缓存。
+
+请求带 postprocess 时按槽位尺寸缩放 / 裁剪并重新编码为 WebP / JPEG（见 bridge_image.py，
+需要 Pillow）；--serve / --batch 下在 --postprocess-workers 个进程中执行。
+
+上游请求的容错（见 bridge_resilience.py）：429 / 5xx / 网络错误按带抖动的指数退避
+重试（遵守 Retry-After），请求超过该模型近期 p95 耗时仍未返回时发出对冲请求，
+某个模型连续失败时熔断并直接返回失败（429 只重试，不计入熔断），每个请求的重试总时长
+不超过 --deadline 秒。--max-retries / --no-hedge / --breaker-threshold / --breaker-cooldown /
+--deadline 调整这些策略。
+
+常驻模式下整个进程共用一个 requests.Session（连接池 + keep-alive），
+只有第一次请求需要付出 DNS 和 TLS 握手的开销。
+单次调用模式为了缩短冷启动，默认只用标准库的 http.client / ssl 发请求（见 bridge_http.py），
+不导入 requests；配置了代理环境变量或 IMAGE_BRIDGE_TRANSPORT=requests 时仍使用 requests。
+模块级只导入冷启动路径需要的模块，--check-import-budget 用 -X importtime 检查导入耗时。
+API Key 可以放在请求的 apiKey 字段里，也可以通过环境变量 GEMINI_API_KEY 传入。
+环境变量 GEMINI_API_BASE 可以把请求指向其他地址，例如本地的 mock-gemini-server.py。
+
+每个结果都带 timing（各阶段毫秒数）和 sizes（字节数），阶段含义见 bridge_metrics.py。
+--metrics-log 把每个请求追加到 JSON lines 日志，--metrics-prom 维护 Prometheus textfile
+（单次调用模式用环境变量 IMAGE_BRIDGE_METRICS_LOG）。
 """
+import time
+# 模块导入耗时计入 startup 阶段
+_IMPORT_START = time.perf_counter()
 import sys
+import os
 import json
 import base64
-import requests
+import threading
+import struct
+import tempfile
 from io import BytesIO
 
-def generate_image(prompt, model_name, api_key):
-    """生成图片并返回 base64 数据"""
-    api_url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={api_key}"
+from bridge_cache import ImageCache, cache_key
+from bridge_http import StdlibSession, proxy_configured
+from bridge_image import ImageProcessor, available as postprocess_available, validate_options
+from bridge_metrics import MetricsRecorder, RequestTimer, install_connect_timing
+from bridge_resilience import ResilientCaller
+from bridge_stream import InlineDataExtractor, ProgressSink, SSEStreamParser
+
+STARTUP_SECONDS = time.perf_counter() - _IMPORT_START
+
+API_BASE = os.environ.get("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta/models").rstrip("/")
+
+GENERATION_CONFIG = {"responseModalities": ["TEXT", "IMAGE"]}
+# 一次请求最多生成的候选数（Gemini candidateCount 的上限）
+MAX_VARIANTS = 8
+
+# 流式读取响应体的块大小
+RESPONSE_CHUNK_SIZE = 64 * 1024
+
+# (连接超时, 读取超时)：读取超时是两次收到数据之间的间隔，慢请求交给重试和对冲处理
+REQUEST_TIMEOUT = (10, 60)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".image_cache")
+
+# 输出文件的权限按 umask 计算（与直接 open 创建的文件相同）；os.umask 只能先设置再恢复，
+# 不是线程安全的，所以在导入时（还没有工作线程）读取一次
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+
+# 单次调用模式的模块导入耗时上限（毫秒），以及冷启动路径上不应出现的模块
+IMPORT_BUDGET_MS = 60
+COLD_START_FORBIDDEN = ('requests', 'urllib3', 'PIL', 'concurrent.futures', 'argparse')
+
+# 常驻模式下共用的 Session，第一次使用时创建
+_session = None
+
+
+def get_session():
+    """返回进程内共用的 requests.Session（带连接池，默认 keep-alive）"""
+    global _session
+    if _session is None:
+        # requests 导入较慢，只在常驻 / 批量模式或显式要求时才导入
+        import requests
+        _session = requests.Session()
+        # 连接池要能容纳 --concurrency 个并发请求
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=64)
+        install_connect_timing(adapter)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+
+def variant_count(args):
+    """
+    请求的 variants 参数，限制在 1..MAX_VARIANTS
+    
+    只接受整数或整数字符串（bool 不算），其他值抛出 ValueError。
+    """
+    value = args.get('variants') if isinstance(args, dict) else None
+    if value is None:
+        return 1
+    if isinstance(value, str) and value.strip().lstrip('+-').isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"variants 应为整数，收到 {value!r}")
+    return max(1, min(MAX_VARIANTS, value))
+
+
+def generation_config(variants=1):
+    """variants > 1 时在 generationConfig 中请求多个候选"""
+    if variants <= 1:
+        return GENERATION_CONFIG
+    return {**GENERATION_CONFIG, "candidateCount": variants}
+
+
+def variant_cache_key(args, index):
+    """第 index 个候选的缓存键；第 0 个与单图请求共用同一个键"""
+    config = GENERATION_CONFIG if index == 0 else {**GENERATION_CONFIG, "variant": index}
+    return cache_key(args['model'], args['prompt'], config)
+
+
+def generate_image(prompt, model_name, api_key, session=None, sink=None, stream=False, on_event=None,
+                   variants=1, next_sink=None):
+    """
+    生成图片
+    
+    响应体边下载边扫描（见 bridge_stream.py），不构建完整的 JSON 对象：
+    图片的 base64 分块解码后直接写入 sink，内存占用约为一张图片的大小。
+    
+    stream=True 时请求 streamGenerateContent?alt=sse，文本 part 一到达就以
+    {"event": "text", "text"} 交给 on_event，图片每解码 256 KB 发一次
+    {"event": "progress", "image_bytes"}；结果中带上拼接后的 text。
+    
+    variants > 1 时请求 variants 个候选。给出 next_sink 时提取响应中的每一张图片：
+    第一张写入 sink，之后每张写入 next_sink() 返回的新 sink，
+    结果的 images 按顺序列出每张图片的 {"mime_type", "size"}。
+    
+    Returns:
+        给出 sink 时返回 {"success", "mime_type", "size"}；
+        否则按旧接口返回 base64 数据 {"success", "image_data", "mime_type"}
+        失败时返回 {"success": False, "error"}，HTTP 错误附带 status / retry_after，
+        网络错误和响应被截断时附带 retryable=True
+        结果都带这次请求的 timing（connect / ttfb / download / parse / decode）和 sizes
+    """
+    timer = RequestTimer()
+    with timer.active():
+        result = _request_image(prompt, model_name, api_key, session, sink, timer, stream, on_event,
+                                variants, next_sink)
+    # ttfb 计时包含了新建连接的时间，parse 计时包含了 base64 解码的时间，各自扣除
+    if 'connect' in timer.phases and 'ttfb' in timer.phases:
+        timer.phases['ttfb'] -= timer.phases['connect']
+    if 'decode' in timer.phases and 'parse' in timer.phases:
+        timer.phases['parse'] -= timer.phases['decode']
+    result["timing"] = timer.as_dict()
+    if timer.sizes:
+        result["sizes"] = dict(timer.sizes)
+    return result
+
+
+def _request_image(prompt, model_name, api_key, session, sink, timer, stream=False, on_event=None,
+                   variants=1, next_sink=None):
+    """generate_image() 的实际请求过程，各阶段耗时记到 timer"""
+    if stream:
+        api_url = f"{API_BASE}/{model_name}:streamGenerateContent?alt=sse&key={api_key}"
+    else:
+        api_url = f"{API_BASE}/{model_name}:generateContent?key={api_key}"
     
     request_body = {
         "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {"responseModalities": ["TEXT", "IMAGE"]}
+        "generationConfig": generation_config(variants)
     }
     
     try:
-        response = requests.post(
-            api_url,
-            headers={"Content-Type": "application/json"},
-            json=request_body,
-            timeout=60
-        )
+        with timer.phase('ttfb'):
+            response = (session or get_session()).post(
+                api_url,
+                headers={"Content-Type": "application/json"},
+                json=request_body,
+                timeout=REQUEST_TIMEOUT,
+                stream=True
+            )
+        
+        with response:
+            if response.status_code != 200:
+                return {
+                    "success": False,
+                    "error": f"API error {response.status_code}: {response.text[:200]}",
+                    "status": response.status_code,
+                    "retry_after": response.headers.get("Retry-After")
+                }
+            
+            # 查找图片数据
+            output = sink if sink is not None else BytesIO()
+            if stream:
+                target = output
+                on_text = None
+                if on_event is not None:
+                    def progress(size):
+                        event = {"event": "progress", "image_bytes": size}
+                        if next_sink is not None:
+                            # 多图时 image_bytes 是第 variant 张图片已解码的字节数
+                            event["variant"] = len(extractor.images)
+                        on_event(event)
+                    target = ProgressSink(output, progress)
+                    if next_sink is not None:
+                        next_target = next_sink
+                        next_sink = lambda: ProgressSink(next_target(), progress)
+                    on_text = lambda text: on_event({"event": "text", "text": text})
+                extractor = SSEStreamParser(target, on_text, next_sink=next_sink)
+            else:
+                extractor = InlineDataExtractor(output, next_sink=next_sink)
+            chunks = response.iter_content(chunk_size=RESPONSE_CHUNK_SIZE)
+            received = 0
+            while True:
+                with timer.phase('download'):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                received += len(chunk)
+                # 找到图片后仍读完剩余的少量数据，连接才能放回连接池复用
+                if not extractor.done:
+                    with timer.phase('parse'):
+                        extractor.feed(chunk)
+            extractor.finish()
+            timer.add('decode', extractor.decode_seconds)
+            timer.sizes['response'] = received
+            timer.sizes['image'] = sum(image["size"] for image in extractor.images) if next_sink else extractor.size
         
-        if response.status_code != 200:
-            return {
+        if not extractor.found:
+            result = {
                 "success": False,
-                "error": f"API error {response.status_code}: {response.text[:200]}"
+                "error": "No image data found in response"
             }
-        
-        data = response.json()
-        
-        # 查找图片数据
-        if data.get('candidates'):
-            for part in data['candidates'][0].get('content', {}).get('parts', []):
-                inline_data = part.get('inlineData') or part.get('inline_data')
-                if inline_data and inline_data.get('data'):
-                    return {
-                        "success": True,
-                        "image_data": inline_data['data'],  # 已经是 base64
-                        "mime_type": inline_data.get('mimeType') or inline_data.get('mime_type', 'image/png')
-                    }
-        
+        elif sink is None:
+            result = {
+                "success": True,
+                "image_data": base64.b64encode(output.getvalue()).decode('ascii'),
+                "mime_type": extractor.mime_type
+            }
+        else:
+            result = {"success": True, "mime_type": extractor.mime_type, "size": extractor.size}
+            if next_sink is not None:
+                result["size"] = extractor.images[0]["size"]
+                result["images"] = extractor.images
+        if stream and extractor.texts:
+            result["text"] = "".join(extractor.texts)
+        return result
+    
+    except (OSError, ValueError) as e:
+        # requests 的异常都是 OSError 的子类，StdlibSession 的网络错误是 ConnectionError
         return {
             "success": False,
-            "error": "No image data found in response"
+            "error": str(e),
+            "retryable": True
         }
-        
     except Exception as e:
         return {
             "success": False,
             "error": str(e)
         }
 
+
+# 以下函数内部传递的结果中，图片是解码后的字节（"image" 字段），
+# 只在 deliver() 中按调用方要求的方式输出一次
+
+def cached_result(args, cache):
+    """
+    从缓存中查找请求的结果，未命中返回 None；多图请求要求每个候选都命中
+    
+    流式请求的结果与未缓存时一样带上 text（文本记在第 0 个候选的条目中）；
+    条目由非流式请求写入、没有记录文本时按未命中处理，重新请求后补上文本。
+    """
+    hits = []
+    for index in range(variant_count(args)):
+        hit = cache.get(variant_cache_key(args, index))
+        if hit is None:
+            return None
+        hits.append(hit)
+    data, mime_type, text = hits[0]
+    if args.get('stream') and text is None:
+        return None
+    result = {"success": True, "image": data, "mime_type": mime_type, "cached": True}
+    if args.get('stream') and text:
+        result["text"] = text
+    if len(hits) > 1:
+        result["variants"] = [{"image": data, "mime_type": mime_type} for data, mime_type, _ in hits[1:]]
+    return result
+
+
+def fetch_result(args, session=None, cache=None, limiter=None, resilience=None, on_event=None):
+    """
+    调用 API 生成图片，成功时写入缓存
+    
+    给出 resilience（ResilientCaller）时按其策略重试 / 对冲 / 熔断；
+    每一次实际发出的请求（包括重试和对冲）都先从 limiter 取配额。
+    请求带 stream 时走流式接口，事件交给 on_event，且不发对冲请求；
+    已经发出过事件的尝试失败后不再重试，否则调用方会收到重复的事件。
+    请求带 variants 时一次请求取回所有候选，第 1 张之后的图片放在 result["variants"]。
+    """
+    stream = bool(args.get('stream'))
+    variants = variant_count(args)
+    api_key = args.get('apiKey') or os.environ.get('GEMINI_API_KEY')
+    if not api_key:
+        return {"success": False, "error": "No API key provided"}
+    
+    emitted = False
+    
+    def emit(event):
+        nonlocal emitted
+        emitted = True
+        on_event(event)
+    
+    def attempt():
+        if limiter is not None:
+            limiter.acquire(args['model'])
+        # 图片边下载边解码到内存缓冲区，base64 只解码这一次；
+        # 每次尝试用自己的缓冲区，对冲时两个请求互不干扰
+        buffers = [BytesIO()]
+        
+        def next_buffer():
+            buffers.append(BytesIO())
+            return buffers[-1]
+        
+        result = generate_image(args['prompt'], args['model'], api_key, session=session, sink=buffers[0],
+                                stream=stream, on_event=emit if on_event is not None else None,
+                                variants=variants, next_sink=next_buffer if variants > 1 else None)
+        if emitted and not result.get("success"):
+            result["retryable"] = False
+        if result.get("success"):
+            del result["size"]
+            result["image"] = buffers[0].getvalue()
+            images = result.pop("images", None)
+            if images is not None and len(images) > 1:
+                # 模型返回的图片可能多于请求的数量，只保留前 variants 张
+                result["variants"] = [{"image": buffers[index].getvalue(), "mime_type": image["mime_type"]}
+                                      for index, image in enumerate(images[:variants]) if index > 0]
+        return result
+    
+    if resilience is not None:
+        result = resilience.call(args['model'], attempt, hedge=not stream)
+    else:
+        result = attempt()
+    if not result.get("success"):
+        return result
+    
+    if cache is not None:
+        try:
+            # 流式请求即使没有文本也记为 ""，与"没有提取文本"（None）区分
+            text = result.get("text", "") if stream else None
+            cache.put(variant_cache_key(args, 0), result["image"], result["mime_type"], text)
+            for index, variant in enumerate(result.get("variants", []), 1):
+                cache.put(variant_cache_key(args, index), variant["image"], variant["mime_type"])
+        except OSError as e:
+            # 缓存写不进去不影响本次结果
+            print(f"image cache write failed: {e}", file=sys.stderr)
+    return result
+
+
+def write_file_atomic(path, data):
+    """先写同目录下的临时文件再替换，读方不会看到写了一半的图片"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # mkstemp 创建的文件是 0600，替换后会保留，改回 umask 的默认权限
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def deliver(result, args):
+    """
+    把内部结果转换成返回给调用方的 JSON 元数据
+    
+    请求带 outputPath 时图片写入文件，否则放进 base64 的 image_data 字段。
+    多图结果的其余图片同样处理，放在 variants 列表中，
+    文件名为 outputPath 在扩展名前加 -1、-2 ...
+    """
+    image = result.pop("image", None)
+    if image is None:
+        return result
+    
+    start = time.perf_counter()
+    output_path = args.get('outputPath') if isinstance(args, dict) else None
+    if output_path:
+        write_file_atomic(output_path, image)
+        result["path"] = output_path
+        result["size"] = len(image)
+    else:
+        result["image_data"] = base64.b64encode(image).decode('ascii')
+    
+    if result.get("variants"):
+        delivered = []
+        for index, variant in enumerate(result["variants"], 1):
+            data = variant["image"]
+            entry = {"mime_type": variant["mime_type"], "size": len(data)}
+            if output_path:
+                root, ext = os.path.splitext(output_path)
+                entry["path"] = f"{root}-{index}{ext}"
+                write_file_atomic(entry["path"], data)
+            else:
+                entry["image_data"] = base64.b64encode(data).decode('ascii')
+            delivered.append(entry)
+        result["variants"] = delivered
+    result.setdefault("timing", {})["deliver_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+def apply_postprocess(result, args, processor=None):
+    """
+    按请求的 postprocess 参数处理图片（缓存中保存的仍是原图）
+    
+    未安装 Pillow 时原样返回并标记 postprocessed=False；参数有误时返回失败结果。
+    """
+    options = args.get('postprocess') if isinstance(args, dict) else None
+    if not options or not result.get("success") or result.get("image") is None:
+        return result
+    if not postprocess_available():
+        result["postprocessed"] = False
+        return result
+    
+    processor = processor or ImageProcessor()
+    original = result["image"]
+    try:
+        image, mime_type = processor.process(original, result["mime_type"], options)
+        variants = []
+        for variant in result.get("variants", []):
+            data, variant_mime = processor.process(variant["image"], variant["mime_type"], options)
+            variants.append({"image": data, "mime_type": variant_mime})
+    except Exception as e:
+        return {"success": False, "error": f"Postprocess failed: {e}"}
+    result["image"] = image
+    result["mime_type"] = mime_type
+    if variants:
+        result["variants"] = variants
+    result["postprocessed"] = True
+    result["original_size"] = len(original)
+    return result
+
+
+def produce_result(args, limiter=None, session=None, cache=None, resilience=None, processor=None,
+                   on_event=None):
+    """
+    查缓存 → 调用上游 → 后处理，返回内部结果（图片为 "image" 字节）
+    
+    结果的 timing 合并了上游请求各阶段和 cache / fetch / postprocess / total 的耗时。
+    variants 和 postprocess 参数在调用上游之前检查，参数有误时直接返回失败结果。
+    """
+    try:
+        variant_count(args)
+    except ValueError as e:
+        return {"success": False, "error": f"Invalid variants: {e}"}
+    if isinstance(args, dict) and args.get('postprocess'):
+        try:
+            validate_options(args['postprocess'])
+        except ValueError as e:
+            return {"success": False, "error": f"Invalid postprocess options: {e}"}
+    timer = RequestTimer()
+    start = time.perf_counter()
+    result = None
+    if cache is not None:
+        # 缓存命中直接返回，不消耗速率配额
+        with timer.phase('cache'):
+            result = cached_result(args, cache)
+        if result is not None and on_event is not None and result.get("text"):
+            # 与未缓存的流式响应一致：最终结果之前先给出文本事件
+            on_event({"event": "text", "text": result["text"]})
+    if result is None:
+        with timer.phase('fetch'):
+            result = fetch_result(args, session=session, cache=cache, limiter=limiter, resilience=resilience,
+                                  on_event=on_event)
+    if isinstance(args, dict) and args.get('postprocess'):
+        with timer.phase('postprocess'):
+            result = apply_postprocess(result, args, processor)
+    timer.add('total', time.perf_counter() - start)
+    
+    result["timing"] = {**result.get("timing", {}), **timer.as_dict()}
+    if result.get("image") is not None:
+        result.setdefault("sizes", {})["output"] = len(result["image"]) + sum(
+            len(variant["image"]) for variant in result.get("variants", []))
+    return result
+
+
+def handle_request(args, session=None, cache=None, resilience=None, processor=None):
+    """处理一个请求 dict（prompt / model / apiKey / outputPath / variants / postprocess），返回结果 dict"""
+    return deliver(produce_result(args, session=session, cache=cache, resilience=resilience,
+                                  processor=processor), args)
+
+
+class TokenBucket:
+    """线程安全的令牌桶：每分钟补充 rate_per_minute 个令牌，最多攒 capacity 个"""
+    
+    def __init__(self, rate_per_minute, capacity=1.0):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """取一个令牌，没有令牌时阻塞到下一个令牌补充上来"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """总速率 + 每个模型各自的速率限制，rpm 为 None 表示不限制"""
+    
+    def __init__(self, rpm=None, model_rpm=None):
+        self.bucket = TokenBucket(rpm) if rpm else None
+        self.model_buckets = {model: TokenBucket(limit) for model, limit in (model_rpm or {}).items() if limit}
+    
+    def acquire(self, model):
+        # 先拿模型配额，再拿总配额，避免占着总配额等模型配额
+        bucket = self.model_buckets.get(model)
+        if bucket is not None:
+            bucket.acquire()
+        if self.bucket is not None:
+            self.bucket.acquire()
+
+
+def run_job(job, limiter=None, session=None, cache=None, resilience=None, processor=None, on_event=None):
+    """
+    执行一个任务，任何异常都转成失败结果，不会影响其他任务
+    
+    返回内部结果（图片为 "image" 字节），由调用方决定如何输出。
+    """
+    job_id = job.get('id') if isinstance(job, dict) else None
+    try:
+        result = produce_result(job, limiter, session, cache, resilience, processor, on_event)
+    except Exception as e:
+        result = {"success": False, "error": str(e)}
+    return {"id": job_id, **result}
+
+
+def run_batch(jobs, concurrency=4, rpm=None, model_rpm=None, cache=None, resilience=None, processor=None,
+              metrics=None):
+    """
+    并发执行一批 `{id, prompt, model}` 任务
+    
+    每完成一个任务就 yield 一个结果（顺序是完成顺序，用 id 对应任务）；
+    单个任务失败只体现在它自己的结果里。
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    session = get_session()
+    limiter = RateLimiter(rpm, model_rpm)
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {executor.submit(run_job, job, limiter, session, cache, resilience, processor): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            result = _deliver_safely(future.result(), job)
+            if metrics is not None:
+                metrics.record(result, job.get('model'))
+            yield result
+
+
+def _deliver_safely(result, job):
+    """deliver() 失败（例如 outputPath 不可写）时转成该任务的失败结果"""
+    try:
+        return deliver(result, job)
+    except Exception as e:
+        return {"id": result.get("id"), "success": False, "error": str(e)}
+
+
+def serve(stdin=sys.stdin, stdout=sys.stdout, concurrency=4, rpm=None, model_rpm=None, cache=None,
+          frames=False, resilience=None, processor=None, metrics=None):
+    """
+    常驻模式：每行一个 JSON 请求，每行一个 JSON 响应
+    
+    请求：  {"id": "...", "prompt": "...", "model": "...", "apiKey": "...", "outputPath": "..."}
+    响应：  {"id": "...", "success": true, "image_data": "...", "mime_type": "..."}
+            （带 outputPath 时为 {"id", "success", "path", "size", "mime_type"}）
+    
+    frames=True 时 stdout 是二进制流（需传入二进制的 stdout），每个响应是一帧：
+        
+        4 字节大端长度 N | N 字节 JSON 元数据 | size 字节图片原始数据
+    
+    元数据与上面的 JSON 响应相同但不含 image_data，size 为其后图片字节数
+    （没有图片时为 0）。多图结果的 variants 列出其余每张图片的 {mime_type, size}，
+    这些图片的数据按顺序紧接在第一张图片之后。
+    
+    请求带 "stream": true 时，最终响应之前会先输出若干带 "event" 字段的同 id 事件
+    （text / progress，frames 模式下为 size 为 0 的帧），调用方收到不带 event 的响应才算完成。
+    
+    最多同时处理 concurrency 个请求，响应按完成顺序输出并原样带回请求的 id，
+    调用方据此匹配；单个请求出错只影响它自己的响应。
+    stdout 只输出协议行，日志请写 stderr。stdin 关闭后等进行中的请求完成再退出。
+    
+    `{"id": "...", "command": "stats"}` 返回缓存的命中 / 未命中 / 淘汰次数和进程的 startup_ms。
+    `{"id": "...", "command": "cancel"}` 取消同 id 的请求（调用方已超时放弃）：还没开始的不再
+    调用上游，进行中的不再写 outputPath，最终响应为 {"id", "success": false, "error": "Request cancelled"}。
+    取消消息在读取 stdin 的线程中处理，不排在进行中的请求之后，本身没有响应。
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    session = get_session()
+    limiter = RateLimiter(rpm, model_rpm)
+    write_lock = threading.Lock()
+    # 已取消的请求 id（set 的 add / discard 在 GIL 下是原子的）
+    cancelled = set()
+    
+    def respond(result, job=None):
+        if job is not None and job.get('id') in cancelled:
+            # 调用方已经放弃，不再写文件，输出的图片也没有人接收
+            cancelled.discard(job.get('id'))
+            result = {"id": job.get('id'), "success": False, "error": "Request cancelled"}
+            job = None
+        if frames:
+            if job is not None and job.get('outputPath'):
+                # 指定了文件时仍写文件，帧中不再附带图片
+                result = _deliver_safely(result, job)
+            image = result.pop("image", None) or b""
+            extra = []
+            for variant in result.get("variants") or []:
+                data = variant.pop("image", None)
+                if data is not None:
+                    variant["size"] = len(data)
+                    extra.append(data)
+            result["size"] = len(image)
+            header = json.dumps(result).encode('utf-8')
+            with write_lock:
+                stdout.write(struct.pack('>I', len(header)) + header)
+                stdout.write(image)
+                for data in extra:
+                    stdout.write(data)
+                stdout.flush()
+        else:
+            result = _deliver_safely(result, job) if job is not None else result
+            with write_lock:
+                stdout.write(json.dumps(result) + "\n")
+                stdout.flush()
+        if metrics is not None and job is not None:
+            metrics.record(result, job.get('model'))
+    
+    def work(line):
+        # 在线程池里运行，异常会被 executor 吞掉；任何情况下都要给调用方一个响应，
+        # 否则 Node 侧该 id 的请求永远不会完成
+        job_id = None
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError(f"请求必须是 JSON 对象，收到 {type(job).__name__}")
+            job_id = job.get('id')
+            if job_id is not None and job_id in cancelled:
+                respond({"id": job_id, "success": False}, job)
+                return
+            if job.get('command') == 'stats':
+                respond({"id": job_id, "success": True,
+                         "cache": cache.stats() if cache is not None else None,
+                         "startup_ms": round(STARTUP_SECONDS * 1000, 2)})
+                return
+            on_event = None
+            if job.get('stream'):
+                # 流式请求的中间事件立即输出，用同一个 id，最终结果照常输出
+                on_event = lambda event: respond({"id": job_id, **event})
+            respond(run_job(job, limiter, session, cache, resilience, processor, on_event), job)
+        except Exception as e:
+            try:
+                respond({"id": job_id, "success": False, "error": str(e)})
+            except Exception as write_error:
+                print(f"⚠️ 无法输出请求 {job_id} 的响应：{write_error}", file=sys.stderr)
+    
+    def cancel(line):
+        """取消消息返回 True；其他请求交给线程池"""
+        if '"cancel"' not in line:
+            return False
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return False
+        if not isinstance(message, dict) or message.get('command') != 'cancel':
+            return False
+        cancelled.add(message.get('id'))
+        return True
+    
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        for line in stdin:
+            line = line.strip()
+            if line and not cancel(line):
+                executor.submit(work, line)
+
+
+def _parse_model_rpm(values):
+    """把 ["model=30", ...] 解析成 {"model": 30.0}"""
+    quotas = {}
+    for value in values or []:
+        model, _, limit = value.rpartition('=')
+        if not model:
+            raise ValueError(f"--model-rpm 格式应为 模型名=每分钟次数：{value}")
+        quotas[model] = float(limit)
+    return quotas
+
+
+def check_import_budget(budget_ms=IMPORT_BUDGET_MS, runs=3):
+    """
+    用 python -X importtime 测量单次调用模式导入本脚本的耗时
+    
+    取 runs 次中最快的一次；超过 budget_ms 或导入了 COLD_START_FORBIDDEN
+    中的模块时返回 False。结果报告写到 stderr。
+    """
+    import subprocess
+    marker = '--bridge-import-start--'
+    code = (
+        "import sys, importlib.util\n"
+        f"sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r})\n"
+        f"sys.stderr.write({marker!r} + '\\n')\n"
+        f"spec = importlib.util.spec_from_file_location('bridge_cold_start', {os.path.abspath(__file__)!r})\n"
+        "spec.loader.exec_module(importlib.util.module_from_spec(spec))\n"
+    )
+    
+    best = None
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                                   capture_output=True, text=True)
+        if completed.returncode != 0 or marker not in completed.stderr:
+            print(completed.stderr, file=sys.stderr)
+            return False
+        modules = []
+        for line in completed.stderr.split(marker, 1)[1].splitlines():
+            if not line.startswith('import time:'):
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                # 名字前有一个空格，嵌套导入每层再多缩进两个空格
+                modules.append((name[1:].rstrip(), int(cumulative) / 1000))
+        # 顶层（没有缩进）的模块的累计耗时之和就是总导入耗时
+        total = sum(ms for name, ms in modules if not name.startswith(' '))
+        if best is None or total < best[0]:
+            best = (total, modules)
+    
+    total, modules = best
+    imported = {name.strip() for name, _ in modules}
+    forbidden = [name for name in COLD_START_FORBIDDEN
+                 if name in imported or any(m.startswith(name + '.') for m in imported)]
+    top = sorted((item for item in modules if not item[0].startswith(' ')), key=lambda item: -item[1])[:8]
+    print(f"cold-start imports: {total:.1f} ms (budget {budget_ms} ms)", file=sys.stderr)
+    for name, ms in top:
+        print(f"  {ms:8.1f} ms  {name.strip()}", file=sys.stderr)
+    if forbidden:
+        print(f"❌ cold-start path imports: {', '.join(forbidden)}", file=sys.stderr)
+    if total > budget_ms:
+        print(f"❌ import budget exceeded by {total - budget_ms:.1f} ms", file=sys.stderr)
+    return total <= budget_ms and not forbidden
+
+
+def _read_jobs(path):
+    """读取任务文件（JSON 数组或每行一个 JSON），'-' 表示 stdin"""
+    if path == '-':
+        text = sys.stdin.read()
+    else:
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+    text = text.strip()
+    if text.startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
 if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1].startswith("--"):
+        import argparse
+        parser = argparse.ArgumentParser(description="Gemini 图片生成桥接")
+        mode = parser.add_mutually_exclusive_group(required=True)
+        mode.add_argument("--serve", action="store_true", help="常驻进程，stdin/stdout 按行读写 JSON")
+        mode.add_argument("--batch", metavar="FILE", help="批量任务文件（JSON 数组或 JSON lines，- 表示 stdin）")
+        mode.add_argument("--check-import-budget", action="store_true",
+                          help="用 -X importtime 检查单次调用模式的导入耗时，超出预算时返回 1")
+        parser.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS,
+                            help=f"--check-import-budget 的预算（毫秒，默认 {IMPORT_BUDGET_MS}）")
+        parser.add_argument("--frames", action="store_true",
+                            help="--serve 时以二进制长度前缀帧返回图片，而不是 base64 JSON")
+        parser.add_argument("--concurrency", type=int, default=4, help="最多同时进行的请求数（默认 4）")
+        parser.add_argument("--rpm", type=float, default=None, help="每分钟请求数上限（默认不限）")
+        parser.add_argument("--model-rpm", action="append", metavar="MODEL=RPM",
+                            help="单个模型的每分钟请求数上限，可重复指定")
+        parser.add_argument("--cache-dir", default=os.environ.get("IMAGE_CACHE_DIR", DEFAULT_CACHE_DIR),
+                            help="图片缓存目录（默认 <仓库>/.image_cache 或 $IMAGE_CACHE_DIR）")
+        parser.add_argument("--cache-max-mb", type=float, default=512, help="缓存容量上限（MB，默认 512）")
+        parser.add_argument("--no-cache", action="store_true", help="不使用图片缓存")
+        parser.add_argument("--max-retries", type=int, default=3, help="429 / 5xx / 网络错误的最大重试次数（默认 3）")
+        parser.add_argument("--no-hedge", action="store_true", help="不发出对冲请求")
+        parser.add_argument("--breaker-threshold", type=int, default=5,
+                            help="同一模型连续失败多少次后熔断（默认 5）")
+        parser.add_argument("--breaker-cooldown", type=float, default=30, help="熔断持续秒数（默认 30）")
+        parser.add_argument("--deadline", type=float, default=120,
+                            help="单个请求含重试和等待的总时长上限（秒，默认 120，0 表示不限制）")
+        parser.add_argument("--metrics-log", metavar="FILE", help="每个请求的计时追加写入该 JSON lines 文件")
+        parser.add_argument("--metrics-prom", metavar="FILE", help="维护该 Prometheus textfile（.prom）")
+        parser.add_argument("--postprocess-workers", type=int, default=os.cpu_count() or 1,
+                            help="图片后处理的进程数（默认 CPU 核数，0 表示在请求线程中处理）")
+        options = parser.parse_args()
+        if options.check_import_budget:
+            sys.exit(0 if check_import_budget(options.import_budget_ms) else 1)
+        model_rpm = _parse_model_rpm(options.model_rpm)
+        cache = None if options.no_cache else ImageCache(options.cache_dir, int(options.cache_max_mb * 1024 * 1024))
+        resilience = ResilientCaller(max_retries=options.max_retries, hedge=not options.no_hedge,
+                                     breaker_threshold=options.breaker_threshold,
+                                     breaker_cooldown=options.breaker_cooldown,
+                                     deadline=options.deadline or None)
+        # 进程池在第一个带 postprocess 的请求到来时才创建
+        processor = ImageProcessor(options.postprocess_workers)
+        metrics = None
+        if options.metrics_log or options.metrics_prom:
+            metrics = MetricsRecorder(options.metrics_log, options.metrics_prom)
+        
+        if options.serve:
+            serve(stdout=sys.stdout.buffer if options.frames else sys.stdout,
+                  concurrency=options.concurrency, rpm=options.rpm, model_rpm=model_rpm, cache=cache,
+                  frames=options.frames, resilience=resilience, processor=processor, metrics=metrics)
+        else:
+            for result in run_batch(_read_jobs(options.batch), options.concurrency,
+                                    options.rpm, model_rpm, cache, resilience, processor, metrics):
+                print(json.dumps(result), flush=True)
+            if cache is not None:
+                print(f"image cache: {json.dumps(cache.stats())}", file=sys.stderr)
+        processor.shutdown()
+        sys.exit(0)
+    
     # 从命令行参数读取 JSON
     if len(sys.argv) < 2:
         print(json.dumps({"success": False, "error": "No arguments provided"}))
@@ -63,11 +862,18 @@ if __name__ == "__main__":
     
     try:
         args = json.loads(sys.argv[1])
-        result = generate_image(
-            args['prompt'],
-            args['model'],
-            args['apiKey']
-        )
+        cache = None if os.environ.get("IMAGE_CACHE_DISABLE") else ImageCache(
+            os.environ.get("IMAGE_CACHE_DIR", DEFAULT_CACHE_DIR))
+        if os.environ.get("IMAGE_BRIDGE_TRANSPORT") == "requests" or proxy_configured(os.environ):
+            session = get_session()
+        else:
+            session = StdlibSession()
+        # 单次调用没有历史耗时，不做对冲，只重试
+        result = handle_request(args, session=session, cache=cache,
+                                resilience=ResilientCaller(hedge=False))
+        result.setdefault("timing", {})["startup_ms"] = round(STARTUP_SECONDS * 1000, 2)
+        if os.environ.get("IMAGE_BRIDGE_METRICS_LOG"):
+            MetricsRecorder(os.environ["IMAGE_BRIDGE_METRICS_LOG"]).record(result, args.get('model'))
         print(json.dumps(result))
     except Exception as e:
         print(json.dumps({"success": False, "error": str(e)}))
@@ -0,0 +1,258 @@
+"""
+本地模拟的 Gemini generateContent 接口，用于离线测试 generate-image-bridge.py
+
+返回录制好的响应（默认仓库根目录的 gemini_response.json），
+可以配置延迟分布、5xx 错误率、429 比例和下行带宽：
+
+    python scripts/mock-gemini-server.py --port 8765 --latency lognormal:0.8,0.4 \
+        --error-rate 0.02 --rate-429 0.05
+
+    GEMINI_API_BASE=http://127.0.0.1:8765/v1beta/models GEMINI_API_KEY=mock \
+        python scripts/generate-image-bridge.py --serve
+
+延迟分布（单位：秒）：
+    constant:S           固定延迟
+    uniform:LO,HI        均匀分布
+    lognormal:MEDIAN,SIGMA  对数正态分布（长尾，接近真实接口）
+    exp:MEAN             指数分布
+
+:streamGenerateContent?alt=sse 把录制的响应按 part 拆成 SSE 事件依次发送
+（每个 part 一个事件，最后一个事件带 usageMetadata），事件之间间隔 --stream-interval 秒。
+
+请求的 generationConfig 带 candidateCount=N 时，把录制响应的第一个候选复制成 N 个候选返回。
+
+GET /stats 返回各状态码的请求计数。stdout / stderr 只输出日志。
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+DEFAULT_RESPONSE = Path(__file__).resolve().parent.parent / "gemini_response.json"
+
+# 按带宽限速时每次写出的块大小
+WRITE_CHUNK_SIZE = 64 * 1024
+
+
+def with_candidates(body, count):
+    """把响应的第一个候选复制成 count 个候选"""
+    response = json.loads(body)
+    candidate = response["candidates"][0]
+    response["candidates"] = [{**candidate, "index": index} for index in range(count)]
+    return json.dumps(response).encode('utf-8')
+
+
+def to_sse(body):
+    """把一个完整的 generateContent 响应拆成 SSE 事件列表（bytes），每个候选的每个 part 一个事件"""
+    response = json.loads(body)
+    pieces = [(candidate, index, part)
+              for index, candidate in enumerate(response["candidates"])
+              for part in candidate.get("content", {}).get("parts", [])]
+    events = []
+    for position, (candidate, index, part) in enumerate(pieces):
+        chunk = {"candidates": [{"content": {"parts": [part], "role": "model"}, "index": index}]}
+        if position == len(pieces) - 1:
+            chunk["candidates"][0]["finishReason"] = candidate.get("finishReason", "STOP")
+            for key in ("usageMetadata", "modelVersion", "responseId"):
+                if key in response:
+                    chunk[key] = response[key]
+        events.append(b"data: " + json.dumps(chunk).encode('utf-8') + b"\r\n\r\n")
+    return events
+
+
+def parse_latency(spec):
+    """把延迟分布描述解析成无参数的采样函数"""
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',') if v]
+    if kind == 'constant' and len(values) == 1:
+        return lambda: values[0]
+    if kind == 'uniform' and len(values) == 2:
+        return lambda: random.uniform(values[0], values[1])
+    if kind == 'lognormal' and len(values) == 2:
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1])
+    if kind == 'exp' and len(values) == 1:
+        return lambda: random.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+    raise ValueError(f"无法解析的延迟分布：{spec}")
+
+
+class MockState:
+    """服务器配置和计数，所有请求线程共用"""
+
+    def __init__(self, responses, latency, error_rate=0.0, rate_429=0.0, retry_after=1,
+                 bandwidth=None, stream_interval=0.0):
+        self.responses = responses
+        self.stream_events = [to_sse(body) for body in responses]
+        self.stream_interval = stream_interval
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.bandwidth = bandwidth
+        self.counts = {}
+        self.next_response = 0
+        self.lock = threading.Lock()
+
+    def pick_response(self, stream=False, candidates=1):
+        """多个录制响应时轮流返回；stream=True 时返回 SSE 事件列表"""
+        with self.lock:
+            index = self.next_response % len(self.responses)
+            self.next_response += 1
+        if candidates > 1:
+            body = with_candidates(self.responses[index], candidates)
+            return to_sse(body) if stream else body
+        return self.stream_events[index] if stream else self.responses[index]
+
+    def count(self, status):
+        with self.lock:
+            self.counts[status] = self.counts.get(status, 0) + 1
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        candidates = 1
+        if length:
+            try:
+                request = json.loads(self.rfile.read(length))
+                candidates = int(request.get("generationConfig", {}).get("candidateCount", 1))
+            except (ValueError, AttributeError):
+                pass
+
+        stream = ':streamGenerateContent' in self.path
+        if not stream and ':generateContent' not in self.path:
+            self._send_json(404, {"error": {"code": 404, "message": f"Unknown path {self.path}"}})
+            return
+
+        state = self.state
+        time.sleep(max(0.0, state.latency()))
+
+        roll = random.random()
+        if roll < state.rate_429:
+            self._send_json(429, {"error": {"code": 429, "message": "Resource has been exhausted",
+                                            "status": "RESOURCE_EXHAUSTED"}},
+                            {"Retry-After": str(state.retry_after)})
+            return
+        if roll < state.rate_429 + state.error_rate:
+            status = random.choice((500, 503))
+            self._send_json(status, {"error": {"code": status, "message": "Mock upstream failure"}})
+            return
+
+        if stream:
+            self._send_events(state.pick_response(stream=True, candidates=candidates))
+        else:
+            self._send_body(200, state.pick_response(candidates=candidates))
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            with self.state.lock:
+                counts = {str(k): v for k, v in self.state.counts.items()}
+            self._send_json(200, counts, count=False)
+        else:
+            self._send_json(404, {"error": {"code": 404, "message": f"Unknown path {self.path}"}})
+
+    def _send_json(self, status, payload, headers=None, count=True):
+        self._send_body(status, json.dumps(payload).encode('utf-8'), headers, count)
+
+    def _send_body(self, status, body, headers=None, count=True):
+        if count:
+            self.state.count(status)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self._write_throttled(body)
+
+    def _send_events(self, events):
+        """以 SSE 发送事件列表；总长度已知，用 Content-Length，事件之间 flush 并等待"""
+        self.state.count(200)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Content-Length', str(sum(len(event) for event in events)))
+        self.end_headers()
+        for index, event in enumerate(events):
+            if index and self.state.stream_interval:
+                time.sleep(self.state.stream_interval)
+            self._write_throttled(event)
+            self.wfile.flush()
+
+    def _write_throttled(self, body):
+        bandwidth = self.state.bandwidth
+        if not bandwidth:
+            self.wfile.write(body)
+            return
+        for offset in range(0, len(body), WRITE_CHUNK_SIZE):
+            chunk = body[offset:offset + WRITE_CHUNK_SIZE]
+            self.wfile.write(chunk)
+            self.wfile.flush()
+            time.sleep(len(chunk) / bandwidth)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            sys.stderr.write("%s - %s\n" % (self.address_string(), format % args))
+
+
+def make_server(host, port, state, verbose=False):
+    """创建（不启动）模拟服务器；port=0 时由系统分配端口，见 server.server_address"""
+    handler = type('Handler', (MockHandler,), {'state': state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 Gemini generateContent 接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口（默认 8765，0 表示随机端口）")
+    parser.add_argument("--response", action="append", metavar="FILE",
+                        help="录制的响应 JSON，可重复指定（轮流返回），默认 gemini_response.json")
+    parser.add_argument("--latency", default="constant:0", help="首字节前的延迟分布（默认 constant:0）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500/503 的比例")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="返回 429 的比例")
+    parser.add_argument("--retry-after", type=int, default=1, help="429 响应的 Retry-After 秒数（默认 1）")
+    parser.add_argument("--bandwidth-mbps", type=float, default=None, help="响应体下行带宽（MB/s，默认不限速）")
+    parser.add_argument("--stream-interval", type=float, default=0.0,
+                        help="streamGenerateContent 的 SSE 事件间隔（秒，默认 0）")
+    parser.add_argument("--seed", type=int, default=None, help="随机数种子")
+    parser.add_argument("--verbose", action="store_true", help="输出每个请求的访问日志")
+    options = parser.parse_args()
+
+    if options.seed is not None:
+        random.seed(options.seed)
+    responses = [Path(path).read_bytes() for path in (options.response or [DEFAULT_RESPONSE])]
+    state = MockState(
+        responses,
+        parse_latency(options.latency),
+        error_rate=options.error_rate,
+        rate_429=options.rate_429,
+        retry_after=options.retry_after,
+        bandwidth=options.bandwidth_mbps * 1024 * 1024 if options.bandwidth_mbps else None,
+        stream_interval=options.stream_interval,
+    )
+    server = make_server(options.host, options.port, state, options.verbose)
+    host, port = server.server_address[:2]
+    # 第一行固定输出 API_BASE，供 bridge-load-test.py 读取
+    print(f"http://{host}:{port}/v1beta/models", flush=True)
+    print(f"🧪 Mock Gemini server listening on http://{host}:{port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,12 @@ import { utapi } from "@/app/api/uploadthing/core";
 import { env } from "@/env";
 import { auth } from "@/server/auth";
 import { db } from "@/server/db";
+import { getImageBridge } from "@/server/image-bridge";
 import { UTFile } from "uploadthing/server";
-import { writeFile } from "fs/promises";
+import { randomUUID } from "crypto";
+import { readFile, unlink, writeFile } from "fs/promises";
+import os from "os";
 import path from "path";
-import { exec } from "child_process";
-import { promisify } from "util";
-
-const execAsync = promisify(exec);
 
 export type ImageModelList =
   | "nano-banana-pro-preview"
@@ -128,36 +127,28 @@ export async function generateImageAction(
       console.log(`🐍 [Image Generation] Trying Python bridge as fallback...`);
       
       try {
-        // 使用 Python 脚本作为备选方案
-        const scriptPath = path.join(process.cwd(), 'scripts', 'generate-image-bridge.py');
-        const args = JSON.stringify({
-          prompt: prompt,
-          model: actualModelName,
-          apiKey: apiKey
-        });
-        
-        const { stdout, stderr } = await execAsync(`python "${scriptPath}" '${args.replace(/'/g, "\\'")}'`);
-        
-        if (stderr) {
-          console.warn(`⚠️ [Image Generation] Python stderr:`, stderr);
-        }
-        
-        const pythonResult = JSON.parse(stdout);
-        console.log(`🐍 [Image Generation] Python result:`, pythonResult.success ? '✅ Success' : '❌ Failed');
-        
-        if (!pythonResult.success) {
-          throw new Error(`Python bridge failed: ${pythonResult.error}`);
-        }
-        
-        // 将 base64 转换为 buffer
-        const base64Data = pythonResult.image_data;
-        const binaryString = atob(base64Data);
-        const bytes = new Uint8Array(binaryString.length);
-        for (let i = 0; i < binaryString.length; i++) {
-          bytes[i] = binaryString.charCodeAt(i);
+        // 使用常驻的 Python 进程作为备选方案（进程和连接在多次调用之间复用）
+        // 图片由 Python 解码后直接写入临时文件，不再经过 base64 JSON
+        const outputPath = path.join(os.tmpdir(), `bridge-${randomUUID()}.img`);
+        try {
+          const pythonResult = await getImageBridge(apiKey).request({
+            prompt: prompt,
+            model: actualModelName,
+            outputPath,
+          });
+          console.log(`🐍 [Image Generation] Python result:`, pythonResult.success ? '✅ Success' : '❌ Failed');
+          
+          if (!pythonResult.success) {
+            throw new Error(`Python bridge failed: ${pythonResult.error}`);
+          }
+          
+          const fileData = await readFile(outputPath);
+          imageBuffer = new Uint8Array(fileData).buffer;
+          mimeType = pythonResult.mime_type || "image/png";
+        } finally {
+          // 失败时 Python 也可能已经写了文件，无论成败都删除
+          await unlink(outputPath).catch(() => undefined);
         }
-        imageBuffer = bytes.buffer;
-        mimeType = pythonResult.mime_type || "image/png";
         
         console.log(`✅ [Image Generation] Python bridge succeeded, image size: ${imageBuffer.byteLength} bytes`);
         
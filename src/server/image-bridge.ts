@@ -0,0 +1,187 @@
+import { spawn, type ChildProcessWithoutNullStreams } from "child_process";
+import { unlink } from "fs/promises";
+import path from "path";
+import readline from "readline";
+
+/**
+ * 常驻的 Python 图片生成进程（scripts/generate-image-bridge.py --serve）
+ *
+ * 每个请求写一行 JSON 到 stdin，按 id 匹配 stdout 返回的 JSON 行。
+ * 带 stream 的请求在最终结果之前会先收到同 id、带 event 字段的事件行（文本 / 进度），
+ * 交给 request() 的 onEvent 回调。
+ * 进程只启动一次，Python 侧复用同一个 keep-alive 连接池；
+ * API Key 通过环境变量传给子进程，不经过命令行参数，每个 Key 一个进程。
+ * 每个请求有超时（默认 IMAGE_BRIDGE_TIMEOUT_MS 或 180 秒），超时后该请求失败，
+ * 并给 Python 发送 cancel 让它不再写 outputPath；取消前已经写出的文件
+ * 在之后到达的同 id 响应中删除，响应本身被忽略。
+ */
+
+const DEFAULT_TIMEOUT_MS = Number(process.env.IMAGE_BRIDGE_TIMEOUT_MS) || 180_000;
+
+export interface BridgeRequest {
+  prompt: string;
+  model: string;
+  /** 图片直接写入该文件，响应中只有元数据（不再有 base64 的 image_data） */
+  outputPath?: string;
+  /** 使用 streamGenerateContent，先推送文本和进度事件 */
+  stream?: boolean;
+  /** 一次上游请求生成的图片数（candidateCount，1-8），第 2 张起放在结果的 variants 中 */
+  variants?: number;
+  /** 按槽位尺寸缩放并重新编码（需要 Python 侧安装 Pillow），见 scripts/bridge_image.py */
+  postprocess?: {
+    width?: number;
+    height?: number;
+    fit?: "cover" | "contain" | "fill";
+    format?: "webp" | "jpeg" | "png";
+    quality?: number;
+    filter?: "lanczos" | "bicubic" | "bilinear" | "nearest";
+  };
+}
+
+export interface BridgeResult {
+  id: string;
+  success: boolean;
+  image_data?: string;
+  path?: string;
+  size?: number;
+  mime_type?: string;
+  cached?: boolean;
+  /** 实际发出的上游尝试次数（熔断时为 0） */
+  attempts?: number;
+  /** 重试总时长达到上限，放弃了剩余的重试 */
+  deadline_exceeded?: boolean;
+  /** 结果来自对冲请求 */
+  hedged?: boolean;
+  /** 该模型处于熔断状态（请求未发出，或本次失败触发了熔断） */
+  circuit_open?: boolean;
+  /** 多图请求的其余图片（带 outputPath 时写到 name-1.ext、name-2.ext ...） */
+  variants?: { image_data?: string; path?: string; size: number; mime_type: string }[];
+  /** 模型随图片返回的文本（stream 请求） */
+  text?: string;
+  /** 是否做了后处理（false 表示 Pillow 不可用，返回的是原图） */
+  postprocessed?: boolean;
+  original_size?: number;
+  /** 各阶段耗时（毫秒），如 connect_ms / ttfb_ms / download_ms / decode_ms，见 scripts/bridge_metrics.py */
+  timing?: Record<string, number>;
+  /** 响应体 / 图片 / 输出的字节数 */
+  sizes?: Record<string, number>;
+  error?: string;
+}
+
+export type BridgeEvent =
+  | { id: string; event: "text"; text: string }
+  | { id: string; event: "progress"; image_bytes: number; variant?: number };
+
+type Pending = {
+  resolve: (result: BridgeResult) => void;
+  reject: (error: Error) => void;
+  onEvent?: (event: BridgeEvent) => void;
+  timer: ReturnType<typeof setTimeout>;
+};
+
+class ImageBridge {
+  private child: ChildProcessWithoutNullStreams | null = null;
+  private pending = new Map<string, Pending>();
+  /** 已超时、还在等 Python 最终响应的请求 id */
+  private timedOut = new Set<string>();
+  private nextId = 0;
+
+  constructor(private readonly apiKey: string) {}
+
+  private start(): ChildProcessWithoutNullStreams {
+    if (this.child) return this.child;
+
+    const scriptPath = path.join(process.cwd(), "scripts", "generate-image-bridge.py");
+    const child = spawn("python", [scriptPath, "--serve"], {
+      env: { ...process.env, GEMINI_API_KEY: this.apiKey },
+    });
+
+    readline.createInterface({ input: child.stdout }).on("line", (line) => {
+      let result: BridgeResult | BridgeEvent;
+      try {
+        result = JSON.parse(line) as BridgeResult | BridgeEvent;
+      } catch {
+        console.warn(`⚠️ [Image Bridge] Unexpected output:`, line.substring(0, 200));
+        return;
+      }
+      const waiter = this.pending.get(result.id);
+      if ("event" in result) {
+        // 中间事件，请求仍在进行
+        waiter?.onEvent?.(result);
+        return;
+      }
+      if (waiter) {
+        this.pending.delete(result.id);
+        clearTimeout(waiter.timer);
+        waiter.resolve(result);
+      } else if (this.timedOut.delete(result.id)) {
+        // 调用方已放弃，cancel 到达前写出的文件没有人清理
+        const paths = [result.path, ...(result.variants ?? []).map((variant) => variant.path)];
+        for (const file of paths) {
+          if (file) void unlink(file).catch(() => undefined);
+        }
+      }
+    });
+
+    child.stderr.on("data", (data: Buffer) => {
+      console.warn(`⚠️ [Image Bridge] Python stderr:`, data.toString());
+    });
+
+    const fail = (error: Error) => {
+      // 进程退出后未完成的请求全部失败，下次调用时重新启动
+      if (this.child !== child) return;
+      this.child = null;
+      for (const waiter of this.pending.values()) {
+        clearTimeout(waiter.timer);
+        waiter.reject(error);
+      }
+      this.pending.clear();
+      this.timedOut.clear();
+    };
+    child.on("error", fail);
+    child.on("exit", (code) => fail(new Error(`Python bridge exited with code ${code}`)));
+    // 进程已退出时写 stdin 会触发 EPIPE，没有监听器会让 Node 进程崩溃
+    child.stdin.on("error", (error) => {
+      fail(error);
+      child.kill();
+    });
+
+    this.child = child;
+    return child;
+  }
+
+  request(
+    args: BridgeRequest,
+    onEvent?: (event: BridgeEvent) => void,
+    timeoutMs: number = DEFAULT_TIMEOUT_MS,
+  ): Promise<BridgeResult> {
+    const child = this.start();
+    const id = String(++this.nextId);
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        this.timedOut.add(id);
+        if (this.child === child) {
+          child.stdin.write(JSON.stringify({ id, command: "cancel" }) + "\n");
+        }
+        reject(new Error(`Python bridge request ${id} timed out after ${timeoutMs}ms`));
+      }, timeoutMs);
+      this.pending.set(id, { resolve, reject, onEvent, timer });
+      child.stdin.write(JSON.stringify({ id, ...args }) + "\n");
+    });
+  }
+}
+
+const globalForBridge = globalThis as unknown as {
+  imageBridges: Map<string, ImageBridge> | undefined;
+};
+
+export function getImageBridge(apiKey: string): ImageBridge {
+  const bridges = (globalForBridge.imageBridges ??= new Map());
+  let bridge = bridges.get(apiKey);
+  if (!bridge) {
+    bridge = new ImageBridge(apiKey);
+    bridges.set(apiKey, bridge);
+  }
+  return bridge;
+}